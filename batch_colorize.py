@@ -1,20 +1,304 @@
 import os
-from colorizers import eccv16, siggraph17, preprocess_img, postprocess_tens, load_img
-import torch
-import matplotlib.pyplot as plt
+import argparse
 
-input_folder = "imgs"  # Change as needed
-output_folder = "imgs_out"
-os.makedirs(output_folder, exist_ok=True)
+# torch and the colorizers pipeline are imported where they are used, so `--help` and
+# argument errors return without loading them
 
-model = eccv16(pretrained=True).eval()  # or siggraph17(pretrained=True).eval()
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
 
-for filename in os.listdir(input_folder):
-    if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+def list_images(input_folder):
+    """Sorted list of image filenames in input_folder (sorted so resumed runs see the same order)"""
+    return sorted(f for f in os.listdir(input_folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+
+def _part_path(path):
+    # results are written here first and renamed into place, so an interrupted run never
+    # leaves a truncated file that a resumed one (skip_existing) would take as finished
+    return os.path.join(os.path.dirname(path), '.part_' + os.path.basename(path))
+
+def colorize_image_file(model, img_path, out_path, size=256, letterbox=False, sidecar=False, render=True):
+    """
+    Colorize a single image file with an already loaded model
+    Args:
+        sidecar: also write the low-resolution ab prediction next to out_path (.ab.npz)
+        render: write the full-resolution RGB result to out_path
+    """
+    import torch
+    from colorizers import load_img, save_img, preprocess_img, preprocess_img_letterbox, postprocess_tens
+    from colorizers.sidecar import save_sidecar, sidecar_meta, sidecar_path_for, model_name
+
+    img = load_img(img_path)
+    if letterbox:
+        tens_l_orig, tens_l_rs, pad = preprocess_img_letterbox(img, size=size)
+    else:
+        tens_l_orig, tens_l_rs = preprocess_img(img, HW=(size,size))
+        pad = None
+    # ab stays at inference resolution with or without a sidecar, so the result written here
+    # is the one render_sidecars later produces from the sidecar
+    with torch.no_grad():
+        out_ab = model(tens_l_rs).cpu()
+    if sidecar:
+        meta = sidecar_meta(model_name(model), size, letterbox, source=os.path.basename(img_path),
+                            height=img.shape[0], width=img.shape[1])
+        sidecar_path = sidecar_path_for(out_path)
+        save_sidecar(_part_path(sidecar_path), out_ab, meta, pad=pad)
+        os.replace(_part_path(sidecar_path), sidecar_path)
+    if render:
+        save_img(_part_path(out_path), postprocess_tens(tens_l_orig, out_ab, pad=pad))
+        os.replace(_part_path(out_path), out_path)
+
+def render_sidecars(input_folder, output_folder, size=None):
+    """
+    Re-render results from their sidecars in output_folder and the originals in
+    input_folder, without inference
+    Args:
+        size: (W, H) output size (default: each original's size)
+    """
+    from colorizers import load_img, save_img
+    from colorizers.sidecar import load_sidecar, render_sidecar, sidecar_path_for
+
+    rendered = 0
+    for filename in list_images(input_folder):
+        out_path = os.path.join(output_folder, f"color_{filename}")
+        if not os.path.exists(sidecar_path_for(out_path)):
+            continue
+        out_ab, _ = load_sidecar(sidecar_path_for(out_path))
+        save_img(out_path, render_sidecar(out_ab, load_img(os.path.join(input_folder, filename)), size=size))
+        print(f"Rendered: {out_path}")
+        rendered += 1
+    return rendered
+
+def colorize_image(model, img, size=256, letterbox=False):
+    """Colorize an H x W x 3 uint8 RGB image; returns H x W x 3 uint8 RGB"""
+    import torch
+    from colorizers import preprocess_img, preprocess_img_letterbox, postprocess_tens_uint8
+
+    if letterbox:
+        tens_l_orig, tens_l_rs, pad = preprocess_img_letterbox(img, size=size)
+    else:
+        tens_l_orig, tens_l_rs = preprocess_img(img, HW=(size,size))
+        pad = None
+    HW_out = tens_l_orig.shape[2:] if pad is None else None
+    with torch.no_grad():
+        return postprocess_tens_uint8(tens_l_orig, model(tens_l_rs, HW_out=HW_out).cpu(), pad=pad)
+
+def iter_folder_images(input_folder):
+    # (key, image) pairs for a folder of image files; the key is the filename without extension
+    from colorizers import load_img
+    for filename in list_images(input_folder):
+        yield os.path.splitext(filename)[0], load_img(os.path.join(input_folder, filename))
+
+def colorize_stream(model, items, write, size=256, letterbox=False, progress_callback=None):
+    """
+    Colorize (key, image) pairs, e.g. from iter_folder_images or ShardReader.images()
+    Args:
+        write: called as write(key, H x W x 3 uint8 RGB result), e.g. ShardWriter.write
+        progress_callback: called as progress_callback(images_done) after each image
+    """
+    done = 0
+    for key, img in items:
+        write(key, colorize_image(model, img, size=size, letterbox=letterbox))
+        done += 1
+        if progress_callback is not None:
+            progress_callback(done)
+    return done
+
+def batch_colorize(model, input_folder, output_folder, start_index=0, progress_callback=None,
+                   size=256, letterbox=False, sidecar=False, render=True, skip_existing=False):
+    """
+    Colorize every image in input_folder
+    Args:
+        model: loaded colorizer (eval mode)
+        size: inference resolution (multiple of 8)
+        letterbox: preserve aspect ratio at inference instead of stretching to a square
+        start_index: skip the first N files
+        skip_existing: skip files whose output already exists (resuming an interrupted run,
+            even if files were added to or removed from input_folder in the meantime)
+        progress_callback: called as progress_callback(files_done, total_files) after each file
+        sidecar: also store each ab prediction as a compact .ab.npz sidecar
+        render: write RGB results (False with sidecar stores only the sidecars)
+    """
+    from colorizers.sidecar import sidecar_path_for
+
+    os.makedirs(output_folder, exist_ok=True)
+    filenames = list_images(input_folder)
+
+    for i, filename in enumerate(filenames[start_index:], start=start_index):
         img_path = os.path.join(input_folder, filename)
-        img = load_img(img_path)
-        tens_l_orig, tens_l_rs = preprocess_img(img, HW=(256,256))
-        out_img = postprocess_tens(tens_l_orig, model(tens_l_rs).cpu())
         out_path = os.path.join(output_folder, f"color_{filename}")
-        plt.imsave(out_path, out_img)
-        print(f"Saved: {out_path}")
\ No newline at end of file
+        if not (skip_existing and os.path.exists(out_path if render else sidecar_path_for(out_path))):
+            colorize_image_file(model, img_path, out_path, size=size, letterbox=letterbox,
+                                sidecar=sidecar, render=render)
+            print(f"Saved: {out_path if render else sidecar_path_for(out_path)}")
+        if progress_callback is not None:
+            progress_callback(i + 1, len(filenames))
+
+def load_model(model_type, temperature=None, low_memory=False, chunk_rows=None):
+    """Pretrained colorizer in eval mode with the --temperature / --low_memory options applied"""
+    from colorizers.models import build_colorizer
+    model = build_colorizer(model_type).eval()
+    if temperature is not None:
+        model.T = temperature
+    if low_memory or chunk_rows:
+        model.set_low_memory(True, chunk_rows=chunk_rows)
+    return model
+
+def colorize_item_process(settings):
+    """make_process for distributed.run_worker: loads the coordinator's model once per worker"""
+    model = load_model(settings['model'], temperature=settings.get('temperature'),
+                       low_memory=settings.get('low_memory', False), chunk_rows=settings.get('chunk_rows'))
+
+    def process(item):
+        os.makedirs(os.path.dirname(os.path.abspath(item['output'])), exist_ok=True)
+        colorize_image_file(model, item['input'], item['output'], size=settings['size'],
+                            letterbox=settings['letterbox'])
+    return process
+
+def _local_worker(address, index, num_workers):
+    import socket
+    from colorizers.runtime import configure_runtime, worker_runtime
+    from distributed import run_worker
+
+    configure_runtime(**worker_runtime(index, num_workers))
+    run_worker(address, colorize_item_process, worker_id=f"{socket.gethostname()}:local{index}")
+
+def serve_distributed(args):
+    """Coordinator side of --serve: lease the images to local and remote workers until all are done"""
+    import multiprocessing as mp
+    from distributed import Coordinator, make_items, read_manifest, parse_address, print_summary
+
+    if args.manifest:
+        items = read_manifest(args.manifest, args.output)
+    else:
+        items = make_items([os.path.join(args.input, f) for f in list_images(args.input)], args.output)
+    os.makedirs(args.output, exist_ok=True)
+    settings = {'model': args.model, 'size': args.size, 'letterbox': args.letterbox, 'temperature': args.temperature,
+                'low_memory': args.low_memory, 'chunk_rows': args.chunk_rows}
+    coordinator = Coordinator(items, settings=settings,
+                              chunk_size=args.chunk_size, lease_timeout=args.lease_timeout)
+    host, port = coordinator.start(*parse_address(args.serve))
+    print(f"📡 Coordinator on {host}:{port}: {len(coordinator.chunks)} chunks of up to {args.chunk_size} images "
+          f"({coordinator.skipped} already done)")
+    workers = [mp.Process(target=_local_worker, args=(('127.0.0.1', port), i, args.local_workers))
+               for i in range(args.local_workers)]
+    for p in workers:
+        p.start()
+    try:
+        summary = coordinator.wait()
+    finally:
+        coordinator.stop()
+        for p in workers:
+            p.join(timeout=10)
+            if p.is_alive():
+                p.terminate()
+    print_summary(summary)
+
+def main():
+    from colorizers.models import MODEL_TYPES
+
+    parser = argparse.ArgumentParser(description='Colorize a folder of images')
+    parser.add_argument('-i', '--input', default='imgs', help='Input image folder')
+    parser.add_argument('-o', '--output', default='imgs_out', help='Output image folder')
+    parser.add_argument('--model', choices=MODEL_TYPES, default='eccv16', help='Model type')
+    parser.add_argument('--size', type=int, default=256, help='Inference resolution (multiple of 8)')
+    parser.add_argument('--letterbox', action='store_true', help='Preserve aspect ratio at inference (pad instead of stretch)')
+    parser.add_argument('--low_memory', action='store_true', help='siggraph17: free activations early for large --size runs')
+    parser.add_argument('--chunk_rows', type=int, help='siggraph17 low-memory mode: run full-resolution layers in strips of this many rows')
+    parser.add_argument('--temperature', type=float, help='eccv16 decoding temperature: 1 = mean color (default), lower = more saturated (e.g. .38)')
+    parser.add_argument('--threads', type=int, help='Torch/OpenCV/BLAS threads (default: saved autotune setting)')
+    parser.add_argument('--input_shards', help='Read images from tar shards (directory, glob or .tar) instead of --input')
+    parser.add_argument('--output_format', choices=['files', 'shards'], default='files',
+                        help='One file per image, or large tar shards with an offset index')
+    parser.add_argument('--image_format', choices=['png', 'jpg', 'webp'], default='png', help='Encoding for shard output')
+    parser.add_argument('--quality', type=int, default=90, help='JPEG/WebP quality for shard output')
+    parser.add_argument('--compression', type=int, default=1, help='PNG compression level (0-9) for shard output')
+    parser.add_argument('--encoder', choices=['pil', 'cv2'], default='pil', help='Image encoder for shard output')
+    parser.add_argument('--shard_size', type=int, default=1024, help='Target shard size in MB')
+    parser.add_argument('--sidecar', action='store_true', help='Also store each ab prediction as a compact .ab.npz sidecar')
+    parser.add_argument('--sidecar_only', action='store_true', help='Store only the sidecars, no RGB results')
+    parser.add_argument('--render_sidecars', action='store_true', help='Render results from existing sidecars in --output (no inference)')
+    parser.add_argument('--render_size', help='Output size WxH for --render_sidecars (default: original size)')
+    parser.add_argument('--dedupe', action='store_true', help='Run the network once per group of near-duplicate images')
+    parser.add_argument('--serve', metavar='[HOST:]PORT', help='Coordinate a distributed run: lease --input (or --manifest) images to workers')
+    parser.add_argument('--connect', metavar='HOST:PORT', help='Run as a worker of a --serve coordinator (model options and size come from it)')
+    parser.add_argument('--manifest', help='With --serve: file listing input paths (or input<TAB>output), one per line')
+    parser.add_argument('--chunk_size', type=int, default=16, help='Images per lease with --serve')
+    parser.add_argument('--lease_timeout', type=float, default=60, help='Seconds without a heartbeat before a lease is re-queued (--serve)')
+    parser.add_argument('--local_workers', type=int, default=0, help='Worker processes to start on this machine with --serve')
+    parser.add_argument('--dedupe_threshold', type=int, default=10, help='Maximum perceptual hash distance (of 64 bits) within a group')
+    args = parser.parse_args()
+    if args.temperature is not None and args.model != 'eccv16':
+        parser.error('--temperature only applies to --model eccv16')
+    if (args.low_memory or args.chunk_rows) and args.model != 'siggraph17':
+        parser.error('--low_memory/--chunk_rows only apply to --model siggraph17')
+    if args.serve and args.connect:
+        parser.error('use either --serve or --connect')
+    if (args.serve or args.connect) and (args.dedupe or args.input_shards or args.output_format == 'shards'
+                                         or args.sidecar or args.sidecar_only or args.render_sidecars):
+        parser.error('--serve/--connect only support the default folder-to-files mode')
+    if args.dedupe and args.input_shards:
+        parser.error('--dedupe needs a folder of image files, not --input_shards')
+    if (args.sidecar or args.sidecar_only) and (args.dedupe or args.input_shards or args.output_format == 'shards'):
+        parser.error('sidecars are only written in the default folder-to-files mode')
+
+    if args.serve:
+        serve_distributed(args)
+        return
+    from colorizers import save_img
+    from colorizers.runtime import configure_from_saved
+
+    configure_from_saved(num_threads=args.threads)
+    if args.connect:
+        from distributed import run_worker, parse_address
+        stats = run_worker(parse_address(args.connect), colorize_item_process)
+        print(f"✅ Worker finished: {stats['items']} images in {stats['chunks']} chunks, {stats['errors']} errors")
+        return
+    if args.render_sidecars:
+        size = tuple(int(v) for v in args.render_size.split('x')) if args.render_size else None
+        render_sidecars(args.input, args.output, size=size)
+        return
+
+    model = load_model(args.model, temperature=args.temperature, low_memory=args.low_memory, chunk_rows=args.chunk_rows)
+
+    writer = None
+    if args.output_format == 'shards':
+        from shards import ShardWriter
+        writer = ShardWriter(args.output, max_size=args.shard_size << 20, fmt=args.image_format,
+                             quality=args.quality, compression=args.compression, encoder=args.encoder)
+
+    if args.dedupe:
+        from dedupe import dedupe_colorize, print_dedupe_report
+        os.makedirs(args.output, exist_ok=True)
+        filenames = list_images(args.input)
+        if writer is not None:
+            save = lambda out_path, out_img: writer.write(os.path.splitext(os.path.basename(out_path))[0],
+                                                          (out_img*255).astype('uint8'))
+        else:
+            save = save_img
+        stats = dedupe_colorize(model, [os.path.join(args.input, f) for f in filenames],
+                                [os.path.join(args.output, f"color_{f}") for f in filenames],
+                                threshold=args.dedupe_threshold, size=args.size, letterbox=args.letterbox,
+                                save=save)
+        print_dedupe_report(stats)
+    elif writer is not None or args.input_shards:
+        if args.input_shards:
+            from shards import ShardReader
+            items = ShardReader(args.input_shards).images()
+        else:
+            items = iter_folder_images(args.input)
+        if writer is not None:
+            write = lambda key, out_img: writer.write(f"color_{key}", out_img)
+        else:
+            os.makedirs(args.output, exist_ok=True)
+            write = lambda key, out_img: save_img(os.path.join(args.output, f"color_{key}.png"), out_img)
+        done = colorize_stream(model, items, write, size=args.size, letterbox=args.letterbox)
+        print(f"Colorized {done} images into {args.output}")
+    else:
+        batch_colorize(model, args.input, args.output, size=args.size, letterbox=args.letterbox,
+                       sidecar=args.sidecar or args.sidecar_only, render=not args.sidecar_only)
+
+    if writer is not None:
+        writer.close()
+        print(f"Wrote {len(writer.shard_paths)} shards to {args.output}")
+
+if __name__ == "__main__":
+    main()
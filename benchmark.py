@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Colorization performance benchmarks
+Usage:
+    python benchmark.py latency --sizes 128 256 384 512
+    python benchmark.py latency --model siggraph17 --letterbox -i imgs/Waterfall.jpg
+    python benchmark.py latency --direct_output
+    python benchmark.py autotune
+    python benchmark.py alloc --frame 1920x1080
+    python benchmark.py import --importtime
+    python benchmark.py memory --model siggraph17 --sizes 512 1024 --chunk_rows 256 64
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+import numpy as np
+import torch
+
+from colorizers import MODEL_TYPES, build_colorizer, load_img, preprocess_img, preprocess_img_letterbox, postprocess_tens
+from colorizers.runtime import autotune, configure_from_saved, RUNTIME_CONFIG_PATH
+
+def load_model(name, pretrained=False, device='cpu'):
+    """Build a colorizer for benchmarking; random weights give the same timings as pretrained ones"""
+    model = build_colorizer(name, pretrained=pretrained).eval()
+    if device == 'cuda':
+        model = model.cuda()
+    return model
+
+def _sync(device):
+    if device == 'cuda':
+        torch.cuda.synchronize()
+
+def time_call(fn, repeat, device='cpu'):
+    """Median wall time of fn() in milliseconds"""
+    times = []
+    for _ in range(repeat):
+        _sync(device)
+        t0 = time.perf_counter()
+        fn()
+        _sync(device)
+        times.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(times))
+
+def bench_latency(args):
+    configure_from_saved(num_threads=args.threads)
+    img = load_img(args.img_path)
+    model = load_model(args.model, args.pretrained, args.device)
+    print(f"Model: {args.model}, Device: {args.device}, Image: {img.shape[1]}x{img.shape[0]}, "
+          f"{'letterbox' if args.letterbox else 'square resize'}{', ab predicted at output size' if args.direct_output else ''}")
+    print(f"{'size':>6} {'input':>10} {'preprocess':>11} {'forward':>9} {'postprocess':>12} {'total':>8}  (ms, median of {args.repeat})")
+
+    for size in args.sizes:
+        if args.letterbox:
+            preprocess = lambda: preprocess_img_letterbox(img, size=size)
+        else:
+            preprocess = lambda: preprocess_img(img, HW=(size,size))
+        result = preprocess()
+        tens_l_orig, tens_l_rs = result[0], result[1].to(args.device)
+        pad = result[2] if args.letterbox else None
+        HW_out = tens_l_orig.shape[2:] if args.direct_output else None
+
+        with torch.no_grad():
+            for _ in range(args.warmup):
+                model(tens_l_rs, HW_out=HW_out)
+            t_pre = time_call(preprocess, args.repeat)
+            t_fwd = time_call(lambda: model(tens_l_rs, HW_out=HW_out), args.repeat, args.device)
+            out_ab = model(tens_l_rs, HW_out=HW_out).cpu()
+        t_post = time_call(lambda: postprocess_tens(tens_l_orig, out_ab, pad=pad), args.repeat)
+
+        shape = f"{tens_l_rs.shape[3]}x{tens_l_rs.shape[2]}"
+        print(f"{size:>6} {shape:>10} {t_pre:>11.1f} {t_fwd:>9.1f} {t_post:>12.1f} {t_pre + t_fwd + t_post:>8.1f}")
+
+def bench_autotune(args):
+    config, results = autotune(thread_counts=args.threads, size=args.size, repeat=args.repeat, path=args.save)
+    print(f"ECCVGenerator forward at {args.size}x{args.size} (ms, median of {args.repeat})")
+    for threads, ms in results.items():
+        marker = '  <- best' if threads == config['num_threads'] else ''
+        print(f"{threads:>4} threads {ms:>9.1f}{marker}")
+    print(f"💾 Saved to: {args.save}")
+
+def _large_allocations(prof, threshold):
+    # (count, bytes) of allocations of at least threshold bytes recorded by the profiler
+    count, total = 0, 0
+    for event in prof.events():
+        for usage in (event.self_cpu_memory_usage, getattr(event, 'self_cuda_memory_usage', 0)):
+            if usage >= threshold:
+                count += 1
+                total += usage
+    return count, total
+
+def bench_alloc(args):
+    from video_colorizer import VideoColorizer
+
+    configure_from_saved(num_threads=args.threads)
+    W, H = (int(v) for v in args.frame.split('x'))
+    frame = (np.random.RandomState(0).rand(H, W, 3) * 255).astype(np.uint8)
+    threshold = H * W  # anything at least one byte per pixel counts as a frame-sized allocation
+    print(f"Frame: {W}x{H}, Model: {args.model}, Device: {args.device}, {args.frames} steady-state frames")
+    print(f"{'path':>10} {'ms/frame':>9} {'large allocs/frame':>19} {'MB/frame':>9}")
+
+    for buffer_pool in (False, True):
+        colorizer = VideoColorizer(model_type=args.model, device=args.device, inference_size=args.size,
+                                   buffer_pool=buffer_pool, pretrained=False)
+        for _ in range(args.warmup):
+            colorizer.colorize_frame(frame)
+        t_frame = time_call(lambda: colorizer.colorize_frame(frame), args.frames, args.device)
+        with torch.profiler.profile(profile_memory=True) as prof:
+            for _ in range(args.frames):
+                colorizer.colorize_frame(frame)
+        count, total = _large_allocations(prof, threshold)
+        name = 'pooled' if buffer_pool else 'allocating'
+        print(f"{name:>10} {t_frame:>9.1f} {count / args.frames:>19.1f} {total / args.frames / 2**20:>9.1f}")
+    print("(network activations are included; frame-sized means >= H*W bytes)")
+
+# Short-lived processes whose startup time is dominated by imports
+STARTUP_COMMANDS = {
+    'import colorizers': ['-c', 'import colorizers'],
+    'colorizers.eccv16 (torch)': ['-c', 'import colorizers; colorizers.eccv16'],
+    'demo_video.py --help': ['demo_video.py', '--help'],
+    'batch_colorize.py --help': ['batch_colorize.py', '--help'],
+}
+
+def _top_imports(code, top):
+    # (cumulative us, module) of the slowest imports reported by python -X importtime
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                            check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), module.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+def bench_import(args):
+    repo = os.path.dirname(os.path.abspath(__file__))
+    print("Startup wall time (ms); 'first' is the first run, usually with a colder file cache")
+    print(f"{'command':>28} {'first':>8} {'median':>8} {'min':>8}")
+    for name, argv in STARTUP_COMMANDS.items():
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            subprocess.run([sys.executable] + argv, cwd=repo, check=True, capture_output=True)
+            times.append((time.perf_counter() - t0) * 1000)
+        print(f"{name:>28} {times[0]:>8.0f} {np.median(times):>8.0f} {min(times):>8.0f}")
+
+    if args.importtime:
+        print("\nSlowest imports for loading a model (python -X importtime, cumulative ms):")
+        for cumulative, module in _top_imports('import colorizers; colorizers.eccv16', args.top):
+            print(f"{cumulative / 1000:>9.1f}  {module}")
+
+def _rss_bytes():
+    # current resident set size (Linux); None where /proc is unavailable
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+def _max_rss_bytes():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # bytes on macOS, KiB elsewhere
+
+def memory_probe(args):
+    # runs in a fresh process per configuration so the RSS high-water mark starts clean
+    configure_from_saved(num_threads=args.threads)
+    model = load_model(args.model, device=args.device)
+    if args.low_memory:
+        model.set_low_memory(True, chunk_rows=args.chunk_rows)
+    tens = torch.rand(1, 1, args.size, args.size, device=args.device) * 100
+    with torch.no_grad():
+        if args.device == 'cuda':
+            torch.cuda.synchronize()
+            torch.cuda.reset_peak_memory_stats()
+            base = torch.cuda.memory_allocated()
+            model(tens)
+            peak = torch.cuda.max_memory_allocated() - base
+        else:
+            base = _rss_bytes()
+            base = base if base is not None else _max_rss_bytes()
+            model(tens)
+            peak = _max_rss_bytes() - base
+        ms = time_call(lambda: model(tens), 1, args.device)
+    print(json.dumps({'peak_bytes': peak, 'ms': ms}))
+
+def bench_memory(args):
+    configs = [('default', [])]
+    if args.model == 'siggraph17':
+        configs.append(('low_memory', ['--low_memory']))
+        configs += [(f"chunk {rows}", ['--low_memory', '--chunk_rows', str(rows)]) for rows in args.chunk_rows]
+    print(f"Model: {args.model}, Device: {args.device}; peak activation memory of one forward pass "
+          f"({'CUDA allocator' if args.device == 'cuda' else 'RSS high-water mark'} above the loaded model)")
+    print(f"{'size':>6} {'config':>12} {'peak MB':>9} {'ms':>9}")
+    for size in args.sizes:
+        for name, flags in configs:
+            argv = [sys.executable, os.path.abspath(__file__), '_memory_probe', '--model', args.model,
+                    '--size', str(size), '--device', args.device] + flags
+            if args.threads:
+                argv += ['--threads', str(args.threads)]
+            result = subprocess.run(argv, capture_output=True, text=True)
+            if result.returncode != 0:
+                last = result.stderr.strip().splitlines()[-1:] or ['failed']
+                print(f"{size:>6} {name:>12} {'-':>9} {'-':>9}  ({last[0]})")
+                continue
+            probe = json.loads(result.stdout.strip().splitlines()[-1])
+            print(f"{size:>6} {name:>12} {probe['peak_bytes'] / 2**20:>9.0f} {probe['ms']:>9.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Colorization benchmarks')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_lat = sub.add_parser('latency', help='Per-stage latency across inference resolutions')
+    p_lat.add_argument('-i', '--img_path', default='imgs/ansel_adams3.jpg')
+    p_lat.add_argument('--model', choices=MODEL_TYPES, default='eccv16')
+    p_lat.add_argument('--device', choices=['cpu', 'cuda'], default='cpu')
+    p_lat.add_argument('--sizes', type=int, nargs='+', default=[128, 192, 256, 384, 512])
+    p_lat.add_argument('--letterbox', action='store_true', help='Aspect-preserving padded inputs')
+    p_lat.add_argument('--pretrained', action='store_true', help='Download and use pretrained weights')
+    p_lat.add_argument('--direct_output', action='store_true', help='Resample ab once, straight to the image size, inside the model')
+    p_lat.add_argument('--repeat', type=int, default=5)
+    p_lat.add_argument('--warmup', type=int, default=2)
+    p_lat.add_argument('--threads', type=int, help='Intra-op threads (default: saved autotune setting)')
+    p_lat.set_defaults(func=bench_latency)
+
+    p_tune = sub.add_parser('autotune', help='Find and save the fastest thread settings for this machine')
+    p_tune.add_argument('--threads', type=int, nargs='+', help='Thread counts to try (default: powers of two up to CPU count)')
+    p_tune.add_argument('--size', type=int, default=256)
+    p_tune.add_argument('--repeat', type=int, default=5)
+    p_tune.add_argument('--save', default=RUNTIME_CONFIG_PATH, help='Where to store the result')
+    p_tune.set_defaults(func=bench_autotune)
+
+    p_alloc = sub.add_parser('alloc', help='Per-frame time and large allocations, with and without the buffer pool')
+    p_alloc.add_argument('--frame', default='1280x720', help='Frame size WxH')
+    p_alloc.add_argument('--model', choices=MODEL_TYPES, default='eccv16')
+    p_alloc.add_argument('--device', choices=['cpu', 'cuda'], default='cpu')
+    p_alloc.add_argument('--size', type=int, default=256, help='Inference resolution')
+    p_alloc.add_argument('--frames', type=int, default=10)
+    p_alloc.add_argument('--warmup', type=int, default=2)
+    p_alloc.add_argument('--threads', type=int, help='Intra-op threads (default: saved autotune setting)')
+    p_alloc.set_defaults(func=bench_alloc)
+
+    p_import = sub.add_parser('import', help='Cold-start time of the package and CLI entry points')
+    p_import.add_argument('--repeat', type=int, default=5)
+    p_import.add_argument('--importtime', action='store_true', help='Also list the slowest imports')
+    p_import.add_argument('--top', type=int, default=15, help='Number of imports to list with --importtime')
+    p_import.set_defaults(func=bench_import)
+
+    p_mem = sub.add_parser('memory', help='Peak activation memory per inference configuration (one process each)')
+    p_mem.add_argument('--model', choices=MODEL_TYPES, default='siggraph17')
+    p_mem.add_argument('--device', choices=['cpu', 'cuda'], default='cpu')
+    p_mem.add_argument('--sizes', type=int, nargs='+', default=[512, 1024])
+    p_mem.add_argument('--chunk_rows', type=int, nargs='*', default=[256, 64], help='Strip heights to try in low-memory mode (siggraph17)')
+    p_mem.add_argument('--threads', type=int, help='Intra-op threads (default: saved autotune setting)')
+    p_mem.set_defaults(func=bench_memory)
+
+    p_probe = sub.add_parser('_memory_probe')
+    p_probe.add_argument('--model', choices=MODEL_TYPES, default='siggraph17')
+    p_probe.add_argument('--device', choices=['cpu', 'cuda'], default='cpu')
+    p_probe.add_argument('--size', type=int, default=512)
+    p_probe.add_argument('--low_memory', action='store_true')
+    p_probe.add_argument('--chunk_rows', type=int)
+    p_probe.add_argument('--threads', type=int)
+    p_probe.set_defaults(func=memory_probe)
+
+    args = parser.parse_args()
+    if getattr(args, 'direct_output', False) and args.letterbox:
+        parser.error('--direct_output needs square-resized inputs, not --letterbox')
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,24 @@ import streamlit as st
 from PIL import Image, ImageEnhance, ImageFilter
 import numpy as np
 import torch
-from colorizers import eccv16, siggraph17, preprocess_img, postprocess_tens, load_img
-import io
+from colorizers import eccv16, siggraph17, preprocess_img, postprocess_tens_uint8, run_models, blend_ab
+from colorizers.runtime import configure_from_saved
+from image_export import ExportCache, EXPORT_FORMATS
 import os
+import hashlib
+
+@st.cache_resource
+def configure_runtime_once():
+    # Streamlit reruns this script on every interaction; thread pools are set up once per process
+    return configure_from_saved()
+
+configure_runtime_once()
 
 st.title("Colorful Image Colorization")
 
 uploaded_file = st.file_uploader("Upload a black & white image", type=["jpg", "jpeg", "png"])
-model_option = st.selectbox("Choose model", ["eccv16", "siggraph17"])
+model_option = st.selectbox("Choose model", ["eccv16", "siggraph17", "ensemble"],
+                            help="ensemble blends the eccv16 and siggraph17 predictions")
 
 # Resolution options
 st.sidebar.header("Output Settings")
@@ -36,7 +46,7 @@ if resolution_choice == "Custom":
 # Download format options
 download_formats = st.sidebar.multiselect(
     "Download Formats",
-    ["PNG", "JPG", "PDF", "SVG", "TIFF"],
+    list(EXPORT_FORMATS),
     default=["PNG"]
 )
 
@@ -53,11 +63,52 @@ if 'adjustments' not in st.session_state:
         'hue_shift': 0.0,
         'filter': 'none'
     }
+if 'colorize_cache' not in st.session_state:
+    st.session_state.colorize_cache = None
+if 'colorized_model' not in st.session_state:
+    st.session_state.colorized_model = None
 if 'original_size' not in st.session_state:
     st.session_state.original_size = None
 if 'current_output_size' not in st.session_state:
     st.session_state.current_output_size = None
 
+@st.cache_resource
+def load_colorizer(name):
+    """Load a colorizer once per server process"""
+    if name == "eccv16":
+        return eccv16(pretrained=True).eval()
+    return siggraph17(pretrained=True).eval()
+
+@st.cache_resource
+def get_export_cache():
+    """Encoded downloads shared across reruns and sessions"""
+    return ExportCache()
+
+export_cache = get_export_cache()
+
+def colorize_cached(img_np, model_name, output_size, cache):
+    """
+    Colorize with model_name, reusing the preprocessed L channel and any ab
+    predictions already computed for this image (e.g. before a model switch)
+    The result is composited directly at output_size (W, H): L and ab are each
+    resampled once, so small outputs of large uploads skip the full-size Lab->RGB.
+    """
+    if cache['tens'] is None:
+        cache['tens'] = preprocess_img(img_np, HW=(256,256))
+    tens_l_orig, tens_l_rs = cache['tens']
+
+    needed = ["eccv16", "siggraph17"] if model_name == "ensemble" else [model_name]
+    missing = {name: load_colorizer(name) for name in needed if name not in cache['ab']}
+    if missing:
+        cache['ab'].update(run_models(missing, tens_l_rs))
+
+    if model_name == "ensemble":
+        out_ab = blend_ab({name: cache['ab'][name] for name in needed})
+    else:
+        out_ab = cache['ab'][model_name]
+    HW_out = (output_size[1], output_size[0])
+    return Image.fromarray(postprocess_tens_uint8(tens_l_orig, out_ab, HW_out=HW_out))
+
 def get_output_size(original_size):
     """Get the current output size based on user selection"""
     if resolution_choice == "Original":
@@ -67,13 +118,6 @@ def get_output_size(original_size):
     else:
         return resolution_options[resolution_choice]
 
-def resize_image_to_output(image, original_size):
-    """Resize image to the current output size"""
-    output_size = get_output_size(original_size)
-    if output_size != original_size:
-        return image.resize(output_size, Image.Resampling.LANCZOS)
-    return image
-
 def apply_adjustments(image, adjustments):
     """Apply all adjustments to the image"""
     img = image.copy()
@@ -232,37 +276,39 @@ if uploaded_file is not None:
     
     st.image(img, caption=f"Uploaded Image ({original_size[0]}x{original_size[1]})", use_container_width=True)
 
+    # Preprocessing and predictions are cached per uploaded image
+    img_np = np.array(img)
+    img_key = hashlib.sha1(img_np.tobytes()).hexdigest()
+    if st.session_state.colorize_cache is None or st.session_state.colorize_cache['key'] != img_key:
+        st.session_state.colorize_cache = {'key': img_key, 'tens': None, 'ab': {}}
+        st.session_state.colorized_img = None
+
     # Colorize button
     if st.button("Colorize Image") or st.session_state.colorized_img is not None:
-        if st.session_state.colorized_img is None:
-            # Load model
-            if model_option == "eccv16":
-                colorizer = eccv16(pretrained=True).eval()
-            else:
-                colorizer = siggraph17(pretrained=True).eval()
-
-            # Preprocess and colorize
+        if (st.session_state.colorized_img is None or st.session_state.colorized_model != model_option
+                or st.session_state.colorized_img.size != tuple(current_output_size)):
+            # Preprocess and colorize (or just re-render at a new size/model from cached predictions)
             with st.spinner("Colorizing image..."):
-                img_np = np.array(img)
-                tens_l_orig, tens_l_rs = preprocess_img(img_np, HW=(256,256))
-                out_img = postprocess_tens(tens_l_orig, colorizer(tens_l_rs).cpu())
+                colorized_pil = colorize_cached(img_np, model_option, current_output_size,
+                                                st.session_state.colorize_cache)
                 
-                # Convert to PIL Image
-                colorized_pil = Image.fromarray((out_img * 255).astype(np.uint8))
-                
-                # Store original colorized image
+                # Store colorized image, already at the output size
                 st.session_state.colorized_img = colorized_pil
+                st.session_state.colorized_model = model_option
                 st.session_state.edited_img = colorized_pil.copy()
         
         # Display current resolution info
         st.info(f"🖼️ Current Output Resolution: {current_output_size[0]}x{current_output_size[1]}")
         
-        # Apply adjustments to the base colorized image first
-        base_edited_img = apply_adjustments(st.session_state.colorized_img, st.session_state.adjustments)
-        
-        # Then resize to current output size for display
-        display_edited_img = resize_image_to_output(base_edited_img, st.session_state.original_size)
-        st.session_state.edited_img = display_edited_img
+        # Apply adjustments to the colorized image (rendered at the output size),
+        # only when the image, size or adjustments changed since the last rerun
+        image_key = f"{st.session_state.colorize_cache['key']}:{model_option}"
+        edited_adjustments = dict(st.session_state.adjustments)
+        edit_key = ExportCache.key(image_key, edited_adjustments, current_output_size, None)
+        if st.session_state.get('edited_key') != edit_key:
+            st.session_state.edited_img = apply_adjustments(st.session_state.colorized_img, st.session_state.adjustments)
+            st.session_state.edited_key = edit_key
+        display_edited_img = st.session_state.edited_img
         
         # Display colorized images side by side
         st.subheader("Colorized Image Comparison")
@@ -271,8 +317,7 @@ if uploaded_file is not None:
         col1, col2 = st.columns(2)
         
         with col1:
-            display_colorized_img = resize_image_to_output(st.session_state.colorized_img, st.session_state.original_size)
-            st.image(display_colorized_img, caption=f"Original Colorized ({current_output_size[0]}x{current_output_size[1]})", use_container_width=True)
+            st.image(st.session_state.colorized_img, caption=f"Original Colorized ({current_output_size[0]}x{current_output_size[1]})", use_container_width=True)
         
         with col2:
             st.image(display_edited_img, caption=f"Edited Version ({current_output_size[0]}x{current_output_size[1]})", use_container_width=True)
@@ -372,57 +417,18 @@ if uploaded_file is not None:
         # Create download buttons in columns for better layout
         cols = st.columns(len(download_formats))
         
+        exports = export_cache.get_many(image_key, edited_adjustments, current_output_size,
+                                        download_formats, display_edited_img)
         for i, fmt in enumerate(download_formats):
             with cols[i]:
-                # Apply adjustments and resize for download
-                base_edited = apply_adjustments(st.session_state.colorized_img, st.session_state.adjustments)
-                download_img = resize_image_to_output(base_edited, st.session_state.original_size)
-                
-                if fmt == "PNG":
-                    img_buffer = io.BytesIO()
-                    download_img.save(img_buffer, format='PNG', quality=100)
-                    st.download_button(
-                        label="Download PNG",
-                        data=img_buffer.getvalue(),
-                        file_name=f"colorized_{current_output_size[0]}x{current_output_size[1]}.png",
-                        mime="image/png",
-                        use_container_width=True
-                    )
-                
-                elif fmt == "JPG":
-                    img_buffer = io.BytesIO()
-                    rgb_img = download_img.convert('RGB')
-                    rgb_img.save(img_buffer, format='JPEG', quality=95)
-                    st.download_button(
-                        label="Download JPG",
-                        data=img_buffer.getvalue(),
-                        file_name=f"colorized_{current_output_size[0]}x{current_output_size[1]}.jpg",
-                        mime="image/jpeg",
-                        use_container_width=True
-                    )
-                
-                elif fmt == "PDF":
-                    img_buffer = io.BytesIO()
-                    rgb_img = download_img.convert('RGB')
-                    rgb_img.save(img_buffer, format='PDF')
-                    st.download_button(
-                        label="Download PDF",
-                        data=img_buffer.getvalue(),
-                        file_name=f"colorized_{current_output_size[0]}x{current_output_size[1]}.pdf",
-                        mime="application/pdf",
-                        use_container_width=True
-                    )
-                
-                elif fmt == "TIFF":
-                    img_buffer = io.BytesIO()
-                    download_img.save(img_buffer, format='TIFF', compression='tiff_lzw')
-                    st.download_button(
-                        label="Download TIFF",
-                        data=img_buffer.getvalue(),
-                        file_name=f"colorized_{current_output_size[0]}x{current_output_size[1]}.tiff",
-                        mime="image/tiff",
-                        use_container_width=True
-                    )
+                ext, mime = EXPORT_FORMATS[fmt]
+                st.download_button(
+                    label=f"Download {fmt}",
+                    data=exports[fmt],
+                    file_name=f"colorized_{current_output_size[0]}x{current_output_size[1]}.{ext}",
+                    mime=mime,
+                    use_container_width=True
+                )
 
 # Add some information in the sidebar
 st.sidebar.header("About")
@@ -1,6 +1,42 @@
 
-from .base_color import *
-from .eccv16 import *
-from .siggraph17 import *
-from .util import *
+# Submodules (and torch, skimage, ...) are only imported when one of their names is
+# first used, so `import colorizers` and CLI --help stay fast in short-lived processes.
+import sys
+import types
+import importlib
 
+_LAZY = {
+	'BaseColor': 'base_color',
+	'ECCVGenerator': 'eccv16', 'eccv16': 'eccv16',
+	'SIGGRAPHGenerator': 'siggraph17', 'siggraph17': 'siggraph17',
+	'FastGenerator': 'fast16', 'fast16': 'fast16',
+	'MODEL_TYPES': 'models', 'build_colorizer': 'models', 'load_pruned': 'pruning',
+	'load_img': 'util', 'save_img': 'util', 'resize_img': 'util', 'ASPECT_BUCKETS': 'util',
+	'check_inference_size': 'util', 'letterbox_shape': 'util', 'letterbox_img': 'util', 'unpad_ab': 'util',
+	'preprocess_img': 'util', 'preprocess_img_letterbox': 'util', 'postprocess_tens': 'util',
+	'resize_l': 'util', 'lab2rgb_tens': 'util', 'postprocess_tens_uint8': 'util',
+	'Colorizer': 'api', 'as_rgb_tensor': 'api', 'encode_img': 'api',
+	'run_models': 'ensemble', 'blend_ab': 'ensemble', 'colorize_multi': 'ensemble',
+}
+
+__all__ = list(_LAZY)
+
+def __getattr__(name):
+	if name not in _LAZY:
+		raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+	value = getattr(importlib.import_module('.'+_LAZY[name], __name__), name)
+	globals()[name] = value
+	return value
+
+def __dir__():
+	return sorted(set(globals()) | set(_LAZY))
+
+class _Package(types.ModuleType):
+	def __setattr__(self, name, value):
+		# loading the eccv16/siggraph17/fast16 submodules binds them as package attributes;
+		# keep the model factories of the same name there instead, as the old star imports did
+		if name in ('eccv16', 'siggraph17', 'fast16') and isinstance(value, types.ModuleType):
+			return
+		super().__setattr__(name, value)
+
+sys.modules[__name__].__class__ = _Package
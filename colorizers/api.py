@@ -0,0 +1,123 @@
+import io
+import warnings
+
+import numpy as np
+import torch
+from PIL import Image
+
+from .buffers import FrameBufferPool
+from .models import build_colorizer
+from .util import check_inference_size
+
+def _from_numpy(arr):
+    if any(s < 0 for s in arr.strides):
+        # torch cannot wrap negative strides (e.g. a [:,:,::-1] BGR view)
+        arr = np.ascontiguousarray(arr)
+    if not arr.flags.writeable:
+        # the pixels are only read; torch warns about read-only arrays regardless
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            return torch.from_numpy(arr)
+    return torch.from_numpy(arr)
+
+def as_rgb_tensor(src):
+    """
+    HxWx3 uint8 RGB tensor for an in-memory image, sharing its memory where possible
+    src is encoded image bytes (bytes, bytearray, memoryview), a PIL image, a NumPy array
+    (HxW gray, HxWx3 RGB or HxWx4 RGBA, uint8 or float in [0,1]) or any tensor exporting
+    DLPack (torch, CuPy, JAX, ...). uint8 arrays and tensors are wrapped rather than copied
+    and stay on their device; gray is broadcast to 3 channels and alpha dropped as views.
+    Decoding bytes, reading PIL pixels and float inputs allocate.
+    """
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        src = Image.open(io.BytesIO(src))
+    if isinstance(src, Image.Image):
+        if src.mode not in ('L', 'RGB', 'RGBA'):
+            src = src.convert('RGB')
+        src = np.asarray(src)
+    if isinstance(src, np.ndarray):
+        tens = _from_numpy(src)
+    elif isinstance(src, torch.Tensor):
+        tens = src
+    elif hasattr(src, '__dlpack__'):
+        tens = torch.from_dlpack(src)
+    else:
+        raise TypeError(f"expected image bytes, a PIL image, a NumPy array or a DLPack tensor, got {type(src).__name__}")
+
+    if tens.dtype.is_floating_point:
+        tens = tens.clamp(0, 1).mul(255.).round_().to(torch.uint8)
+    elif tens.dtype != torch.uint8:
+        raise TypeError(f"expected uint8 or float pixels, got {tens.dtype}")
+    if tens.ndim == 2:
+        tens = tens[:,:,None]
+    if tens.ndim != 3 or tens.shape[2] not in (1, 3, 4):
+        raise ValueError(f"expected an HxW, HxWx3 or HxWx4 image, got shape {tuple(tens.shape)}")
+    return tens.expand(-1, -1, 3) if tens.shape[2] == 1 else tens[:,:,:3]
+
+def _out_tensor(out, H, W):
+    if isinstance(out, torch.Tensor):
+        tens = out
+    else:
+        arr = out if isinstance(out, np.ndarray) else np.frombuffer(out, dtype=np.uint8)
+        if not arr.flags.writeable:
+            raise ValueError('out buffer is read-only')
+        tens = torch.from_numpy(arr)
+    if tens.dtype != torch.uint8 or tens.numel() != H*W*3 or tens.device.type != 'cpu' or not tens.is_contiguous():
+        raise ValueError(f"out must be a contiguous CPU uint8 buffer of {H}x{W}x3, got "
+                         f"{tuple(tens.shape)} {tens.dtype} on {tens.device}")
+    return tens.view(H, W, 3)
+
+def encode_img(img, format='PNG', **params):
+    """Encode an HxWx3 uint8 RGB array (e.g. a Colorizer result) to image file bytes"""
+    buf = io.BytesIO()
+    Image.fromarray(np.asarray(img)).save(buf, format=format, **params)
+    return buf.getvalue()
+
+class Colorizer():
+    """
+    In-memory colorization for embedding in other Python services
+    Inputs are read straight from memory (see as_rgb_tensor), and every full-resolution
+    stage writes into a FrameBufferPool, so repeated calls at the same image size make no
+    image-sized allocations. The network input is computed as preprocess_img does, so
+    results match demo_release/batch_colorize (preprocess_img + postprocess_tens) up to
+    float32 rounding. Not thread-safe: use one per thread.
+    """
+    def __init__(self, model='eccv16', device='cpu', size=256, pretrained=True):
+        """
+        Args:
+            model: a model type from MODEL_TYPES, or an already built colorizer
+            size: inference resolution (multiple of 8)
+        """
+        check_inference_size((size,size))
+        if isinstance(model, str):
+            model = build_colorizer(model, pretrained=pretrained)
+        self.model = model.eval().to(device)
+        self.size = size
+        self.pool = FrameBufferPool(device)
+
+    def colorize(self, src, out=None):
+        """
+        Colorize one in-memory image (anything as_rgb_tensor accepts)
+        Args:
+            out: optional writable buffer for the HxWx3 uint8 RGB result: a NumPy array,
+                a CPU tensor, or a bytearray/memoryview of H*W*3 bytes
+        Returns:
+            HxWx3 uint8 RGB NumPy array viewing out, or else a pool buffer that the next
+            call with the same image size overwrites (copy it if it has to outlive that).
+            It exports DLPack, so torch.from_dlpack(result) wraps it without a copy.
+        """
+        rgb = as_rgb_tensor(src)
+        H, W = rgb.shape[:2]
+        dst = None if out is None else _out_tensor(out, H, W)
+
+        # the resize runs in PIL on the host, like preprocess_img (device inputs are copied back for it)
+        tens_l_rs, _ = self.pool.network_input(rgb.cpu().numpy(), size=self.size, bgr=False)
+        tens_l_orig = self.pool.rgb2l(rgb.to(self.pool.device), bgr=False)
+        with torch.no_grad():
+            out_ab = self.model(tens_l_rs)
+        ab_full = self.pool.upsample_ab(out_ab, (H,W))
+        return self.pool.lab2u8(tens_l_orig, ab_full, bgr=False, out=dst).numpy()
+
+    def colorize_bytes(self, src, format='PNG', **params):
+        """Colorize one in-memory image and return it encoded (PNG by default)"""
+        return encode_img(self.colorize(src), format=format, **params)
@@ -0,0 +1,214 @@
+import numpy as np
+import torch
+from PIL import Image
+
+from .util import check_inference_size, letterbox_shape, letterbox_pad, _XYZ_FROM_RGB, _XYZ_REF_WHITE
+
+class FrameBufferPool():
+    """
+    Reusable tensors for colorizing a stream of same-sized frames
+    Every frame-resolution stage (L extraction, ab upsampling, Lab->RGB, quantization)
+    writes into tensors kept here, keyed by name and shape, so steady-state video
+    processing makes no frame-sized allocations; the resize to the network input also reads
+    the frame from a pooled buffer (see resize). Only inference-resolution tensors, PIL's
+    one-axis resampling pass and the network's own activations are allocated per frame.
+    """
+    def __init__(self, device='cpu', pin_memory=None):
+        self.device = torch.device(device)
+        if pin_memory is None:
+            pin_memory = self.device.type == 'cuda'
+        self.pin_memory = pin_memory
+        self.buffers = {}
+
+        self.rgb_from_xyz = torch.linalg.inv(torch.tensor(_XYZ_FROM_RGB, dtype=torch.float64)).float().to(self.device)
+        self.ref_white = torch.tensor(_XYZ_REF_WHITE, device=self.device).view(3,1,1)
+        self.rgb_weights = (0.212671, 0.715160, 0.072169)
+
+    def get(self, name, shape, dtype=torch.float32, host=False):
+        """Return the buffer for (name, shape, dtype), allocating it on first use"""
+        key = (name, tuple(shape), dtype, host)
+        buf = self.buffers.get(key)
+        if buf is None:
+            if host:
+                buf = torch.empty(shape, dtype=dtype, pin_memory=self.pin_memory)
+            else:
+                buf = torch.empty(shape, dtype=dtype, device=self.device)
+            self.buffers[key] = buf
+        return buf
+
+    def _upsample_indices(self, size_in, size_out, name):
+        # source indices and weights reproducing F.interpolate(mode='bilinear', align_corners=False)
+        key = ('idx_'+name, size_in, size_out)
+        if key not in self.buffers:
+            src = ((torch.arange(size_out, dtype=torch.float64)+.5)*(size_in/size_out) - .5).clamp(min=0)
+            i0 = src.floor().long().clamp(max=size_in-1)
+            i1 = (i0+1).clamp(max=size_in-1)
+            w = (src-i0).float()
+            self.buffers[key] = (i0.to(self.device), i1.to(self.device), w.to(self.device))
+        return self.buffers[key]
+
+    def load_frame(self, frame_bgr):
+        """Copy a HxWx3 uint8 BGR frame (numpy) into the pool and return it on the device"""
+        H, W = frame_bgr.shape[:2]
+        host = self.get('frame_u8', (H,W,3), torch.uint8, host=True)
+        host.numpy()[...] = frame_bgr
+        if self.device.type == 'cpu':
+            return host
+        dev = self.get('frame_u8', (H,W,3), torch.uint8)
+        dev.copy_(host, non_blocking=True)
+        return dev
+
+    def rgb2l(self, frame_u8, bgr=True, name='l'):
+        """Lightness channel (as skimage.color.rgb2lab) of a HxWx3 uint8 tensor, written into the pool"""
+        H, W = frame_u8.shape[:2]
+        rgb = self.get('rgb', (3,H,W))
+        tmp = self.get('tmp3', (3,H,W))
+        mask = self.get('mask3', (3,H,W), torch.bool)
+        for c in range(3):
+            rgb[c].copy_(frame_u8[:,:,2-c] if bgr else frame_u8[:,:,c])
+        rgb.div_(255.)
+
+        # sRGB gamma -> linear
+        torch.gt(rgb, 0.04045, out=mask)
+        torch.add(rgb, 0.055, out=tmp)
+        tmp.div_(1.055).pow_(2.4)
+        rgb.div_(12.92)
+        torch.where(mask, tmp, rgb, out=rgb)
+
+        # Y (D65 white has Y = 1) -> L
+        y = self.get('y', (H,W))
+        torch.mul(rgb[0], self.rgb_weights[0], out=y)
+        y.add_(rgb[1], alpha=self.rgb_weights[1]).add_(rgb[2], alpha=self.rgb_weights[2])
+        l = self.get(name, (1,1,H,W))
+        t = self.get('tmp1', (H,W))
+        torch.pow(y, 1/3., out=t)
+        t.mul_(116.).sub_(16.)
+        torch.gt(y, 0.008856, out=mask[0])
+        y.mul_(903.3)
+        torch.where(mask[0], t, y, out=l[0,0])
+        return l
+
+    def resize(self, frame_u8, HW, resample=3):
+        """
+        PIL resize of a HxWx3 uint8 host frame (numpy), as resize_img, without a frame-sized allocation
+        The frame is copied into a pooled RGBX buffer that PIL wraps in place (PIL keeps RGB
+        pixels as RGBX too, so results are identical); Image.fromarray would copy it into
+        a new image every frame. Returns the resized hxwx3 array.
+        """
+        H, W = frame_u8.shape[:2]
+        rgbx = self.get('frame_rgbx', (H,W,4), torch.uint8, host=True).numpy()
+        rgbx[:,:,:3] = frame_u8
+        img = Image.frombuffer('RGBX', (W,H), rgbx, 'raw', 'RGBX', 0, 1)
+        return np.asarray(img.resize((HW[1],HW[0]), resample=resample))[:,:,:3]
+
+    def network_input(self, frame_u8, size=256, letterbox=False, bgr=True):
+        """
+        Inference-resolution L of a HxWx3 uint8 host frame (numpy), computed as preprocess_img
+        and preprocess_img_letterbox do: PIL bicubic resize of the color frame (plus reflect
+        padding with letterbox), then Lab. Resizing is per channel, so BGR frames go in as is.
+        Returns:
+            (1x1xhxw L on the pool's device, letterbox pad or None)
+        """
+        H, W = frame_u8.shape[:2]
+        if letterbox:
+            HW_rs, HW_pad = letterbox_shape(H, W, size=size)
+            img_rs, pad = letterbox_pad(self.resize(frame_u8, HW_rs), HW_pad)
+        else:
+            img_rs, pad = self.resize(frame_u8, (size,size)), None
+        # this copy is inference-sized
+        tens_rs = torch.from_numpy(np.ascontiguousarray(img_rs)).to(self.device)
+        return self.rgb2l(tens_rs, bgr=bgr, name='l_rs'), pad
+
+    def upsample_ab(self, out_ab, HW):
+        """Bilinearly resize a 1x2xhxw ab map to HW into the pool (same result as F.interpolate)"""
+        h, w = out_ab.shape[2:]
+        H, W = HW
+        y0, y1, wy = self._upsample_indices(h, H, 'y')
+        x0, x1, wx = self._upsample_indices(w, W, 'x')
+        ab = out_ab[0]
+
+        rows0 = self.get('rows0', (2,H,w))
+        rows1 = self.get('rows1', (2,H,w))
+        torch.index_select(ab, 1, y0, out=rows0)
+        torch.index_select(ab, 1, y1, out=rows1)
+        rows1.sub_(rows0).mul_(wy.view(1,H,1))
+        rows0.add_(rows1)
+
+        cols0 = self.get('cols0', (2,H,W))
+        ab_full = self.get('ab', (2,H,W))
+        torch.index_select(rows0, 2, x0, out=cols0)
+        torch.index_select(rows0, 2, x1, out=ab_full)
+        ab_full.sub_(cols0).mul_(wx.view(1,1,W)).add_(cols0)
+        return ab_full
+
+    def lab2u8(self, l, ab, bgr=True, out=None):
+        """
+        Lab -> sRGB -> uint8 HxWx3 (BGR by default) entirely in pool buffers
+        Args:
+            out: optional caller-owned HxWx3 uint8 host tensor to write the result into
+        Returns:
+            out, or a host uint8 tensor owned by the pool, overwritten by the next call
+        """
+        H, W = l.shape[2:]
+        f = self.get('tmp3', (3,H,W))
+        tmp = self.get('rgb', (3,H,W))
+        mask = self.get('mask3', (3,H,W), torch.bool)
+
+        fy = f[1]
+        torch.add(l[0,0], 16., out=fy)
+        fy.div_(116.)
+        torch.div(ab[0], 500., out=f[0])
+        f[0].add_(fy)
+        torch.div(ab[1], -200., out=f[2])
+        f[2].add_(fy).clamp_(min=0)
+
+        # f -> XYZ
+        torch.gt(f, 0.2068966, out=mask)
+        torch.pow(f, 3, out=tmp)
+        f.sub_(16./116.).div_(7.787)
+        torch.where(mask, tmp, f, out=f)
+        f.mul_(self.ref_white)
+
+        # XYZ -> linear RGB -> sRGB
+        torch.mm(self.rgb_from_xyz, f.view(3,-1), out=tmp.view(3,-1))
+        torch.gt(tmp, 0.0031308, out=mask)
+        torch.clamp(tmp, min=0.0031308, out=f)
+        f.pow_(1/2.4).mul_(1.055).sub_(0.055)
+        tmp.mul_(12.92)
+        torch.where(mask, f, tmp, out=tmp)
+        tmp.clamp_(0,1).mul_(255.)
+
+        on_host = self.device.type == 'cpu'
+        dst = out if out is not None and on_host else self.get('out_u8', (H,W,3), torch.uint8)
+        for c in range(3):
+            dst[:,:,c].copy_(tmp[2-c] if bgr else tmp[c])
+        if on_host:
+            return dst
+        host = out if out is not None else self.get('out_u8', (H,W,3), torch.uint8, host=True)
+        host.copy_(dst)
+        return host
+
+def colorize_frame_pooled(model, frame_bgr, pool, size=256, letterbox=False, return_ab=False):
+    """
+    Colorize one HxWx3 uint8 BGR frame using pool buffers for every frame-sized tensor
+    Returns:
+        HxWx3 uint8 BGR numpy array owned by the pool; it is overwritten by the next
+        call with the same frame shape, so copy it if it has to outlive that.
+        With return_ab, (frame, low-resolution ab prediction with padding removed).
+    """
+    check_inference_size((size,size))
+    H, W = frame_bgr.shape[:2]
+    tens_l_orig = pool.rgb2l(pool.load_frame(frame_bgr))
+    tens_l_rs, pad = pool.network_input(frame_bgr, size=size, letterbox=letterbox)
+
+    with torch.no_grad():
+        out_ab = model(tens_l_rs)
+    if pad is not None:
+        (top, bottom, left, right) = pad
+        out_ab = out_ab[:,:,top:out_ab.shape[2]-bottom,left:out_ab.shape[3]-right]
+
+    ab_full = pool.upsample_ab(out_ab, (H,W))
+    out = pool.lab2u8(tens_l_orig, ab_full, bgr=True).numpy()
+    if return_ab:
+        return out, out_ab
+    return out
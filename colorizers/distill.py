@@ -0,0 +1,41 @@
+import os
+import time
+
+import torch
+import torch.nn.functional as F
+
+# Training helpers shared by train_fast16.py (distilling fast16) and prune.py (fine-tuning
+# a pruned model against the original's predictions)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+def list_training_images(folders):
+    # image files under folders (searched recursively), in a stable order
+    paths = []
+    for folder in folders:
+        for root, _, files in os.walk(folder):
+            paths.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(IMAGE_EXTENSIONS))
+    return paths
+
+def distill(student, ls, ab_targets, epochs=30, batch_size=8, lr=2e-3, log_every=1):
+    """Train student to reproduce ab_targets from ls (smooth L1 on normalized ab)"""
+    optimizer = torch.optim.AdamW(student.parameters(), lr=lr, weight_decay=1e-4)
+    steps = epochs*((len(ls)+batch_size-1)//batch_size)
+    scheduler = torch.optim.lr_scheduler.OneCycleLR(optimizer, max_lr=lr, total_steps=steps)
+    student.train()
+    for epoch in range(epochs):
+        t0 = time.time()
+        order = torch.randperm(len(ls))
+        total = 0.
+        for i in range(0, len(ls), batch_size):
+            idx = order[i:i+batch_size]
+            pred = student(ls[idx].float())
+            loss = F.smooth_l1_loss(student.normalize_ab(pred), student.normalize_ab(ab_targets[idx].float()), beta=.05)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            scheduler.step()
+            total += loss.item()*len(idx)
+        if (epoch+1) % log_every == 0:
+            print(f"epoch {epoch+1:>3}/{epochs}  loss {total/len(ls):.4f}  ({time.time()-t0:.1f}s)")
+    return student.eval()
@@ -1,14 +1,17 @@
 
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import numpy as np
-from IPython import embed
 
 from .base_color import *
 
 class ECCVGenerator(BaseColor):
-    def __init__(self, norm_layer=nn.BatchNorm2d):
+    def __init__(self, norm_layer=nn.BatchNorm2d, T=1.):
         super(ECCVGenerator, self).__init__()
+        # decoding temperature: 1 is the mean of the predicted ab distribution, lower values
+        # sharpen it towards the mode ("annealed mean", more saturated colors; the paper uses .38)
+        self.T = T
 
         model1=[nn.Conv2d(1, 64, kernel_size=3, stride=1, padding=1, bias=True),]
         model1+=[nn.ReLU(True),]
@@ -84,7 +87,29 @@ class ECCVGenerator(BaseColor):
         self.model_out = nn.Conv2d(313, 2, kernel_size=1, padding=0, dilation=1, stride=1, bias=False)
         self.upsample4 = nn.Upsample(scale_factor=4, mode='bilinear')
 
-    def forward(self, input_l):
+    def decode(self, logits, T=None):
+        """
+        Expected ab of softmax(logits/T) over the 313 bins, without a normalized softmax:
+        one 1x1 conv with the bin centers (model_out) plus a row of ones gives the
+        unnormalized ab sums and the partition function together, and only the 2 ab
+        channels are divided instead of all 313 probabilities
+        """
+        T = self.T if T is None else T
+        e = logits - logits.amax(dim=1, keepdim=True)
+        if(T!=1):
+            e.div_(T)
+        e.exp_()
+        weight = torch.cat((self.model_out.weight, torch.ones_like(self.model_out.weight[:1])), dim=0)
+        out = F.conv2d(e, weight)
+        return out[:,:2]/out[:,2:]
+
+    def forward(self, input_l, T=None, HW_out=None):
+        """
+        Args:
+            T: decoding temperature (default self.T)
+            HW_out: resample the 1/4-resolution prediction straight to this size instead of
+                4x (e.g. the original image size, so postprocess_tens does not resample again)
+        """
         conv1_2 = self.model1(self.normalize_l(input_l))
         conv2_2 = self.model2(conv1_2)
         conv3_3 = self.model3(conv2_2)
@@ -93,12 +118,14 @@ class ECCVGenerator(BaseColor):
         conv6_3 = self.model6(conv5_3)
         conv7_3 = self.model7(conv6_3)
         conv8_3 = self.model8(conv7_3)
-        out_reg = self.model_out(self.softmax(conv8_3))
+        out_reg = self.decode(conv8_3, T)
 
+        if(HW_out is not None):
+            return self.unnormalize_ab(F.interpolate(out_reg, size=tuple(HW_out), mode='bilinear', align_corners=False))
         return self.unnormalize_ab(self.upsample4(out_reg))
 
-def eccv16(pretrained=True):
-	model = ECCVGenerator()
+def eccv16(pretrained=True, T=1.):
+	model = ECCVGenerator(T=T)
 	if(pretrained):
 		import torch.utils.model_zoo as model_zoo
 		model.load_state_dict(model_zoo.load_url('https://colorizers.s3.us-east-2.amazonaws.com/colorization_release_v2-9b330a0b.pth',map_location='cpu',check_hash=True))
@@ -0,0 +1,60 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from .util import preprocess_img, postprocess_tens_uint8
+
+def run_models(models, tens_l_rs, parallel=None):
+	"""
+	Run several colorizers on the same preprocessed L tensor
+	Args:
+		models: dict of name -> colorizer (eval mode)
+		tens_l_rs: 1 x 1 x H x W resized L from preprocess_img
+		parallel: run the models on separate threads (default: when there are at
+			least two CPU cores per model; torch releases the GIL during forward)
+	Returns:
+		dict of name -> 1 x 2 x H x W ab prediction, left on its model's device (so blending
+		and postprocess_tens_uint8 run there too; only the final uint8 image is copied back)
+	"""
+	if parallel is None:
+		parallel = len(models) > 1 and (os.cpu_count() or 1) >= 2*len(models)
+
+	def run(model):
+		device = next(model.parameters()).device
+		with torch.no_grad():
+			return model(tens_l_rs.to(device))
+
+	if not parallel:
+		return {name: run(model) for name, model in models.items()}
+	with ThreadPoolExecutor(max_workers=len(models)) as pool:
+		futures = {name: pool.submit(run, model) for name, model in models.items()}
+		return {name: future.result() for name, future in futures.items()}
+
+def blend_ab(ab_preds, weights=None):
+	# weighted average of ab predictions (equal weights by default), on the first one's device
+	if weights is None:
+		weights = {name: 1. for name in ab_preds}
+	total = float(sum(weights[name] for name in ab_preds))
+	device = next(iter(ab_preds.values())).device
+	return sum(ab_preds[name].to(device)*(weights[name]/total) for name in ab_preds)
+
+def colorize_multi(models, img_rgb, HW=(256,256), blend=False, weights=None, parallel=None, include_gray=False):
+	"""
+	Colorize one image with several models, preprocessing it only once
+	Args:
+		models: dict of name -> colorizer, e.g. {'eccv16': eccv16().eval(), 'siggraph17': siggraph17().eval()}
+		img_rgb: H x W x 3 uint8 RGB image
+		blend: also return an 'ensemble' result from the (weighted) mean ab prediction
+		weights: dict of name -> blend weight
+		include_gray: also return the 'gray' network input (original L, zero ab)
+	Returns:
+		dict of name -> H x W x 3 uint8 RGB result
+	"""
+	(tens_l_orig, tens_l_rs) = preprocess_img(img_rgb, HW=HW)
+	ab_preds = run_models(models, tens_l_rs, parallel=parallel)
+	if blend:
+		ab_preds['ensemble'] = blend_ab(ab_preds, weights)
+	if include_gray:
+		ab_preds['gray'] = torch.zeros_like(next(iter(ab_preds.values())))
+	return {name: postprocess_tens_uint8(tens_l_orig, ab) for name, ab in ab_preds.items()}
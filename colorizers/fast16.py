@@ -0,0 +1,78 @@
+import os
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from .base_color import *
+
+# Where train_fast16.py saves the distilled weights (there is no released checkpoint)
+FAST16_WEIGHTS = os.path.join(os.path.expanduser('~'), '.cache', 'colorizers', 'fast16.pth')
+
+def sep_conv(in_ch, out_ch, stride=1, dilation=1, norm_layer=nn.BatchNorm2d):
+    # depthwise 3x3 + pointwise 1x1: about 9x fewer multiply-adds than a full 3x3 conv
+    return [nn.Conv2d(in_ch, in_ch, kernel_size=3, stride=stride, padding=dilation, dilation=dilation, groups=in_ch, bias=False),
+            norm_layer(in_ch),
+            nn.ReLU(True),
+            nn.Conv2d(in_ch, out_ch, kernel_size=1, bias=False),
+            norm_layer(out_ch),
+            nn.ReLU(True),]
+
+class FastGenerator(BaseColor):
+    def __init__(self, width=32, norm_layer=nn.BatchNorm2d):
+        """
+        Compact depthwise-separable colorizer, distilled from eccv16/siggraph17
+        Same interface as ECCVGenerator: 1 x 1 x H x W L in [0,100] (H, W multiples of 8)
+        in, 1 x 2 x H x W ab out.
+        Args:
+            width: channels at 1/2 resolution; 2x and 4x that at 1/4 and 1/8
+        """
+        super(FastGenerator, self).__init__()
+        self.width = width
+
+        # 1/2 and 1/4 resolution
+        model1=[nn.Conv2d(1, width, kernel_size=3, stride=2, padding=1, bias=False),]
+        model1+=[norm_layer(width),]
+        model1+=[nn.ReLU(True),]
+        model1+=sep_conv(width, 2*width, stride=2, norm_layer=norm_layer)
+
+        # 1/8 resolution, dilated for a wide receptive field (the role of ECCV's conv5/conv6)
+        model2=sep_conv(2*width, 4*width, stride=2, norm_layer=norm_layer)
+        for dilation in (1, 2, 4, 2, 1):
+            model2+=sep_conv(4*width, 4*width, dilation=dilation, norm_layer=norm_layer)
+
+        # back to 1/4 resolution, merged with the 1/4 features
+        self.up = nn.Upsample(scale_factor=2, mode='bilinear', align_corners=False)
+        model3=sep_conv(6*width, 2*width, norm_layer=norm_layer)
+        model3+=sep_conv(2*width, 2*width, norm_layer=norm_layer)
+        model3+=[nn.Conv2d(2*width, 2, kernel_size=1, bias=True),]
+
+        self.model1 = nn.Sequential(*model1)
+        self.model2 = nn.Sequential(*model2)
+        self.model3 = nn.Sequential(*model3)
+        self.upsample4 = nn.Upsample(scale_factor=4, mode='bilinear', align_corners=False)
+
+    def forward(self, input_l, HW_out=None):
+        feat_4 = self.model1(self.normalize_l(input_l))
+        feat_8 = self.model2(feat_4)
+        out_reg = self.model3(torch.cat((feat_4, self.up(feat_8)), dim=1))
+
+        if HW_out is not None:
+            # one resample from 1/4 resolution straight to the requested size
+            return self.unnormalize_ab(F.interpolate(out_reg, size=tuple(HW_out), mode='bilinear', align_corners=False))
+        return self.unnormalize_ab(self.upsample4(out_reg))
+
+def fast16(pretrained=True, weights_path=None):
+    """
+    Build the fast colorizer; pretrained loads the weights written by train_fast16.py
+    (weights_path, default FAST16_WEIGHTS)
+    """
+    path = weights_path or FAST16_WEIGHTS
+    if not pretrained:
+        return FastGenerator()
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"no fast16 weights at {path}; train them with: python train_fast16.py -i <image folder>")
+    checkpoint = torch.load(path, map_location='cpu')
+    model = FastGenerator(width=checkpoint.get('width', 32))
+    model.load_state_dict(checkpoint['state_dict'])
+    return model
@@ -0,0 +1,16 @@
+
+# Model types selectable by name in VideoColorizer and the CLIs
+MODEL_TYPES = ('eccv16', 'siggraph17', 'fast16')
+
+def build_colorizer(model_type, pretrained=True):
+	# construct a colorizer by name (call .eval() before inference)
+	if(model_type=='eccv16'):
+		from .eccv16 import eccv16
+		return eccv16(pretrained=pretrained)
+	if(model_type=='siggraph17'):
+		from .siggraph17 import siggraph17
+		return siggraph17(pretrained=pretrained)
+	if(model_type=='fast16'):
+		from .fast16 import fast16
+		return fast16(pretrained=pretrained)
+	raise ValueError('unknown model type %r, expected one of %s'%(model_type, MODEL_TYPES))
@@ -0,0 +1,260 @@
+import copy
+
+import torch
+import torch.nn as nn
+
+# Structured pruning of the 512-channel trunk (model4-model7) shared by ECCVGenerator and
+# SIGGRAPHGenerator. Output channels of a conv are removed together with the matching
+# input channels of the conv that consumes them (and the block's BatchNorm in between),
+# so the result is a physically narrower network rather than a masked one.
+
+PRUNABLE_BLOCKS = ('model4', 'model5', 'model6', 'model7')
+
+class PrunableLayer():
+    """A trunk conv, the BatchNorm after it (last conv of a block only) and its consumer"""
+    def __init__(self, name, conv, bn, consumer):
+        # each of conv/bn/consumer is a (Sequential, index) slot, so pruning can swap modules
+        self.name = name
+        self.conv_slot = conv
+        self.bn_slot = bn
+        self.consumer_slot = consumer
+
+    @staticmethod
+    def _get(slot):
+        return None if slot is None else slot[0][slot[1]]
+
+    @property
+    def conv(self):
+        return self._get(self.conv_slot)
+
+    @property
+    def bn(self):
+        return self._get(self.bn_slot)
+
+    @property
+    def consumer(self):
+        return self._get(self.consumer_slot)
+
+    @property
+    def width(self):
+        return self.conv.out_channels
+
+def prunable_layers(model):
+    """The prunable convs of an ECCV/SIGGRAPH generator, in forward order"""
+    blocks = [getattr(model, name) for name in PRUNABLE_BLOCKS]
+    # the trunk output feeds the first upsampling layer (model8[0] in ECCV, model8up[0] in SIGGRAPH)
+    tail = (model.model8up if hasattr(model, 'model8up') else model.model8, 0)
+    layers = []
+    for b, (name, block) in enumerate(zip(PRUNABLE_BLOCKS, blocks)):
+        conv_idx = [i for i, m in enumerate(block) if isinstance(m, nn.Conv2d)]
+        bn_idx = [i for i, m in enumerate(block) if isinstance(m, nn.BatchNorm2d)][-1]
+        for j, i in enumerate(conv_idx):
+            if j+1 < len(conv_idx):
+                layers.append(PrunableLayer(f"{name}.{i}", (block, i), None, (block, conv_idx[j+1])))
+            else:
+                consumer = (blocks[b+1], 0) if b+1 < len(blocks) else tail
+                layers.append(PrunableLayer(f"{name}.{i}", (block, i), (block, bn_idx), consumer))
+    return layers
+
+def layer_widths(model):
+    return {layer.name: layer.width for layer in prunable_layers(model)}
+
+def count_macs(model, size=256):
+    """Multiply-accumulates per conv module (and in total) for one size x size input"""
+    macs = {}
+    def hook(module, inputs, output):
+        k = module.kernel_size[0]*module.kernel_size[1]
+        if isinstance(module, nn.ConvTranspose2d):
+            n = inputs[0][0].numel()*module.out_channels*k//module.groups
+        else:
+            n = output[0].numel()*module.in_channels*k//module.groups
+        macs[module] = macs.get(module, 0) + n
+    handles = [m.register_forward_hook(hook) for m in model.modules() if isinstance(m, (nn.Conv2d, nn.ConvTranspose2d))]
+    try:
+        with torch.no_grad():
+            model(torch.zeros(1, 1, size, size, device=next(model.parameters()).device))
+    finally:
+        for h in handles:
+            h.remove()
+    return macs, sum(macs.values())
+
+def _consumer_weight_per_input(consumer):
+    # consumer weight arranged as in_channels x (everything else)
+    w = consumer.weight.detach()
+    if isinstance(consumer, nn.ConvTranspose2d):
+        return w.flatten(1)
+    return w.transpose(0, 1).flatten(1)
+
+def channel_stats(model, batches):
+    """
+    Per-channel mean and variance of every prunable layer's output as its consumer sees it
+    (after ReLU, and after the BatchNorm for the last conv of a block)
+    Args:
+        batches: iterable of N x 1 x H x W L tensors (the calibration set)
+    Returns:
+        dict of layer name -> (mean, var) tensors
+    """
+    layers = prunable_layers(model)
+    sums = {layer.name: [0., 0., 0] for layer in layers}
+    def make_hook(name):
+        def hook(module, inputs):
+            x = inputs[0].detach().double()
+            acc = sums[name]
+            acc[0] = acc[0] + x.sum((0, 2, 3))
+            acc[1] = acc[1] + (x*x).sum((0, 2, 3))
+            acc[2] += x.numel()//x.shape[1]
+        return hook
+    handles = [layer.consumer.register_forward_pre_hook(make_hook(layer.name)) for layer in layers]
+    try:
+        with torch.no_grad():
+            for batch in batches:
+                model(batch)
+    finally:
+        for h in handles:
+            h.remove()
+    stats = {}
+    for name, (s, s2, n) in sums.items():
+        if n == 0:
+            raise ValueError("empty calibration set")
+        mean = s/n
+        stats[name] = (mean.float(), (s2/n - mean*mean).clamp(min=0).float())
+    return stats
+
+def channel_importance(model, stats):
+    """
+    Importance of each output channel: the spread of its activation times the norm of the
+    consumer weights reading it, i.e. how much the consumer's output moves when the channel
+    is replaced by its calibration mean (which prune_channels folds into the consumer bias)
+    """
+    importance = {}
+    for layer in prunable_layers(model):
+        _, var = stats[layer.name]
+        w_norm = _consumer_weight_per_input(layer.consumer).norm(dim=1).float().cpu()
+        importance[layer.name] = var.cpu().sqrt()*w_norm
+    return importance
+
+def plan_widths(model, importance, target_macs, size=256, round_to=8, min_channels=64):
+    """
+    Choose per-layer widths with total MACs at most target_macs
+    Channels are removed round_to at a time from whichever layer gives up the least
+    (layer-normalized) importance per MAC saved, so widths stay SIMD friendly.
+    Returns:
+        (widths dict, kept channel indices dict, estimated MACs)
+    """
+    layers = prunable_layers(model)
+    macs, total = count_macs(model, size)
+    # MACs scale linearly with in and out channels: track the chain conv_0 -> ... -> conv_n -> tail
+    modules = [layer.conv for layer in layers] + [layers[-1].consumer]
+    base = [(macs[m], m.in_channels, m.out_channels) for m in modules]
+    other = total - sum(b[0] for b in base)
+
+    def estimate(widths):
+        result = other
+        for j, (m, c_in, c_out) in enumerate(base):
+            w_in = widths[j-1] if j > 0 else c_in
+            w_out = widths[j] if j < len(widths) else c_out
+            result += m*(w_in/c_in)*(w_out/c_out)
+        return result
+
+    order = [torch.argsort(importance[layer.name]) for layer in layers]
+    scores = [importance[layer.name]/importance[layer.name].mean().clamp(min=1e-12) for layer in layers]
+    base_widths = [layer.width for layer in layers]
+    widths = list(base_widths)
+    current = estimate(widths)
+    while current > target_macs:
+        best = None
+        for j, layer in enumerate(layers):
+            if widths[j] - round_to < min_channels:
+                continue
+            removed = base_widths[j] - widths[j]
+            cost = float(scores[j][order[j][removed:removed+round_to]].sum())
+            trial = widths[:j] + [widths[j] - round_to] + widths[j+1:]
+            saved = current - estimate(trial)
+            if best is None or cost/saved < best[0]:
+                best = (cost/saved, j, trial)
+        if best is None:
+            break
+        widths = best[2]
+        current = estimate(widths)
+
+    keep = {}
+    for j, layer in enumerate(layers):
+        removed = base_widths[j] - widths[j]
+        keep[layer.name] = order[j][removed:].sort().values
+    return {layer.name: w for layer, w in zip(layers, widths)}, keep, current
+
+def _slice_out(module, keep):
+    # copy of a conv keeping only the output channels in keep
+    new = copy.deepcopy(module)
+    new.weight = nn.Parameter(module.weight.detach()[keep].clone())
+    if module.bias is not None:
+        new.bias = nn.Parameter(module.bias.detach()[keep].clone())
+    new.out_channels = len(keep)
+    return new
+
+def _slice_bn(bn, keep):
+    new = copy.deepcopy(bn)
+    new.num_features = len(keep)
+    if bn.affine:
+        new.weight = nn.Parameter(bn.weight.detach()[keep].clone())
+        new.bias = nn.Parameter(bn.bias.detach()[keep].clone())
+    if bn.track_running_stats:
+        new.running_mean = bn.running_mean[keep].clone()
+        new.running_var = bn.running_var[keep].clone()
+    return new
+
+def _slice_in(module, keep, mean=None):
+    """
+    Copy of a conv keeping only the input channels in keep; the dropped channels' mean
+    contribution (mean: per input channel) is folded into the bias
+    """
+    new = copy.deepcopy(module)
+    w = module.weight.detach()
+    dropped = torch.ones(w.shape[1 if isinstance(module, nn.Conv2d) else 0], dtype=torch.bool)
+    dropped[keep] = False
+    if isinstance(module, nn.ConvTranspose2d):
+        new.weight = nn.Parameter(w[keep].clone())
+        # with stride s every output pixel sees about 1/s^2 of the kernel taps
+        per_tap = w[dropped].sum((2, 3)).t()/(module.stride[0]*module.stride[1])
+    else:
+        new.weight = nn.Parameter(w[:, keep].clone())
+        per_tap = w[:, dropped].sum((2, 3))
+    new.in_channels = len(keep)
+    if mean is not None and module.bias is not None and dropped.any():
+        new.bias = nn.Parameter(module.bias.detach() + per_tap @ mean[dropped].to(w))
+    return new
+
+def prune_channels(model, keep, stats=None):
+    """
+    Physically remove channels in place
+    Args:
+        keep: dict of layer name -> indices of the output channels to keep
+        stats: channel_stats of the unpruned model; the mean of each removed channel is
+            folded into its consumer's bias (omit to drop channels without compensation)
+    """
+    for layer in prunable_layers(model):
+        if layer.name not in keep:
+            continue
+        idx = torch.as_tensor(keep[layer.name], dtype=torch.long)
+        mean = stats[layer.name][0] if stats is not None else None
+        seq, i = layer.consumer_slot
+        seq[i] = _slice_in(layer.consumer, idx, mean)
+        seq, i = layer.conv_slot
+        seq[i] = _slice_out(layer.conv, idx)
+        if layer.bn_slot is not None:
+            seq, i = layer.bn_slot
+            seq[i] = _slice_bn(layer.bn, idx)
+    return model
+
+def set_widths(model, widths):
+    """Narrow a freshly built generator to the given layer widths (to load a pruned state dict)"""
+    return prune_channels(model, {name: torch.arange(w) for name, w in widths.items()})
+
+def load_pruned(path, map_location='cpu'):
+    """Load a model written by prune.py (call .eval() before inference)"""
+    from .models import build_colorizer
+
+    checkpoint = torch.load(path, map_location=map_location)
+    model = set_widths(build_colorizer(checkpoint['model_type'], pretrained=False), checkpoint['widths'])
+    model.load_state_dict(checkpoint['state_dict'])
+    return model
@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import glob
+
+import torch
+
+# Where `python benchmark.py autotune` stores the best measured settings
+RUNTIME_CONFIG_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'colorizers', 'runtime.json')
+
+BLAS_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS')
+
+def parse_cpulist(text):
+    # '0-3,8,10-11' -> [0, 1, 2, 3, 8, 10, 11]
+    cpus = []
+    for part in text.strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            lo, hi = part.split('-')
+            cpus.extend(range(int(lo), int(hi)+1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+def available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def numa_nodes():
+    # {node id: [cpus]} from sysfs, restricted to the CPUs this process may use; one node if unknown
+    allowed = set(available_cpus())
+    nodes = {}
+    for path in sorted(glob.glob('/sys/devices/system/node/node[0-9]*/cpulist')):
+        node = int(os.path.basename(os.path.dirname(path))[4:])
+        with open(path) as f:
+            cpus = [c for c in parse_cpulist(f.read()) if c in allowed]
+        if cpus:
+            nodes[node] = cpus
+    return nodes or {0: sorted(allowed)}
+
+def configure_runtime(num_threads=None, interop_threads=None, cpus=None, opencv_threads=None):
+    """
+    Set torch, OpenCV and BLAS thread pools (and optionally CPU affinity) for this process
+    Args:
+        num_threads: intra-op threads for torch and BLAS (default: one per usable CPU)
+        interop_threads: torch inter-op threads; only takes effect before torch runs any parallel work
+        cpus: pin this process to these CPU ids
+        opencv_threads: OpenCV threads (default: same as num_threads)
+    Returns:
+        dict of the settings that were applied
+    """
+    if cpus:
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, cpus)
+        if num_threads is None:
+            num_threads = len(cpus)
+    if num_threads is None:
+        num_threads = len(available_cpus())
+
+    # BLAS libraries read these when they initialise; threadpoolctl covers ones already loaded
+    for var in BLAS_ENV_VARS:
+        os.environ[var] = str(num_threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(num_threads)
+    except ImportError:
+        pass
+
+    torch.set_num_threads(num_threads)
+    if interop_threads is not None:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            # already fixed for this process
+            pass
+
+    try:
+        import cv2
+        cv2.setNumThreads(opencv_threads if opencv_threads is not None else num_threads)
+    except ImportError:
+        pass
+
+    return {'num_threads': num_threads, 'interop_threads': torch.get_num_interop_threads(),
+            'cpus': list(cpus) if cpus else None}
+
+def worker_runtime(worker_index, num_workers, pin=None):
+    """
+    Thread and affinity settings for one worker out of num_workers sharing this machine
+    Args:
+        pin: None (threads split evenly, no pinning), 'core' (disjoint CPU sets)
+             or 'numa' (workers spread over NUMA nodes, pinned to their node's CPUs)
+    Returns:
+        configure_runtime keyword arguments
+    """
+    cpus = available_cpus()
+    if pin == 'numa':
+        nodes = list(numa_nodes().values())
+        node_cpus = nodes[worker_index % len(nodes)]
+        workers_on_node = len(range(worker_index % len(nodes), num_workers, len(nodes)))
+        slot = worker_index // len(nodes)
+        share = max(1, len(node_cpus) // workers_on_node)
+        return {'num_threads': share, 'interop_threads': 1, 'cpus': node_cpus[slot*share:(slot+1)*share] or node_cpus}
+    share = max(1, len(cpus) // num_workers)
+    if pin == 'core':
+        return {'num_threads': share, 'interop_threads': 1,
+                'cpus': cpus[worker_index*share:(worker_index+1)*share] or cpus}
+    return {'num_threads': share, 'interop_threads': 1}
+
+def configure_worker(counter, num_workers, pin=None):
+    """
+    Process-pool initializer helper: claim the next worker index from a shared
+    multiprocessing.Value counter and configure this process for it
+    """
+    with counter.get_lock():
+        # restarted workers take over a slot modulo the pool size
+        index = counter.value % num_workers
+        counter.value += 1
+    return configure_runtime(**worker_runtime(index, num_workers, pin))
+
+def load_runtime_config(path=RUNTIME_CONFIG_PATH):
+    # saved autotune settings as configure_runtime keyword arguments ({} if none)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        config = json.load(f)
+    return {k: config[k] for k in ('num_threads', 'interop_threads') if k in config}
+
+def configure_from_saved(**overrides):
+    """
+    Apply the saved autotune settings, with any non-None keyword arguments taking precedence
+    Meant to be called once at the start of a CLI or app. With nothing saved and no
+    overrides, the process keeps torch's own defaults and None is returned.
+    """
+    config = load_runtime_config()
+    config.update({k: v for k, v in overrides.items() if v is not None})
+    if not config:
+        return None
+    return configure_runtime(**config)
+
+def save_runtime_config(config, path=RUNTIME_CONFIG_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(config, f, indent=2)
+
+def autotune(thread_counts=None, size=256, repeat=5, path=RUNTIME_CONFIG_PATH):
+    """
+    Time the ECCVGenerator forward pass at several intra-op thread counts and save the fastest
+    Returns:
+        (best config dict, {threads: median ms})
+    """
+    from .eccv16 import ECCVGenerator
+
+    if thread_counts is None:
+        n = len(available_cpus())
+        thread_counts = sorted(set([1, 2, 4, 8, 16, 32, 64, n]) & set(range(1, n+1)))
+
+    model = ECCVGenerator().eval()
+    tens = torch.rand(1, 1, size, size) * 100
+    results = {}
+    with torch.no_grad():
+        for threads in thread_counts:
+            configure_runtime(num_threads=threads)
+            model(tens)
+            times = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                model(tens)
+                times.append((time.perf_counter() - t0) * 1000)
+            results[threads] = sorted(times)[len(times)//2]
+
+    best = min(results, key=results.get)
+    config = {'num_threads': best, 'interop_threads': 1, 'size': size,
+              'forward_ms': results[best], 'measured': {str(k): v for k, v in results.items()}}
+    save_runtime_config(config, path)
+    return config, results
@@ -0,0 +1,171 @@
+import io
+import os
+import json
+import struct
+
+import numpy as np
+import torch
+
+from .util import unpad_ab, postprocess_tens_uint8
+
+# A colorized image is fully determined by its original L channel plus the network's
+# low-resolution ab prediction, so storing just the (quantized) ab map is enough to
+# render the result later at any size without running the network again.
+
+SIDECAR_VERSION = 1
+
+# released weight files, recorded so a sidecar can be traced back to what produced it
+MODEL_WEIGHTS = {
+    'eccv16': 'colorization_release_v2-9b330a0b.pth',
+    'siggraph17': 'siggraph17-df00044c.pth',
+    'fast16': 'fast16.pth (local, from train_fast16.py)',
+}
+_MODEL_NAMES = {'ECCVGenerator': 'eccv16', 'SIGGRAPHGenerator': 'siggraph17', 'FastGenerator': 'fast16'}
+
+def model_name(model):
+    # 'eccv16' / 'siggraph17' for the released architectures, else the class name
+    return _MODEL_NAMES.get(type(model).__name__, type(model).__name__)
+
+def sidecar_meta(model_type, inference_size=256, letterbox=False, **extra):
+    meta = {'version': SIDECAR_VERSION, 'model': model_type, 'weights': MODEL_WEIGHTS.get(model_type),
+            'inference_size': inference_size, 'letterbox': letterbox}
+    meta.update(extra)
+    return meta
+
+def quantize_ab(out_ab, dtype='int8'):
+    """
+    1 x 2 x h x w ab tensor -> (2 x h x w array, scale)
+    int8 uses one symmetric scale per map (error below 0.5% of the ab range);
+    float16 is stored as is with scale 1
+    """
+    ab = out_ab.detach().float().cpu().numpy()[0]
+    if dtype == 'float16':
+        return ab.astype(np.float16), 1.
+    if dtype != 'int8':
+        raise ValueError(f"unsupported sidecar dtype {dtype!r}, expected 'int8' or 'float16'")
+    scale = max(float(np.abs(ab).max()), 1e-6)/127.
+    return np.clip(np.round(ab/scale), -127, 127).astype(np.int8), scale
+
+def dequantize_ab(q, scale):
+    # inverse of quantize_ab, as a 1 x 2 x h x w float32 tensor
+    return torch.from_numpy(q.astype(np.float32)*np.float32(scale))[None]
+
+def save_sidecar(path, out_ab, meta, dtype='int8', pad=None):
+    """
+    Write a network ab prediction as a compressed .npz sidecar
+    Args:
+        out_ab: 1 x 2 x h x w prediction straight from the network
+        meta: dict from sidecar_meta (plus e.g. the original image size)
+        pad: letterbox padding to crop off first, so the stored map covers exactly the image
+    """
+    if pad is not None:
+        out_ab = unpad_ab(out_ab, pad)
+    q, scale = quantize_ab(out_ab, dtype)
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, ab=q, scale=np.float32(scale), meta=np.array(json.dumps(meta)))
+
+def load_sidecar(path):
+    # (1 x 2 x h x w float32 ab tensor, meta dict)
+    with np.load(path) as data:
+        return dequantize_ab(data['ab'], data['scale']), json.loads(str(data['meta']))
+
+def l_tens_from_uint8(img, bgr=False):
+    """
+    Lab lightness (as skimage.color.rgb2lab) of an H x W gray or H x W x 3 RGB (or BGR)
+    uint8 image, computed in torch as a 1 x 1 x H x W tensor
+    """
+    tens = torch.from_numpy(np.require(img, requirements=['C', 'W'])).float().div_(255.)
+    tens = torch.where(tens > 0.04045, ((tens+0.055)/1.055)**2.4, tens/12.92)
+    if tens.ndim == 3:
+        # Y of linear sRGB; a gray pixel has Y equal to its linear value since the weights sum to 1
+        r, g, b = (2, 1, 0) if bgr else (0, 1, 2)
+        tens = tens[:,:,r]*0.212671 + tens[:,:,g]*0.715160 + tens[:,:,b]*0.072169
+    l = torch.where(tens > 0.008856, 116.*tens**(1/3.) - 16., 903.3*tens)
+    return l[None,None]
+
+def render_sidecar(out_ab, img, size=None, bgr=False):
+    """
+    Combine a sidecar ab map with the original grayscale (or RGB) image
+    Args:
+        out_ab: 1 x 2 x h x w ab from load_sidecar (or an AbStream record)
+        img: H x W or H x W x 3 uint8 original image
+        size: (W, H) output size (default: the original size)
+        bgr: img is a BGR frame (e.g. from OpenCV), and so is the result
+    Returns:
+        uint8 RGB (or BGR) image at the requested size
+    """
+    HW_out = (size[1], size[0]) if size is not None else None
+    return postprocess_tens_uint8(l_tens_from_uint8(img, bgr=bgr), out_ab, bgr=bgr, HW_out=HW_out)
+
+# Video sidecars are a single file of fixed-size records so any frame can be found by seeking:
+#   MAGIC, uint32 header length, JSON header (meta, ab shape, dtype), then per processed frame
+#   int32 frame index, float32 scale, ab data
+_STREAM_MAGIC = b'ABSTREAM1\n'
+_RECORD_HEAD = struct.Struct('<if')
+
+class AbStreamWriter():
+    """Append per-frame ab predictions of one video to a stream sidecar"""
+    def __init__(self, path, meta, dtype='int8'):
+        self.path = path
+        self.meta = meta
+        self.dtype = dtype
+        self.f = None
+
+    def write(self, frame_index, out_ab, pad=None):
+        if pad is not None:
+            out_ab = unpad_ab(out_ab, pad)
+        q, scale = quantize_ab(out_ab, self.dtype)
+        if self.f is None:
+            header = json.dumps({'meta': self.meta, 'shape': list(q.shape), 'dtype': self.dtype}).encode()
+            self.f = open(self.path, 'wb')
+            self.f.write(_STREAM_MAGIC + struct.pack('<I', len(header)) + header)
+        self.f.write(_RECORD_HEAD.pack(frame_index, scale))
+        self.f.write(q.tobytes())
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class AbStreamReader():
+    """Random access to the records of a video stream sidecar"""
+    def __init__(self, path):
+        self.f = open(path, 'rb')
+        if self.f.read(len(_STREAM_MAGIC)) != _STREAM_MAGIC:
+            raise ValueError(f"{path} is not an ab stream sidecar")
+        (n,) = struct.unpack('<I', self.f.read(4))
+        header = json.loads(self.f.read(n))
+        self.meta = header['meta']
+        self.shape = tuple(header['shape'])
+        self.np_dtype = np.dtype(header['dtype'])
+        self.data_start = len(_STREAM_MAGIC) + 4 + n
+        self.record_size = _RECORD_HEAD.size + int(np.prod(self.shape))*self.np_dtype.itemsize
+        self.f.seek(0, io.SEEK_END)
+        self.count = (self.f.tell() - self.data_start)//self.record_size
+
+    def __len__(self):
+        return self.count
+
+    def read(self, i):
+        """(frame index, 1 x 2 x h x w ab tensor) of the i-th record"""
+        self.f.seek(self.data_start + i*self.record_size)
+        frame_index, scale = _RECORD_HEAD.unpack(self.f.read(_RECORD_HEAD.size))
+        q = np.frombuffer(self.f.read(self.record_size - _RECORD_HEAD.size), dtype=self.np_dtype).reshape(self.shape)
+        return frame_index, dequantize_ab(q, scale)
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.read(i)
+
+    def close(self):
+        self.f.close()
+
+def sidecar_path_for(out_path):
+    # color_x.png -> color_x.ab.npz
+    return os.path.splitext(out_path)[0] + '.ab.npz'
@@ -1,5 +1,6 @@
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 
 from .base_color import *
 
@@ -129,12 +130,80 @@ class SIGGRAPHGenerator(BaseColor):
         self.upsample4 = nn.Sequential(*[nn.Upsample(scale_factor=4, mode='bilinear'),])
         self.softmax = nn.Sequential(*[nn.Softmax(dim=1),])
 
-    def forward(self, input_A, input_B=None, mask_B=None):
-        if(input_B is None):
-            input_B = torch.cat((input_A*0, input_A*0), dim=1)
-        if(mask_B is None):
-            mask_B = input_A*0
+        self.low_memory = False
+        self.chunk_rows = None
+
+    def set_low_memory(self, enabled=True, chunk_rows=None):
+        """
+        Memory-planned inference for large inputs (eval mode, under torch.no_grad)
+        Skip branches are computed as soon as their source exists so the source can be freed,
+        skip sums are added in place, and chunk_rows (a multiple of 8) additionally runs the
+        full-resolution layers in horizontal strips, so the only full-resolution activation
+        held is the 64-channel conv1_2.
+        """
+        if(chunk_rows is not None and chunk_rows%8!=0):
+            raise ValueError('chunk_rows must be a multiple of 8, got %s'%(chunk_rows,))
+        self.low_memory = enabled
+        self.chunk_rows = chunk_rows if enabled else None
+        return self
+
+    def _strips(self, H):
+        step = self.chunk_rows or H
+        for a in range(0, H, step):
+            yield a, min(H, a+step)
+
+    def _forward_low_memory(self, input_A, input_B, mask_B):
+        N, _, H, W = input_A.shape
+
+        # model1 in strips with a 2-row halo (two 3x3 convs); rows next to a strip edge are
+        # wrong because of the zero padding there, and are cropped off
+        x = torch.cat((self.normalize_l(input_A),self.normalize_ab(input_B),mask_B),dim=1)
+        conv1_2 = x.new_empty((N, 64, H, W))
+        for a, b in self._strips(H):
+            a0, b0 = max(0, a-2), min(H, b+2)
+            conv1_2[:,:,a:b] = self.model1(x[:,:,a0:b0])[:,:,a-a0:b-a0]
+        del x
 
+        conv2_2 = self.model2(conv1_2[:,:,::2,::2])
+        short10 = None
+        if(not self.chunk_rows):
+            # unchunked, holding this skip costs less at the end than conv1_2 plus a second
+            # 128-channel full-resolution map; chunked, it is computed per strip instead
+            short10 = self.model1short10(conv1_2)
+            conv1_2 = None
+        short9 = self.model2short9(conv2_2)
+        conv3_3 = self.model3(conv2_2[:,:,::2,::2])
+        del conv2_2
+        short8 = self.model3short8(conv3_3)
+        conv4_3 = self.model4(conv3_3[:,:,::2,::2])
+        del conv3_3
+        conv7_3 = self.model7(self.model6(self.model5(conv4_3)))
+        del conv4_3
+
+        conv8_3 = self.model8(self.model8up(conv7_3).add_(short8))
+        del conv7_3, short8
+        conv9_3 = self.model9(self.model9up(conv8_3).add_(short9))
+        del conv8_3, short9
+
+        # model10up/model1short10/model10/model_out in strips with a 4-row halo (kept even so
+        # it stays aligned with the 1/2-resolution conv9_3 rows feeding the transposed conv)
+        out_reg = conv9_3.new_empty((N, 2, H, W))
+        H2 = conv9_3.shape[2]
+        for a, b in self._strips(H):
+            a0, b0 = max(0, a-4), min(H, b+4)
+            s, e = max(0, a0//2-1), min(H2, b0//2+1)
+            conv10_up = self.model10up(conv9_3[:,:,s:e])[:,:,a0-2*s:b0-2*s]
+            if(short10 is None):
+                conv10_up.add_(self.model1short10(conv1_2[:,:,a0:b0]))
+            else:
+                conv10_up.add_(short10)
+                short10 = None
+            conv10_2 = F.leaky_relu_(self.model10[1](conv10_up.relu_()), .2)
+            del conv10_up
+            out_reg[:,:,a:b] = self.model_out(conv10_2)[:,:,a-a0:b-a0]
+        return out_reg
+
+    def _forward_default(self, input_A, input_B, mask_B):
         conv1_2 = self.model1(torch.cat((self.normalize_l(input_A),self.normalize_ab(input_B),mask_B),dim=1))
         conv2_2 = self.model2(conv1_2[:,:,::2,::2])
         conv3_3 = self.model3(conv2_2[:,:,::2,::2])
@@ -149,14 +218,22 @@ class SIGGRAPHGenerator(BaseColor):
         conv9_3 = self.model9(conv9_up)
         conv10_up = self.model10up(conv9_3) + self.model1short10(conv1_2)
         conv10_2 = self.model10(conv10_up)
-        out_reg = self.model_out(conv10_2)
+        return self.model_out(conv10_2)
 
-        conv9_up = self.model9up(conv8_3) + self.model2short9(conv2_2)
-        conv9_3 = self.model9(conv9_up)
-        conv10_up = self.model10up(conv9_3) + self.model1short10(conv1_2)
-        conv10_2 = self.model10(conv10_up)
-        out_reg = self.model_out(conv10_2)
+    def forward(self, input_A, input_B=None, mask_B=None, HW_out=None):
+        if(input_B is None):
+            input_B = torch.cat((input_A*0, input_A*0), dim=1)
+        if(mask_B is None):
+            mask_B = input_A*0
+
+        if(self.low_memory):
+            out_reg = self._forward_low_memory(input_A, input_B, mask_B)
+        else:
+            out_reg = self._forward_default(input_A, input_B, mask_B)
 
+        if(HW_out is not None and tuple(HW_out)!=tuple(out_reg.shape[2:])):
+            # full-resolution output already; resampled here only so callers can treat all models alike
+            out_reg = F.interpolate(out_reg, size=tuple(HW_out), mode='bilinear', align_corners=False)
         return self.unnormalize_ab(out_reg)
 
 def siggraph17(pretrained=True):
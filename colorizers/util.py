@@ -1,10 +1,13 @@
 
 from PIL import Image
 import numpy as np
-from skimage import color
 import torch
 import torch.nn.functional as F
-from IPython import embed
+
+def _color():
+	# skimage is slow to import, so it is loaded on first use of a numpy Lab conversion
+	from skimage import color
+	return color
 
 def load_img(img_path):
 	out_np = np.asarray(Image.open(img_path))
@@ -12,27 +15,105 @@ def load_img(img_path):
 		out_np = np.tile(out_np[:,:,None],3)
 	return out_np
 
+def save_img(img_path, img):
+	# save an H x W x 3 RGB image, uint8 or float in [0,1] (truncated like plt.imsave)
+	if(img.dtype!=np.uint8):
+		img = (np.clip(img,0,1)*255).astype(np.uint8)
+	Image.fromarray(img).save(img_path)
+
 def resize_img(img, HW=(256,256), resample=3):
 	return np.asarray(Image.fromarray(img).resize((HW[1],HW[0]), resample=resample))
 
+# Short-side / long-side ratios that letterboxed inputs are padded up to, so a given
+# inference size only ever produces a handful of distinct tensor shapes
+ASPECT_BUCKETS = (1/2, 9/16, 3/4, 1.)
+
+def check_inference_size(HW):
+	if(HW[0]%8!=0 or HW[1]%8!=0):
+		raise ValueError('inference size must be a multiple of 8, got %s'%(HW,))
+
+def letterbox_shape(H, W, size=256, buckets=ASPECT_BUCKETS):
+	# return (resized HW, padded HW) for an H x W image with long side scaled to size
+	check_inference_size((size,size))
+	short = min(H,W)*size/max(H,W)
+	padded_short = min(int(round(b*size/8.))*8 for b in buckets if b*size >= short-1e-6)
+	resized_short = min(max(8, int(round(short))), padded_short)
+	if(H >= W):
+		return (size, resized_short), (size, padded_short)
+	return (resized_short, size), (padded_short, size)
+
+def letterbox_img(img, size=256, resample=3, buckets=ASPECT_BUCKETS):
+	# aspect-preserving resize so the long side is size, then reflect-pad up to a bucket shape
+	# returns padded image and pad=(top, bottom, left, right)
+	HW_rs, HW_pad = letterbox_shape(img.shape[0], img.shape[1], size=size, buckets=buckets)
+	return letterbox_pad(resize_img(img, HW=HW_rs, resample=resample), HW_pad)
+
+def letterbox_pad(img_rs, HW_pad):
+	# center an already resized H x W x C image in HW_pad with reflect padding
+	# returns padded image and pad=(top, bottom, left, right)
+	HW_rs = img_rs.shape[:2]
+	top = (HW_pad[0]-HW_rs[0])//2
+	left = (HW_pad[1]-HW_rs[1])//2
+	pad = (top, HW_pad[0]-HW_rs[0]-top, left, HW_pad[1]-HW_rs[1]-left)
+	img_pad = np.pad(img_rs, ((pad[0],pad[1]),(pad[2],pad[3]),(0,0)), mode='reflect' if min(HW_rs)>1 else 'edge')
+	return img_pad, pad
+
+def unpad_ab(out_ab, pad):
+	# crop the letterbox padding back off a network output
+	# out_ab 		1 x 2 x H x W, at the same resolution as the network input
+	(top, bottom, left, right) = pad
+	H, W = out_ab.shape[2:]
+	return out_ab[:,:,top:H-bottom,left:W-right]
+
+def _l_tensor(img_l):
+	# 1 x 1 x H x W float32 tensor wrapping a single float32 copy of an L plane
+	return torch.from_numpy(img_l.astype(np.float32))[None,None,:,:]
+
+def preprocess_img_letterbox(img_rgb_orig, size=256, resample=3, buckets=ASPECT_BUCKETS):
+	# like preprocess_img, but without distorting the aspect ratio
+	# returns (tens_orig_l, tens_rs_l, pad); pass pad on to postprocess_tens
+	img_rgb_rs, pad = letterbox_img(img_rgb_orig, size=size, resample=resample, buckets=buckets)
+
+	img_l_orig = _color().rgb2lab(img_rgb_orig)[:,:,0]
+	img_l_rs = _color().rgb2lab(img_rgb_rs)[:,:,0]
+
+	tens_orig_l = _l_tensor(img_l_orig)
+	tens_rs_l = _l_tensor(img_l_rs)
+
+	return (tens_orig_l, tens_rs_l, pad)
+
 def preprocess_img(img_rgb_orig, HW=(256,256), resample=3):
 	# return original size L and resized L as torch Tensors
+	check_inference_size(HW)
 	img_rgb_rs = resize_img(img_rgb_orig, HW=HW, resample=resample)
 	
-	img_lab_orig = color.rgb2lab(img_rgb_orig)
-	img_lab_rs = color.rgb2lab(img_rgb_rs)
+	img_lab_orig = _color().rgb2lab(img_rgb_orig)
+	img_lab_rs = _color().rgb2lab(img_rgb_rs)
 
 	img_l_orig = img_lab_orig[:,:,0]
 	img_l_rs = img_lab_rs[:,:,0]
 
-	tens_orig_l = torch.Tensor(img_l_orig)[None,None,:,:]
-	tens_rs_l = torch.Tensor(img_l_rs)[None,None,:,:]
+	tens_orig_l = _l_tensor(img_l_orig)
+	tens_rs_l = _l_tensor(img_l_rs)
 
 	return (tens_orig_l, tens_rs_l)
 
-def postprocess_tens(tens_orig_l, out_ab, mode='bilinear'):
+def resize_l(tens_l, HW):
+	# resample an L tensor to HW (antialiased when shrinking)
+	shrink = HW[0]<tens_l.shape[2] or HW[1]<tens_l.shape[3]
+	return F.interpolate(tens_l, size=tuple(HW), mode='bilinear', align_corners=False, antialias=shrink)
+
+def postprocess_tens(tens_orig_l, out_ab, mode='bilinear', pad=None, HW_out=None):
 	# tens_orig_l 	1 x 1 x H_orig x W_orig
 	# out_ab 		1 x 2 x H x W
+	# pad 			letterbox padding from preprocess_img_letterbox, if used
+	# HW_out 		output size (default: original size); L and ab are each resampled
+	# 				once straight to it, so no full-resolution RGB image is built
+
+	if(pad is not None):
+		out_ab = unpad_ab(out_ab, pad)
+	if(HW_out is not None and tuple(HW_out)!=tuple(tens_orig_l.shape[2:])):
+		tens_orig_l = resize_l(tens_orig_l, HW_out)
 
 	HW_orig = tens_orig_l.shape[2:]
 	HW = out_ab.shape[2:]
@@ -44,4 +125,51 @@ def postprocess_tens(tens_orig_l, out_ab, mode='bilinear'):
 		out_ab_orig = out_ab
 
 	out_lab_orig = torch.cat((tens_orig_l, out_ab_orig), dim=1)
-	return color.lab2rgb(out_lab_orig.data.cpu().numpy()[0,...].transpose((1,2,0)))
+	return _color().lab2rgb(out_lab_orig.data.cpu().numpy()[0,...].transpose((1,2,0)))
+
+# sRGB / D65 constants, as used by skimage.color.lab2rgb
+_XYZ_REF_WHITE = (0.95047, 1., 1.08883)
+_XYZ_FROM_RGB = ((0.412453, 0.357580, 0.180423),
+				 (0.212671, 0.715160, 0.072169),
+				 (0.019334, 0.119193, 0.950227))
+_rgb_from_xyz = {}
+
+def lab2rgb_tens(tens_lab):
+	# Lab -> sRGB in [0,1] on the tensor's own device and dtype, matching skimage's lab2rgb
+	# tens_lab 		N x 3 x H x W
+	key = (tens_lab.device, tens_lab.dtype)
+	if(key not in _rgb_from_xyz):
+		_rgb_from_xyz[key] = torch.linalg.inv(torch.tensor(_XYZ_FROM_RGB, dtype=torch.float64)).to(*key)
+	rgb_from_xyz = _rgb_from_xyz[key]
+
+	fy = (tens_lab[:,0]+16.)/116.
+	fx = tens_lab[:,1]/500. + fy
+	fz = (fy - tens_lab[:,2]/200.).clamp(min=0)
+	f = torch.stack((fx,fy,fz), dim=1)
+	xyz = torch.where(f > 0.2068966, f**3, (f-16./116.)/7.787)
+	xyz = xyz*torch.tensor(_XYZ_REF_WHITE, device=xyz.device, dtype=xyz.dtype).view(1,3,1,1)
+
+	rgb = torch.einsum('ij,njhw->nihw', rgb_from_xyz, xyz)
+	rgb = torch.where(rgb > 0.0031308, 1.055*rgb.clamp(min=0.0031308)**(1/2.4) - 0.055, rgb*12.92)
+	return rgb.clamp_(0,1)
+
+def postprocess_tens_uint8(tens_orig_l, out_ab, bgr=False, pad=None, HW_out=None):
+	# same result as postprocess_tens, but the whole pipeline (upsample, Lab->RGB, clamp,
+	# quantize, channel order) runs on out_ab's device in float32
+	# returns a contiguous H_out x W_out x 3 uint8 array (RGB, or BGR for OpenCV encoders)
+	if(pad is not None):
+		out_ab = unpad_ab(out_ab, pad)
+	tens_orig_l = tens_orig_l.to(out_ab.device, out_ab.dtype)
+	if(HW_out is not None and tuple(HW_out)!=tuple(tens_orig_l.shape[2:])):
+		tens_orig_l = resize_l(tens_orig_l, HW_out)
+
+	HW_orig = tens_orig_l.shape[2:]
+	if(tuple(HW_orig)!=tuple(out_ab.shape[2:])):
+		out_ab = F.interpolate(out_ab, size=HW_orig, mode='bilinear')
+
+	rgb = lab2rgb_tens(torch.cat((tens_orig_l, out_ab), dim=1))[0]
+	if(bgr):
+		rgb = rgb.flip(0)
+	# truncate rather than round, like (img*255).astype(np.uint8) on postprocess_tens output
+	out = rgb.mul_(255.).to(torch.uint8).permute(1,2,0).contiguous()
+	return out.cpu().numpy()
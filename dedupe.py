@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Perceptual dedupe for archive batches
+Scan archives hold many near-duplicates (rescans, crops, alternate exposures of the
+same negative). A pre-pass hashes the L channel of every image, groups images whose
+hashes are within a Hamming distance, and runs the network once per group. Other
+members reuse the representative's ab prediction, cropped to where the member sits
+inside the representative, and keep their own full-resolution L channel.
+
+Usage:
+    python dedupe.py -i scans                 # report the groups only
+    python batch_colorize.py -i scans -o out --dedupe
+"""
+
+import os
+import time
+import argparse
+
+import numpy as np
+from PIL import Image
+from skimage import color
+import torch
+import torch.nn.functional as F
+
+from colorizers import load_img, save_img, preprocess_img, preprocess_img_letterbox, postprocess_tens, unpad_ab
+
+HASH_SIZE = 8       # 8x8 low-frequency DCT coefficients -> 64-bit hash
+HASH_SAMPLE = 32    # images are shrunk to 32x32 before the DCT
+ALIGN_SIZE = 128    # long side of the representative when locating a member in it
+ALIGN_SCALES = (1., .9, .8, .7, .6, .5)  # member width as a fraction of the representative's
+MIN_ALIGN_SCORE = .7
+
+def _dct_matrix(n):
+    # orthonormal DCT-II basis, so dct(x) = D @ x
+    k = np.arange(n)[:,None]
+    D = np.cos(np.pi*(2*np.arange(n)[None,:]+1)*k/(2*n)) * np.sqrt(2./n)
+    D[0] /= np.sqrt(2.)
+    return D
+
+_DCT = _dct_matrix(HASH_SAMPLE)
+
+def _thumbnail(img_path, size):
+    # decode at reduced resolution where the format allows it (JPEG draft mode)
+    img = Image.open(img_path)
+    img.draft('RGB', (size, size))
+    return img.convert('RGB')
+
+def phash(img_path):
+    """64-bit perceptual hash of the image's Lab lightness (DCT of a 32x32 thumbnail)"""
+    thumb = _thumbnail(img_path, HASH_SAMPLE).resize((HASH_SAMPLE, HASH_SAMPLE), Image.BOX)
+    l = color.rgb2lab(np.asarray(thumb))[:,:,0]
+    coeffs = (_DCT @ l @ _DCT.T)[:HASH_SIZE,:HASH_SIZE].flatten()
+    # the DC term only encodes overall exposure, so it is left out of the median
+    bits = coeffs > np.median(coeffs[1:])
+    return int(''.join('1' if b else '0' for b in bits), 2)
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+class HashIndex():
+    """BK-tree over perceptual hashes for radius queries in Hamming distance"""
+    def __init__(self):
+        self.root = None
+
+    def add(self, h, item):
+        node = self.root
+        if node is None:
+            self.root = [h, item, {}]
+            return
+        while True:
+            d = hamming(h, node[0])
+            if d not in node[2]:
+                node[2][d] = [h, item, {}]
+                return
+            node = node[2][d]
+
+    def query(self, h, radius):
+        # items whose hash is within radius of h
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= radius:
+                found.append(node[1])
+            stack.extend(child for dist, child in node[2].items() if d-radius <= dist <= d+radius)
+        return found
+
+def group_images(paths, threshold=10, hashes=None):
+    """
+    Group near-duplicate images by perceptual hash
+    Args:
+        paths: image paths
+        threshold: maximum Hamming distance (of 64 bits) between hashes in a group
+        hashes: precomputed {path: hash}; computed here if missing
+    Returns:
+        list of groups (lists of paths) in input order, representative first:
+        the member with the most pixels, since crops are found inside it
+    """
+    if hashes is None:
+        hashes = {path: phash(path) for path in paths}
+    parent = list(range(len(paths)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    index = HashIndex()
+    for i, path in enumerate(paths):
+        for j in index.query(hashes[path], threshold):
+            parent[find(i)] = find(j)
+        index.add(hashes[path], i)
+
+    groups = {}
+    for i, path in enumerate(paths):
+        groups.setdefault(find(i), []).append(path)
+    result = []
+    for members in groups.values():
+        sizes = {path: np.prod(Image.open(path).size) for path in members} if len(members) > 1 else {}
+        rep = max(members, key=lambda path: sizes.get(path, 0))
+        result.append([rep] + [path for path in members if path != rep])
+    return result
+
+def _align_l(img):
+    # float32 lightness at ALIGN_SIZE on the long side
+    H, W = img.shape[:2]
+    scale = ALIGN_SIZE/max(H, W)
+    small = np.asarray(Image.fromarray(img).resize((max(1, round(W*scale)), max(1, round(H*scale))), Image.BOX))
+    return color.rgb2lab(small)[:,:,0].astype(np.float32)
+
+def _correlation(a, b):
+    # normalized cross-correlation of two same-sized images (as cv2.TM_CCOEFF_NORMED)
+    a = a - a.mean()
+    b = b - b.mean()
+    denom = np.sqrt((a*a).sum()*(b*b).sum())
+    return float((a*b).sum()/denom) if denom > 0 else 0.
+
+def locate(rep_img, member_img, min_score=MIN_ALIGN_SCORE):
+    """
+    Find where member_img sits inside rep_img
+    Returns:
+        (top, left, bottom, right) as fractions of the representative's height and
+        width, or None if no placement correlates well enough to reuse its colors
+    """
+    rep_l = _align_l(rep_img)
+    Hr, Wr = rep_l.shape
+    H, W = member_img.shape[:2]
+    if abs(H/W - Hr/Wr) < .02:
+        # same framing (rescan or exposure change): no search, but the whole frames must
+        # still correlate, since hash groups are transitive (A~B, B~C does not make A~C)
+        member_l = color.rgb2lab(np.asarray(Image.fromarray(member_img).resize((Wr, Hr), Image.BOX)))[:,:,0]
+        return (0., 0., 1., 1.) if _correlation(rep_l, member_l) >= min_score else None
+    try:
+        import cv2
+    except ImportError:
+        return None
+
+    member = Image.fromarray(member_img)
+    best, box = -1., None
+    for s in ALIGN_SCALES:
+        w = round(Wr*s)
+        h = round(w*H/W)
+        if h > Hr or w > Wr or min(h, w) < 8:
+            continue
+        tmpl = color.rgb2lab(np.asarray(member.resize((w, h), Image.BOX)))[:,:,0].astype(np.float32)
+        scores = cv2.matchTemplate(rep_l, tmpl, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (x, y) = cv2.minMaxLoc(scores)
+        if score > best:
+            best, box = score, (y/Hr, x/Wr, (y+h)/Hr, (x+w)/Wr)
+    return box if best >= min_score else None
+
+def crop_ab(out_ab, box):
+    # the part of a full-frame ab map covered by box, resampled back to the map's resolution
+    if box == (0., 0., 1., 1.):
+        return out_ab
+    h, w = out_ab.shape[2:]
+    (top, left, bottom, right) = box
+    y0, x0 = int(top*h), int(left*w)
+    y1, x1 = max(y0+1, int(round(bottom*h))), max(x0+1, int(round(right*w)))
+    return F.interpolate(out_ab[:,:,y0:y1,x0:x1], size=(h, w), mode='bilinear', align_corners=False)
+
+def predict_ab(model, img, size=256, letterbox=False):
+    """(original-size L tensor, full-frame ab prediction with any letterbox padding removed)"""
+    if letterbox:
+        tens_l_orig, tens_l_rs, pad = preprocess_img_letterbox(img, size=size)
+    else:
+        tens_l_orig, tens_l_rs = preprocess_img(img, HW=(size,size))
+        pad = None
+    with torch.no_grad():
+        out_ab = model(tens_l_rs).cpu()
+    if pad is not None:
+        out_ab = unpad_ab(out_ab, pad)
+    return tens_l_orig, out_ab
+
+def dedupe_colorize(model, paths, out_paths, threshold=10, size=256, letterbox=False,
+                    save=save_img, progress_callback=None):
+    """
+    Colorize paths, running the network once per group of near-duplicates
+    Args:
+        out_paths: output path for each input path
+        threshold: maximum hash Hamming distance within a group
+        save: called as save(out_path, float RGB image in [0,1])
+        progress_callback: called as progress_callback(files_done, total_files)
+    Returns:
+        stats dict: images, groups, forward passes run and skipped, and the
+        estimated forward time saved from the measured mean forward time
+    """
+    out_for = dict(zip(paths, out_paths))
+
+    t0 = time.perf_counter()
+    groups = group_images(paths, threshold=threshold)
+    t_hash = time.perf_counter() - t0
+
+    stats = {'images': len(paths), 'groups': len(groups), 'forward_passes': 0, 'reused': 0,
+             'unaligned': 0, 'hash_s': t_hash, 'forward_s': 0.}
+    done = 0
+    for group in groups:
+        rep_img = load_img(group[0])
+        t1 = time.perf_counter()
+        tens_l_orig, rep_ab = predict_ab(model, rep_img, size=size, letterbox=letterbox)
+        stats['forward_s'] += time.perf_counter() - t1
+        stats['forward_passes'] += 1
+        save(out_for[group[0]], postprocess_tens(tens_l_orig, rep_ab))
+        done += 1
+        if progress_callback is not None:
+            progress_callback(done, len(paths))
+
+        for path in group[1:]:
+            img = load_img(path)
+            box = locate(rep_img, img)
+            if box is None:
+                # grouped by hash but not placeable inside the representative
+                t1 = time.perf_counter()
+                tens_l_orig, out_ab = predict_ab(model, img, size=size, letterbox=letterbox)
+                stats['forward_s'] += time.perf_counter() - t1
+                stats['forward_passes'] += 1
+                stats['unaligned'] += 1
+            else:
+                tens_l_orig = torch.Tensor(color.rgb2lab(img)[:,:,0])[None,None,:,:]
+                out_ab = crop_ab(rep_ab, box)
+                stats['reused'] += 1
+            save(out_for[path], postprocess_tens(tens_l_orig, out_ab))
+            done += 1
+            if progress_callback is not None:
+                progress_callback(done, len(paths))
+
+    mean_forward = stats['forward_s']/max(1, stats['forward_passes'])
+    stats['saved_s'] = stats['reused']*mean_forward
+    return stats
+
+def print_dedupe_report(stats):
+    print(f"🔁 Dedupe: {stats['images']} images in {stats['groups']} groups, "
+          f"{stats['forward_passes']} forward passes ({stats['reused']} reused, "
+          f"{stats['unaligned']} grouped but not alignable)")
+    if stats['images']:
+        print(f"   Saved {stats['reused']/stats['images']:.0%} of network runs, "
+              f"~{stats['saved_s']:.1f}s of forward time (hashing took {stats['hash_s']:.1f}s)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Group near-duplicate images by perceptual hash')
+    parser.add_argument('-i', '--input', default='imgs', help='Input image folder')
+    parser.add_argument('--threshold', type=int, default=10, help='Maximum Hamming distance (of 64 bits) within a group')
+    args = parser.parse_args()
+
+    from batch_colorize import list_images
+    paths = [os.path.join(args.input, f) for f in list_images(args.input)]
+    groups = group_images(paths, threshold=args.threshold)
+    for group in groups:
+        if len(group) > 1:
+            print(f"{os.path.basename(group[0])}: " + ', '.join(os.path.basename(p) for p in group[1:]))
+    print(f"{len(paths)} images, {len(groups)} groups, {len(paths) - len(groups)} network runs avoidable")
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,18 @@ import argparse
 import matplotlib.pyplot as plt
 
 from colorizers import *
+from colorizers.runtime import configure_from_saved
 
 parser = argparse.ArgumentParser()
 parser.add_argument('-i','--img_path', type=str, default='imgs/ansel_adams3.jpg')
 parser.add_argument('--use_gpu', action='store_true', help='whether to use GPU')
 parser.add_argument('-o','--save_prefix', type=str, default='saved', help='will save into this file with {eccv16.png, siggraph17.png} suffixes')
+parser.add_argument('--threads', type=int, default=None, help='torch/OpenCV/BLAS threads (default: saved autotune setting)')
+parser.add_argument('--ensemble', action='store_true', help='also save the blend of both models as {ensemble.png}')
 opt = parser.parse_args()
 
+configure_from_saved(num_threads=opt.threads)
+
 # load colorizers
 colorizer_eccv16 = eccv16(pretrained=True).eval()
 colorizer_siggraph17 = siggraph17(pretrained=True).eval()
@@ -18,20 +23,19 @@ if(opt.use_gpu):
 	colorizer_siggraph17.cuda()
 
 # default size to process images is 256x256
-# grab L channel in both original ("orig") and resized ("rs") resolutions
+# L channel is extracted once and shared by both colorizers, which run concurrently
+# each colorizer outputs a 256x256 ab map, resized and concatenated to the original L channel
 img = load_img(opt.img_path)
-(tens_l_orig, tens_l_rs) = preprocess_img(img, HW=(256,256))
-if(opt.use_gpu):
-	tens_l_rs = tens_l_rs.cuda()
-
-# colorizer outputs 256x256 ab map
-# resize and concatenate to original L channel
-img_bw = postprocess_tens(tens_l_orig, torch.cat((0*tens_l_orig,0*tens_l_orig),dim=1))
-out_img_eccv16 = postprocess_tens(tens_l_orig, colorizer_eccv16(tens_l_rs).cpu())
-out_img_siggraph17 = postprocess_tens(tens_l_orig, colorizer_siggraph17(tens_l_rs).cpu())
+outs = colorize_multi({'eccv16': colorizer_eccv16, 'siggraph17': colorizer_siggraph17}, img, HW=(256,256),
+	blend=opt.ensemble, include_gray=True)
+img_bw = outs['gray']
+out_img_eccv16 = outs['eccv16']
+out_img_siggraph17 = outs['siggraph17']
 
 plt.imsave('%s_eccv16.png'%opt.save_prefix, out_img_eccv16)
 plt.imsave('%s_siggraph17.png'%opt.save_prefix, out_img_siggraph17)
+if(opt.ensemble):
+	plt.imsave('%s_ensemble.png'%opt.save_prefix, outs['ensemble'])
 
 plt.figure(figsize=(12,8))
 plt.subplot(2,2,1)
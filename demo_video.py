@@ -4,15 +4,19 @@ Video Colorization Demo Script
 Usage: python demo_video.py -i input_video.mp4 -o output_video.mp4
 """
 
-from video_colorizer import VideoColorizer
 import argparse
 from pathlib import Path
 
+from colorizers.models import MODEL_TYPES
+
+# torch/OpenCV are imported only after the arguments are parsed, so --help and
+# argument errors return immediately
+
 def main():
     parser = argparse.ArgumentParser(description='Colorize video files')
     parser.add_argument('-i', '--input', required=True, help='Input video file')
     parser.add_argument('-o', '--output', help='Output video file (optional)')
-    parser.add_argument('--model', choices=['eccv16', 'siggraph17'], default='eccv16', 
+    parser.add_argument('--model', choices=MODEL_TYPES, default='eccv16', 
                        help='Choose colorization model (default: eccv16)')
     parser.add_argument('--device', choices=['cpu', 'cuda'], default='cpu',
                        help='Device to use for processing (default: cpu)')
@@ -22,9 +26,23 @@ def main():
                        help='Process every nth frame (default: 1)')
     parser.add_argument('--preview', action='store_true', 
                        help='Show real-time preview instead of saving')
+    parser.add_argument('--start',
+                       help='Start time, seconds or HH:MM:SS (default: beginning)')
+    parser.add_argument('--end',
+                       help='End time, seconds or HH:MM:SS (default: end of video)')
+    parser.add_argument('--threads', type=int,
+                       help='Torch/OpenCV/BLAS threads (default: saved autotune setting)')
     
     args = parser.parse_args()
     
+    from video_colorizer import VideoColorizer, parse_timecode
+    from colorizers.runtime import configure_from_saved
+    try:
+        start = parse_timecode(args.start) if args.start else None
+        end = parse_timecode(args.end) if args.end else None
+    except ValueError as e:
+        parser.error(str(e))
+    
     # Auto-generate output filename if not provided
     if not args.output and not args.preview:
         input_path = Path(args.input)
@@ -41,6 +59,8 @@ def main():
     print("=" * 40)
     
     try:
+        configure_from_saved(num_threads=args.threads)
+        
         # Initialize colorizer
         colorizer = VideoColorizer(model_type=args.model, device=args.device)
         
@@ -54,7 +74,9 @@ def main():
                 args.input, 
                 args.output, 
                 frame_skip=args.frame_skip,
-                quality=args.quality
+                quality=args.quality,
+                start_time=start,
+                end_time=end
             )
             print("✅ Video colorization completed successfully!")
             print(f"📁 Output saved to: {args.output}")
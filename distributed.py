@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Distributed batch colorization over TCP
+A coordinator splits an image manifest into chunks and leases them to workers, which
+may run on any machine that sees the same input/output paths (e.g. an NFS archive).
+Each worker loads its model once, heartbeats while it works on a chunk, and reports
+per-image results. A lease that is not renewed within the lease timeout (worker
+crashed, machine lost, network gone) goes back to the front of the queue.
+
+Protocol: one JSON object per line in each direction, strictly request/response:
+    {"op": "hello", "worker": id}                    -> {"ok": true, "settings": {...}, "heartbeat_interval": s}
+    {"op": "lease", "worker": id}                    -> {"lease": n, "items": [...], "timeout": s} | {"wait": s} | {"done": true}
+    {"op": "heartbeat", "worker": id, "lease": n}    -> {"ok": true} (false: the lease is gone, drop the chunk)
+    {"op": "complete", "worker": id, "lease": n, "results": [...]} -> {"ok": true}
+There is no authentication: bind the coordinator to a trusted network only.
+
+The batch_colorize.py CLI drives this module:
+    python batch_colorize.py -i imgs -o imgs_out --serve 0.0.0.0:5055 --local_workers 2
+    python batch_colorize.py --connect coordinator-host:5055
+"""
+
+import os
+import json
+import time
+import socket
+import threading
+import socketserver
+from collections import deque
+
+DEFAULT_PORT = 5055
+LEASE_TIMEOUT = 60.         # seconds without a heartbeat before a chunk is handed to another worker
+HEARTBEAT_INTERVAL = 10.
+MAX_ATTEMPTS = 3            # leases of one chunk that may be lost before its images are reported failed
+
+def parse_address(text, default_host='127.0.0.1'):
+    """'host:port', ':port' or 'port' -> (host, port)"""
+    host, _, port = text.rpartition(':')
+    return host or default_host, int(port or DEFAULT_PORT)
+
+def make_items(input_paths, output_folder):
+    # one work item per image; outputs are named like batch_colorize's
+    return [{'input': path, 'output': os.path.join(output_folder, f"color_{os.path.basename(path)}")}
+            for path in input_paths]
+
+def read_manifest(path, output_folder):
+    """
+    Work items from a manifest file: one input path per line, or 'input<TAB>output' to
+    choose the output path; blank lines and lines starting with # are ignored
+    """
+    items = []
+    with open(path) as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            if '\t' in line:
+                src, dst = line.split('\t', 1)
+                items.append({'input': src, 'output': dst})
+            else:
+                items += make_items([line], output_folder)
+    return items
+
+class Coordinator():
+    def __init__(self, items, settings=None, chunk_size=16, lease_timeout=LEASE_TIMEOUT,
+                 max_attempts=MAX_ATTEMPTS, skip_existing=True):
+        """
+        Hand out items in chunks to workers over TCP
+        Args:
+            items: work items, dicts with at least 'input' and 'output'
+            settings: sent to every worker on hello (model type, inference size, ...)
+            skip_existing: leave out items whose output already exists (resuming a backfill)
+        """
+        self.settings = settings or {}
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.skipped = 0
+        if skip_existing:
+            todo = [item for item in items if not os.path.exists(item['output'])]
+            self.skipped = len(items) - len(todo)
+            items = todo
+        self.chunks = {i: items[start:start+chunk_size] for i, start in enumerate(range(0, len(items), chunk_size))}
+        self.pending = deque(self.chunks)
+        self.leases = {}            # chunk id -> {'worker', 'deadline'}
+        self.attempts = {cid: 0 for cid in self.chunks}
+        self.done = {}              # chunk id -> per-item results
+        self.failed = {}            # chunk id -> reason its leases kept getting lost
+        self.requeued = 0
+        self.workers = {}           # worker id -> counters
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        self.server = None
+        self.started = time.time()
+        self._check_finished()
+
+    def _check_finished(self):
+        if len(self.done) + len(self.failed) == len(self.chunks):
+            self.finished.set()
+
+    def _expire(self, now):
+        for cid, lease in list(self.leases.items()):
+            if lease['deadline'] >= now:
+                continue
+            del self.leases[cid]
+            if self.attempts[cid] >= self.max_attempts:
+                self.failed[cid] = f"lease lost {self.attempts[cid]} times (last worker {lease['worker']})"
+            else:
+                self.pending.appendleft(cid)
+                self.requeued += 1
+            print(f"⚠️  Lease {cid} of {lease['worker']} expired, {'given up' if cid in self.failed else 're-queued'}")
+        self._check_finished()
+
+    def expire(self):
+        with self.lock:
+            self._expire(time.time())
+
+    def handle(self, msg):
+        """Reply to one protocol message"""
+        op, worker = msg.get('op'), msg.get('worker')
+        now = time.time()
+        with self.lock:
+            self._expire(now)
+            if worker is not None:
+                stats = self.workers.setdefault(worker, {'chunks': 0, 'items': 0, 'errors': 0})
+                stats['last_seen'] = now
+            if op == 'hello':
+                return {'ok': True, 'settings': self.settings,
+                        'heartbeat_interval': min(HEARTBEAT_INTERVAL, self.lease_timeout/3)}
+            if op == 'lease':
+                if self.pending:
+                    cid = self.pending.popleft()
+                    self.attempts[cid] += 1
+                    self.leases[cid] = {'worker': worker, 'deadline': now + self.lease_timeout}
+                    return {'lease': cid, 'items': self.chunks[cid], 'timeout': self.lease_timeout}
+                if self.finished.is_set():
+                    return {'done': True}
+                # everything left is leased; wait in case a lease expires
+                return {'wait': min(1., self.lease_timeout/4)}
+            if op == 'heartbeat':
+                lease = self.leases.get(msg['lease'])
+                if lease is None or lease['worker'] != worker:
+                    return {'ok': False}
+                lease['deadline'] = now + self.lease_timeout
+                return {'ok': True}
+            if op == 'complete':
+                return self._complete(msg['lease'], worker, msg['results'])
+        return {'error': f"unknown op {op!r}"}
+
+    def _complete(self, cid, worker, results):
+        if cid in self.done:
+            return {'ok': True, 'duplicate': True}
+        # a late report from a worker whose lease expired is still good work: take it and
+        # withdraw the chunk from the queue (or from whoever holds it now, whose next
+        # heartbeat then fails)
+        self.leases.pop(cid, None)
+        self.failed.pop(cid, None)
+        if cid in self.pending:
+            self.pending.remove(cid)
+        self.done[cid] = results
+        stats = self.workers[worker]
+        stats['chunks'] += 1
+        stats['items'] += len(results)
+        stats['errors'] += sum(1 for r in results if r.get('error'))
+        self._check_finished()
+        return {'ok': True}
+
+    def start(self, host='127.0.0.1', port=DEFAULT_PORT):
+        """Serve in a background thread; returns the bound (host, port) (port 0 picks a free one)"""
+        self.server = _Server((host, port), _Handler)
+        self.server.coordinator = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address[:2]
+
+    def wait(self, report_every=10., linger=2.):
+        """
+        Block until every chunk is done or given up, printing progress every report_every
+        seconds, then keep answering for linger seconds so idle workers hear 'done'
+        """
+        last = time.time()
+        while not self.finished.wait(1.):
+            self.expire()
+            if time.time() - last >= report_every:
+                last = time.time()
+                with self.lock:
+                    print(f"📦 {len(self.done)}/{len(self.chunks)} chunks done, {len(self.leases)} leased, "
+                          f"{len(self.workers)} workers seen")
+        time.sleep(linger)
+        return self.summary()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def summary(self):
+        with self.lock:
+            results = [r for chunk in self.done.values() for r in chunk]
+            lost = [item for cid in self.failed for item in self.chunks[cid]]
+            return {'images': sum(len(items) for items in self.chunks.values()), 'skipped': self.skipped,
+                    'ok': sum(1 for r in results if not r.get('error')),
+                    'errors': [r for r in results if r.get('error')],
+                    'lost': lost, 'requeued': self.requeued,
+                    'workers': {w: dict(s) for w, s in self.workers.items()},
+                    'seconds': time.time() - self.started}
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                reply = self.server.coordinator.handle(json.loads(line))
+            except (ValueError, KeyError, TypeError) as e:
+                reply = {'error': f"bad request: {e}"}
+            self.wfile.write((json.dumps(reply) + '\n').encode())
+            self.wfile.flush()
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def print_summary(summary):
+    print(f"✅ {summary['ok']} images colorized in {summary['seconds']:.1f}s "
+          f"({summary['skipped']} already done, {summary['requeued']} chunks re-queued)")
+    for worker, stats in sorted(summary['workers'].items()):
+        print(f"   {worker}: {stats['items']} images in {stats['chunks']} chunks, {stats['errors']} errors")
+    for result in summary['errors']:
+        print(f"❌ {result['input']}: {result['error']}")
+    for item in summary['lost']:
+        print(f"❌ {item['input']}: not processed (its chunk kept losing its lease)")
+
+class CoordinatorClient():
+    """One connection to a coordinator; safe to share between threads"""
+    def __init__(self, address, connect_timeout=30.):
+        deadline = time.time() + connect_timeout
+        while True:
+            try:
+                self.sock = socket.create_connection(address, timeout=connect_timeout)
+                break
+            except OSError:
+                # workers may start before the coordinator is listening
+                if time.time() >= deadline:
+                    raise
+                time.sleep(.5)
+        self.sock.settimeout(None)
+        self.f = self.sock.makefile('rwb')
+        self.lock = threading.Lock()
+
+    def request(self, msg):
+        with self.lock:
+            self.f.write((json.dumps(msg) + '\n').encode())
+            self.f.flush()
+            line = self.f.readline()
+        if not line:
+            raise ConnectionError('coordinator closed the connection')
+        return json.loads(line)
+
+    def close(self):
+        self.f.close()
+        self.sock.close()
+
+def run_worker(address, make_process, worker_id=None, connect_timeout=30.):
+    """
+    Pull chunks from a coordinator until it reports that all work is done
+    Args:
+        make_process: called once with the coordinator's settings; returns process(item),
+            which writes item['output'] for item['input'] and raises on failure
+        worker_id: unique name (default host:pid)
+    Returns:
+        dict with the number of chunks, images and errors this worker handled
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    client = CoordinatorClient(address, connect_timeout=connect_timeout)
+    hello = client.request({'op': 'hello', 'worker': worker_id})
+    process = make_process(hello['settings'])
+    stats = {'chunks': 0, 'items': 0, 'errors': 0}
+    current = {'lease': None, 'lost': False}
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(hello['heartbeat_interval']):
+            lease = current['lease']
+            if lease is None:
+                continue
+            try:
+                reply = client.request({'op': 'heartbeat', 'worker': worker_id, 'lease': lease})
+            except OSError:
+                return
+            if not reply.get('ok') and current['lease'] == lease:
+                current['lost'] = True
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    try:
+        while True:
+            try:
+                reply = client.request({'op': 'lease', 'worker': worker_id})
+            except OSError:
+                break   # coordinator gone: it only exits once everything is done
+            if reply.get('done'):
+                break
+            if 'wait' in reply:
+                time.sleep(reply['wait'])
+                continue
+
+            current.update(lease=reply['lease'], lost=False)
+            results = []
+            for item in reply['items']:
+                if current['lost']:
+                    break
+                t0 = time.time()
+                try:
+                    process(item)
+                    results.append({'input': item['input'], 'ms': round((time.time() - t0)*1000)})
+                except Exception as e:
+                    results.append({'input': item['input'], 'error': f"{type(e).__name__}: {e}"})
+            lost = current['lost']
+            current['lease'] = None
+            if lost:
+                print(f"⚠️  {worker_id} lost lease {reply['lease']}, dropping it")
+                continue
+            try:
+                client.request({'op': 'complete', 'worker': worker_id, 'lease': reply['lease'], 'results': results})
+            except OSError:
+                break   # the lease expires and the chunk is redone elsewhere
+            stats['chunks'] += 1
+            stats['items'] += len(results)
+            stats['errors'] += sum(1 for r in results if 'error' in r)
+    finally:
+        stop.set()
+        client.close()
+    return stats
@@ -0,0 +1,99 @@
+"""
+Encoded-image export cache for the editor
+Encoded downloads are cached by (image key, adjustments, size, format) with LRU
+eviction, and the formats missing from the cache are encoded concurrently (PIL
+releases the GIL while compressing), so a rerun with unchanged settings encodes nothing.
+"""
+
+import io
+import os
+import base64
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# format -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    'PNG': ('png', 'image/png'),
+    'JPG': ('jpg', 'image/jpeg'),
+    'PDF': ('pdf', 'application/pdf'),
+    'SVG': ('svg', 'image/svg+xml'),
+    'TIFF': ('tiff', 'image/tiff'),
+}
+
+def _encode_svg(img):
+    # SVG wrapper around the PNG encoding: raster data, but it opens in vector editors
+    png = base64.b64encode(encode_image(img, 'PNG')).decode('ascii')
+    W, H = img.size
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+            f'width="{W}" height="{H}" viewBox="0 0 {W} {H}">'
+            f'<image width="{W}" height="{H}" xlink:href="data:image/png;base64,{png}"/></svg>').encode('utf-8')
+
+def encode_image(img, fmt):
+    """Encode a PIL image as one of EXPORT_FORMATS"""
+    if fmt == 'SVG':
+        return _encode_svg(img)
+    buf = io.BytesIO()
+    if fmt == 'PNG':
+        img.save(buf, format='PNG')
+    elif fmt == 'JPG':
+        img.convert('RGB').save(buf, format='JPEG', quality=95)
+    elif fmt == 'PDF':
+        img.convert('RGB').save(buf, format='PDF')
+    elif fmt == 'TIFF':
+        img.save(buf, format='TIFF', compression='tiff_lzw')
+    else:
+        raise ValueError(f"unknown export format {fmt!r}, expected one of {list(EXPORT_FORMATS)}")
+    return buf.getvalue()
+
+class ExportCache():
+    """
+    LRU cache of encoded exports, bounded by entry count and total bytes
+    Safe to share between Streamlit sessions (keys include a hash of the image content).
+    """
+    def __init__(self, max_entries=64, max_bytes=256 << 20, max_workers=None):
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=max_workers or min(len(EXPORT_FORMATS), os.cpu_count() or 1))
+
+    @staticmethod
+    def key(image_key, adjustments, size, fmt):
+        return (image_key, tuple(sorted(adjustments.items())), tuple(size), fmt)
+
+    def _put(self, key, data):
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = data
+            self.nbytes += len(data)
+            while self.entries and (len(self.entries) > self.max_entries or self.nbytes > self.max_bytes):
+                _, old = self.entries.popitem(last=False)
+                self.nbytes -= len(old)
+
+    def get_many(self, image_key, adjustments, size, formats, image):
+        """
+        Encoded bytes for every format in formats
+        Args:
+            image_key: identifies the unadjusted image (e.g. upload hash and model)
+            image: the adjusted PIL image, or a callable returning it; only used on a miss
+        Returns:
+            dict of format -> bytes
+        """
+        keys = {fmt: self.key(image_key, adjustments, size, fmt) for fmt in formats}
+        result = {}
+        with self.lock:
+            for fmt, key in keys.items():
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    result[fmt] = self.entries[key]
+        missing = [fmt for fmt in formats if fmt not in result]
+        if missing:
+            img = image() if callable(image) else image
+            futures = {fmt: self.pool.submit(encode_image, img, fmt) for fmt in missing}
+            for fmt, future in futures.items():
+                result[fmt] = future.result()
+                self._put(keys[fmt], result[fmt])
+        return result
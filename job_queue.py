@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+Persistent job queue for long-running colorization jobs
+Jobs are stored in a local SQLite database and executed by a pool of worker
+processes that keep their models loaded between jobs.
+
+Usage:
+    python job_queue.py submit video videos/input/video2.mp4 -o colorized.mp4
+    python job_queue.py submit batch imgs -o imgs_out --model siggraph17
+    python job_queue.py work --workers 2
+    python job_queue.py status [job_id]
+    python job_queue.py cancel <job_id>
+"""
+
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import multiprocessing as mp
+from pathlib import Path
+
+DEFAULT_DB = 'colorization_jobs.db'
+LEASE_TIMEOUT = 60          # seconds without a heartbeat before a running job is considered orphaned
+HEARTBEAT_INTERVAL = 10     # seconds between heartbeats of a worker's running job
+
+JOB_KINDS = ('video', 'batch')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    input TEXT NOT NULL,
+    output TEXT NOT NULL,
+    options TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    checkpoint INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    worker_pid INTEGER,
+    heartbeat REAL,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+)
+"""
+
+class JobCancelled(Exception):
+    """Raised inside a worker when its current job has been cancelled"""
+
+def _input_size(path):
+    """Size in bytes of a file or of all files directly inside a directory"""
+    path = Path(path)
+    if path.is_dir():
+        return sum(f.stat().st_size for f in path.iterdir() if f.is_file())
+    return path.stat().st_size
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class JobQueue:
+    def __init__(self, db_path=DEFAULT_DB):
+        """
+        Open (or create) a job queue
+        Args:
+            db_path: Path to the SQLite database file
+        """
+        self.db_path = str(db_path)
+        with self._connect() as conn:
+            conn.execute(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def submit(self, kind, input_path, output_path, **options):
+        """
+        Add a job to the queue
+        Args:
+            kind: 'video' (single video file) or 'batch' (folder of images)
+            input_path: Input video file or image folder
+            output_path: Output video file or image folder
+            options: VideoColorizer settings (model_type, device, inference_size, letterbox)
+                and any colorize_video keyword arguments
+        Returns:
+            job id
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if not Path(input_path).exists():
+            raise FileNotFoundError(input_path)
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "INSERT INTO jobs (kind, input, output, options, size, status, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+                (kind, str(input_path), str(output_path), json.dumps(options),
+                 _input_size(input_path), now, now))
+            return cur.lastrowid
+
+    def status(self, job_id):
+        """Return the job as a dict (None if it does not exist)"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['options'] = json.loads(job['options'])
+        return job
+
+    def list_jobs(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY id").fetchall()
+        return [dict(row) for row in rows]
+
+    def progress(self, job_id):
+        """Return (progress, total) for a job"""
+        job = self.status(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        return job['progress'], job['total']
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued or running job
+        Running jobs stop at their next progress update
+        Returns:
+            True if the job was cancelled
+        """
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status='cancelled', updated=? WHERE id=? AND status IN ('queued', 'running')",
+                (time.time(), job_id))
+            return cur.rowcount > 0
+
+    def claim(self, worker_pid):
+        """
+        Atomically take the next job for a worker
+        Orphaned running jobs (dead worker or stale heartbeat) are put back in the
+        queue first, keeping their checkpoint. Workers refresh the heartbeat of their job
+        from a background thread (see Heartbeat), so a live worker keeps its job however
+        long a single file or segment takes. Smaller jobs are handed out first.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                running = conn.execute("SELECT id, worker_pid, heartbeat FROM jobs WHERE status='running'").fetchall()
+                for row in running:
+                    stale = row['heartbeat'] is None or now - row['heartbeat'] > LEASE_TIMEOUT
+                    if stale or not _pid_alive(row['worker_pid']):
+                        conn.execute("UPDATE jobs SET status='queued', worker_pid=NULL, updated=? WHERE id=?",
+                                     (now, row['id']))
+
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status='queued' ORDER BY size, id LIMIT 1").fetchone()
+                if row is None:
+                    conn.execute('COMMIT')
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status='running', worker_pid=?, heartbeat=?, updated=? WHERE id=?",
+                    (worker_pid, now, now, row['id']))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        job = dict(row)
+        job['options'] = json.loads(job['options'])
+        return job
+
+    def update_progress(self, job_id, progress, total, checkpoint=None):
+        """
+        Record progress and refresh the job's heartbeat
+        Raises:
+            JobCancelled if the job has been cancelled in the meantime
+        """
+        now = time.time()
+        with self._connect() as conn:
+            if checkpoint is None:
+                conn.execute("UPDATE jobs SET progress=?, total=?, heartbeat=?, updated=? WHERE id=? AND status='running'",
+                             (progress, total, now, now, job_id))
+            else:
+                conn.execute("UPDATE jobs SET progress=?, total=?, checkpoint=?, heartbeat=?, updated=? "
+                             "WHERE id=? AND status='running'",
+                             (progress, total, checkpoint, now, now, job_id))
+            status = conn.execute("SELECT status FROM jobs WHERE id=?", (job_id,)).fetchone()['status']
+        if status == 'cancelled':
+            raise JobCancelled(job_id)
+
+    def heartbeat(self, job_id, worker_pid):
+        """Refresh the lease of a running job held by worker_pid; returns False if it no longer is"""
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute("UPDATE jobs SET heartbeat=?, updated=? WHERE id=? AND status='running' AND worker_pid=?",
+                               (now, now, job_id, worker_pid))
+            return cur.rowcount > 0
+
+    def finish(self, job_id, error=None):
+        status = 'failed' if error else 'done'
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status=?, error=?, worker_pid=NULL, updated=? WHERE id=? AND status='running'",
+                         (status, error, time.time(), job_id))
+
+class Heartbeat(threading.Thread):
+    def __init__(self, queue, job_id, worker_pid, interval=HEARTBEAT_INTERVAL):
+        """
+        Keeps a running job's lease fresh while the worker is busy with it
+        Progress updates only come once per file or segment, which can take longer than
+        LEASE_TIMEOUT on a slow CPU. Use as a context manager around running the job.
+        """
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.job_id = job_id
+        self.worker_pid = worker_pid
+        self.interval = interval
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            try:
+                if not self.queue.heartbeat(self.job_id, self.worker_pid):
+                    return
+            except sqlite3.Error as e:
+                # e.g. the database stayed locked; the next beat tries again
+                print(f"⚠️ Heartbeat for job {self.job_id} failed: {e}")
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopping.set()
+        self.join()
+
+# Models loaded in this worker process, keyed by their VideoColorizer settings
+_colorizers = {}
+
+def _split_options(options):
+    """Split job options into (VideoColorizer settings, colorize keyword arguments)"""
+    from video_colorizer import COLORIZER_SETTINGS
+    settings = {k: v for k, v in options.items() if k in COLORIZER_SETTINGS}
+    kwargs = {k: v for k, v in options.items() if k not in COLORIZER_SETTINGS}
+    return settings, kwargs
+
+def _get_colorizer(settings):
+    from video_colorizer import VideoColorizer
+    key = tuple(sorted(settings.items()))
+    if key not in _colorizers:
+        _colorizers[key] = VideoColorizer(**settings)
+    return _colorizers[key]
+
+def _run_batch_job(queue, job, colorizer):
+    from batch_colorize import batch_colorize
+
+    def on_progress(done, total):
+        queue.update_progress(job['id'], done, total, checkpoint=done)
+
+    # a resumed job skips the files whose results are already on disk, rather than the
+    # first `checkpoint` files: the folder may have changed since the job was interrupted
+    batch_colorize(colorizer.colorizer, job['input'], job['output'], skip_existing=True,
+                   progress_callback=on_progress, size=colorizer.inference_size, letterbox=colorizer.letterbox)
+
+def _run_video_job(queue, job, colorizer):
+    from video_segments import SegmentedVideoJob
+
+    _, options = _split_options(job['options'])
+    segmented = SegmentedVideoJob(job['input'], job['output'], workdir=job['output'] + '.segments',
+                                  settings=colorizer.settings(), **options)
+    last_update = [0.0]
+
+    def on_progress(done, total):
+        # finished segments have their own completion records, so the database only
+        # tracks progress; per-frame writes would dominate on small frames
+        if done == total or time.time() - last_update[0] >= 1.0:
+            last_update[0] = time.time()
+            queue.update_progress(job['id'], done, total, checkpoint=done)
+
+    segmented.run(colorizer=colorizer, progress_callback=on_progress)
+
+def worker_loop(db_path=DEFAULT_DB, poll_interval=2.0, exit_when_idle=False,
+                worker_index=0, num_workers=1, pin=None):
+    """
+    Claim and run jobs until stopped (or until the queue is empty if exit_when_idle)
+    worker_index/num_workers/pin split this machine's threads and CPUs between pool workers
+    """
+    from colorizers.runtime import configure_from_saved, configure_runtime, worker_runtime
+    if num_workers > 1 or pin:
+        configure_runtime(**worker_runtime(worker_index, num_workers, pin))
+    else:
+        configure_from_saved()
+    queue = JobQueue(db_path)
+    pid = os.getpid()
+    while True:
+        job = queue.claim(pid)
+        if job is None:
+            if exit_when_idle:
+                return
+            time.sleep(poll_interval)
+            continue
+
+        print(f"🎬 Worker {pid} running job {job['id']} ({job['kind']}: {job['input']})")
+        try:
+            colorizer = _get_colorizer(_split_options(job['options'])[0])
+            with Heartbeat(queue, job['id'], pid):
+                if job['kind'] == 'video':
+                    _run_video_job(queue, job, colorizer)
+                else:
+                    _run_batch_job(queue, job, colorizer)
+            queue.finish(job['id'])
+            print(f"✅ Job {job['id']} done")
+        except JobCancelled:
+            print(f"⏹️ Job {job['id']} cancelled")
+        except Exception as e:
+            queue.finish(job['id'], error=str(e))
+            print(f"❌ Job {job['id']} failed: {e}")
+
+class WorkerPool:
+    def __init__(self, db_path=DEFAULT_DB, workers=2, poll_interval=2.0, pin=None):
+        """
+        Pool of worker processes sharing one job queue
+        Workers that die are restarted; their jobs are re-queued from the last checkpoint.
+        Args:
+            pin: Worker CPU pinning: None, 'core' or 'numa' (see colorizers.runtime.worker_runtime)
+        """
+        self.db_path = db_path
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.pin = pin
+        self.processes = {}
+
+    def _spawn(self, index, exit_when_idle):
+        p = mp.Process(target=worker_loop, args=(self.db_path, self.poll_interval, exit_when_idle,
+                                                 index, self.workers, self.pin))
+        p.start()
+        return p
+
+    def run(self, exit_when_idle=False):
+        """Run the pool in the foreground until interrupted (or until idle)"""
+        # worker slot -> process; a restarted worker keeps its slot (and CPU share)
+        self.processes = {i: self._spawn(i, exit_when_idle) for i in range(self.workers)}
+        try:
+            while self.processes:
+                time.sleep(self.poll_interval)
+                for i, p in list(self.processes.items()):
+                    if p.is_alive():
+                        continue
+                    if p.exitcode == 0 and exit_when_idle:
+                        del self.processes[i]
+                    else:
+                        print(f"⚠️ Worker {p.pid} exited with code {p.exitcode}, restarting")
+                        self.processes[i] = self._spawn(i, exit_when_idle)
+        except KeyboardInterrupt:
+            for p in self.processes.values():
+                p.terminate()
+            for p in self.processes.values():
+                p.join()
+
+def _print_job(job):
+    pct = 100.0 * job['progress'] / job['total'] if job['total'] else 0.0
+    line = f"{job['id']:>5}  {job['status']:<9}  {job['kind']:<5}  {pct:5.1f}%  {job['input']} -> {job['output']}"
+    if job.get('error'):
+        line += f"  ({job['error']})"
+    print(line)
+
+def main():
+    from colorizers.models import MODEL_TYPES
+
+    parser = argparse.ArgumentParser(description='Colorization job queue')
+    parser.add_argument('--db', default=DEFAULT_DB, help='Job database path')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_submit = sub.add_parser('submit', help='Queue a video or image-folder job')
+    p_submit.add_argument('kind', choices=JOB_KINDS)
+    p_submit.add_argument('input', help='Input video file or image folder')
+    p_submit.add_argument('-o', '--output', required=True, help='Output video file or image folder')
+    p_submit.add_argument('--model', choices=MODEL_TYPES, default='eccv16', help='Model type')
+    p_submit.add_argument('--device', choices=['cpu', 'cuda'], default='cpu', help='Device to use')
+    p_submit.add_argument('--size', type=int, default=256, help='Inference resolution (multiple of 8)')
+    p_submit.add_argument('--letterbox', action='store_true', help='Preserve aspect ratio at inference (pad instead of stretch)')
+    p_submit.add_argument('--frame_skip', type=int, default=1, help='Process every nth frame (video jobs)')
+    p_submit.add_argument('--quality', choices=['low', 'medium', 'high'], default='medium', help='Output quality (video jobs)')
+
+    p_status = sub.add_parser('status', help='Show job status')
+    p_status.add_argument('job_id', type=int, nargs='?')
+
+    p_cancel = sub.add_parser('cancel', help='Cancel a job')
+    p_cancel.add_argument('job_id', type=int)
+
+    p_work = sub.add_parser('work', help='Run a pool of workers')
+    p_work.add_argument('--workers', type=int, default=2, help='Number of worker processes')
+    p_work.add_argument('--exit-when-idle', action='store_true', help='Stop once the queue is empty')
+    p_work.add_argument('--pin', choices=['core', 'numa'], help='Pin workers to disjoint cores or NUMA nodes')
+
+    args = parser.parse_args()
+    queue = JobQueue(args.db)
+
+    if args.command == 'submit':
+        options = {'model_type': args.model, 'device': args.device, 'inference_size': args.size,
+                   'letterbox': args.letterbox}
+        if args.kind == 'video':
+            options.update(frame_skip=args.frame_skip, quality=args.quality)
+        job_id = queue.submit(args.kind, args.input, args.output, **options)
+        print(f"📥 Submitted job {job_id}")
+    elif args.command == 'status':
+        jobs = [queue.status(args.job_id)] if args.job_id is not None else queue.list_jobs()
+        for job in jobs:
+            if job is None:
+                print(f"❌ No such job: {args.job_id}")
+            else:
+                _print_job(job)
+    elif args.command == 'cancel':
+        if queue.cancel(args.job_id):
+            print(f"⏹️ Cancelled job {args.job_id}")
+        else:
+            print(f"❌ Job {args.job_id} is not queued or running")
+    elif args.command == 'work':
+        WorkerPool(args.db, workers=args.workers, pin=args.pin).run(exit_when_idle=args.exit_when_idle)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Structured channel pruning of the pretrained eccv16/siggraph17 trunks (model4-model7)
+Channel importance is measured on a local calibration set, the least useful channels are
+removed until the network fits a MAC budget, and the narrower model is compared with the
+original through the preprocess_img/postprocess_tens pipeline.
+
+Usage:
+    python prune.py --model eccv16 -i imgs --flops 0.6
+    python prune.py --model siggraph17 -i calib/ --eval holdout/ --flops 0.5 --finetune_epochs 3
+Load the result with colorizers.load_pruned(path).
+"""
+
+import os
+import time
+import argparse
+
+import numpy as np
+import torch
+
+from colorizers import build_colorizer, load_img, preprocess_img, postprocess_tens
+from colorizers.pruning import layer_widths, count_macs, channel_stats, channel_importance, plan_widths, prune_channels
+from colorizers.distill import list_training_images, distill
+from colorizers.runtime import configure_from_saved
+
+def load_l_batches(paths, size=256, batch_size=8):
+    """Network-resolution L tensors of paths, in batches (the calibration input)"""
+    ls = [preprocess_img(load_img(path)[:,:,:3], HW=(size,size))[1] for path in paths]
+    return [torch.cat(ls[i:i+batch_size]) for i in range(0, len(ls), batch_size)]
+
+def forward_ms(model, size, repeat=5):
+    """Median forward time in milliseconds at size x size"""
+    tens = torch.rand(1, 1, size, size)*100
+    times = []
+    with torch.no_grad():
+        model(tens)
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            model(tens)
+            times.append((time.perf_counter() - t0)*1000)
+    return float(np.median(times))
+
+def compare_outputs(original, pruned, paths, size=256):
+    """
+    Mean PSNR (dB) of the pruned model's full-resolution RGB output against the original's,
+    and mean absolute ab difference at network resolution
+    """
+    psnrs, ab_errs = [], []
+    with torch.no_grad():
+        for path in paths:
+            tens_l_orig, tens_l_rs = preprocess_img(load_img(path)[:,:,:3], HW=(size,size))
+            out_ref, out = original(tens_l_rs), pruned(tens_l_rs)
+            ab_errs.append(float((out - out_ref).abs().mean()))
+            ref = postprocess_tens(tens_l_orig, out_ref)
+            mse = float(np.mean((postprocess_tens(tens_l_orig, out) - ref)**2))
+            psnrs.append(10*np.log10(1./max(mse, 1e-10)))
+    return float(np.mean(psnrs)), float(np.mean(ab_errs))
+
+def print_report(rows):
+    print(f"\n{'model':>10} {'GMACs':>7} {'params (M)':>11} {'ms/forward':>11} {'speedup':>8} {'PSNR vs orig':>13} {'ab MAE':>7}")
+    base_ms = rows[0][3]
+    for name, macs, params, ms, psnr, ab_err in rows:
+        psnr_s = f"{psnr:>10.2f} dB" if psnr is not None else f"{'-':>13}"
+        ab_s = f"{ab_err:>7.2f}" if ab_err is not None else f"{'-':>7}"
+        print(f"{name:>10} {macs/1e9:>7.2f} {params/1e6:>11.2f} {ms:>11.1f} {base_ms/ms:>7.2f}x {psnr_s} {ab_s}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Prune trunk channels of eccv16/siggraph17 to a MAC budget')
+    parser.add_argument('--model', choices=['eccv16', 'siggraph17'], default='eccv16')
+    parser.add_argument('-i', '--input', nargs='+', default=['imgs'], help='Calibration image folders (searched recursively)')
+    parser.add_argument('--eval', nargs='+', help='Folders for the quality comparison (default: the calibration images)')
+    parser.add_argument('-o', '--output', help='Where to save the pruned model (default: <model>_pruned<pct>.pth)')
+    parser.add_argument('--flops', type=float, default=0.6, help='Target MACs as a fraction of the original model')
+    parser.add_argument('--size', type=int, default=256, help='Calibration/inference resolution')
+    parser.add_argument('--round_to', type=int, default=8, help='Keep layer widths multiples of this')
+    parser.add_argument('--min_channels', type=int, default=64, help='Never narrow a layer below this')
+    parser.add_argument('--no_bias_correction', action='store_true', help='Drop channels without folding their mean into the next bias')
+    parser.add_argument('--finetune_epochs', type=int, default=0, help='Distill from the original model on the calibration set afterwards')
+    parser.add_argument('--finetune_lr', type=float, default=1e-4)
+    parser.add_argument('--repeat', type=int, default=5, help='Timing repetitions')
+    parser.add_argument('--threads', type=int, help='Torch/OpenCV/BLAS threads (default: saved autotune setting)')
+    args = parser.parse_args()
+    if not 0 < args.flops <= 1:
+        parser.error('--flops must be in (0, 1]')
+
+    configure_from_saved(num_threads=args.threads)
+    torch.manual_seed(0)
+    paths = list_training_images(args.input)
+    if not paths:
+        parser.error(f"no calibration images found in {args.input}")
+    eval_paths = list_training_images(args.eval) if args.eval else paths
+    output = args.output or f"{args.model}_pruned{round(args.flops*100)}.pth"
+
+    original = build_colorizer(args.model).eval()
+    _, base_macs = count_macs(original, args.size)
+    print(f"📏 {args.model}: {base_macs/1e9:.2f} GMACs at {args.size}x{args.size}, target {args.flops:.0%}")
+
+    t0 = time.time()
+    batches = load_l_batches(paths, args.size)
+    stats = channel_stats(original, batches)
+    importance = channel_importance(original, stats)
+    widths, keep, estimate = plan_widths(original, importance, args.flops*base_macs, size=args.size,
+                                         round_to=args.round_to, min_channels=args.min_channels)
+    print(f"🔬 Calibrated on {len(paths)} images in {time.time()-t0:.1f}s")
+    if estimate > args.flops*base_macs:
+        print(f"⚠️  --min_channels {args.min_channels} limits the model to {estimate/base_macs:.0%} of the original MACs")
+
+    pruned = build_colorizer(args.model).eval()
+    prune_channels(pruned, keep, None if args.no_bias_correction else stats)
+    if args.finetune_epochs:
+        ls = torch.cat(batches)
+        with torch.no_grad():
+            targets = torch.cat([original(batch) for batch in batches])
+        pruned = distill(pruned, ls, targets, epochs=args.finetune_epochs, lr=args.finetune_lr)
+
+    base_widths = layer_widths(original)
+    print(f"{'layer':>10} {'channels':>9}")
+    for name, width in layer_widths(pruned).items():
+        print(f"{name:>10} {width:>4}/{base_widths[name]}")
+
+    rows = []
+    for name, model in (('original', original), ('pruned', pruned)):
+        _, macs = count_macs(model, args.size)
+        params = sum(p.numel() for p in model.parameters())
+        quality = compare_outputs(original, model, eval_paths, args.size) if model is pruned else (None, None)
+        rows.append((name, macs, params, forward_ms(model, args.size, args.repeat)) + quality)
+    print_report(rows)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    torch.save({'model_type': args.model, 'widths': widths, 'state_dict': pruned.state_dict(),
+                'macs': rows[1][1], 'base_macs': base_macs, 'size': args.size, 'images': len(paths)}, output)
+    print(f"💾 Saved pruned {args.model} to: {output}")
+
+if __name__ == "__main__":
+    main()
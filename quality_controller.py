@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Load-adaptive admission and quality control for serving colorization requests
+Requests go through one queue in front of the colorizers. Before each batch the
+controller picks the best quality level (model and inference resolution) whose
+predicted latency, from the current queue depth and measured per-image service
+times, still meets the target p99. It also picks how long to wait for the batch to
+fill. Under overload, low-priority requests are deferred until the queue drains, or
+shed. Every result records the quality level it was served at.
+
+Usage:
+    python quality_controller.py simulate --rate 15 --duration 30 --target_p99 1.0
+    python quality_controller.py simulate --rate 40 --low_priority shed --pretrained
+"""
+
+import time
+import heapq
+import random
+import argparse
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import Future, InvalidStateError
+
+QualityLevel = namedtuple('QualityLevel', 'name model size')
+
+# best first; each step trades quality for speed (siggraph17 -> eccv16, then resolution)
+DEFAULT_LEVELS = (
+    QualityLevel('full', 'siggraph17', 256),
+    QualityLevel('standard', 'eccv16', 256),
+    QualityLevel('reduced', 'eccv16', 192),
+    QualityLevel('minimal', 'eccv16', 128),
+)
+
+PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+
+ColorizeResult = namedtuple('ColorizeResult', 'image quality latency queued')
+
+class Overloaded(Exception):
+    """Set on the future of a request that was shed"""
+
+class QualityController:
+    def __init__(self, levels=DEFAULT_LEVELS, target_p99=1.0, max_batch=8, max_window=.05,
+                 max_queue=64, upgrade_after=2., history=10., clock=time.monotonic):
+        """
+        Args:
+            target_p99: latency target in seconds, from submission to result
+            max_window: longest wait for a batch to fill
+            max_queue: queued requests beyond which only high-priority ones are admitted
+            upgrade_after: seconds a level must hold before quality is raised again
+            history: seconds of completed requests used for the observed p99
+        """
+        self.levels = list(levels)
+        self.target_p99 = target_p99
+        self.max_batch = max_batch
+        self.max_window = max_window
+        self.max_queue = max_queue
+        self.upgrade_after = upgrade_after
+        self.history = history
+        self.clock = clock
+        self.level = 0
+        self.last_change = clock()
+        self.per_image = {}             # level index -> EWMA seconds per image
+        self.latencies = deque()        # (completion time, latency)
+
+    def observe_batch(self, level, n, seconds, alpha=.3):
+        i = self.levels.index(level)
+        sample = seconds/max(n, 1)
+        self.per_image[i] = sample if i not in self.per_image else (1-alpha)*self.per_image[i] + alpha*sample
+
+    def observe_latency(self, seconds):
+        now = self.clock()
+        self.latencies.append((now, seconds))
+        while self.latencies and self.latencies[0][0] < now - self.history:
+            self.latencies.popleft()
+
+    def observed_p99(self):
+        if not self.latencies:
+            return None
+        values = sorted(latency for _, latency in self.latencies)
+        return values[min(len(values)-1, int(.99*len(values)))]
+
+    def service_time(self, i):
+        """Seconds per image at level i; unmeasured levels are scaled by pixel count from a measured one"""
+        if i in self.per_image:
+            return self.per_image[i]
+        if not self.per_image:
+            return 0.
+        j = min(self.per_image, key=lambda j: abs(j - i))
+        return self.per_image[j]*(self.levels[i].size/self.levels[j].size)**2
+
+    def predict(self, i, depth):
+        # a request arriving now waits for the queue ahead of it, then its own batch
+        return self.service_time(i)*(depth + 1)
+
+    def choose(self, depth):
+        """
+        Quality level for the next batch with depth requests queued
+        Quality drops as soon as the prediction (or the observed p99) misses the target,
+        and rises one level at a time, only after upgrade_after seconds with headroom.
+        """
+        now = self.clock()
+        fits = [i for i in range(len(self.levels)) if self.predict(i, depth) <= .8*self.target_p99]
+        best = fits[0] if fits else len(self.levels) - 1
+        p99 = self.observed_p99()
+        if p99 is not None and p99 > self.target_p99:
+            best = max(best, min(self.level + 1, len(self.levels) - 1))
+        if best > self.level:
+            self.level, self.last_change = best, now
+        elif best < self.level and now - self.last_change >= self.upgrade_after and (p99 is None or p99 < .7*self.target_p99):
+            self.level, self.last_change = self.level - 1, now
+        return self.levels[self.level]
+
+    def batch_window(self, depth):
+        """How long to wait for more requests: free when a full batch is queued, else a slice of the slack"""
+        if depth >= self.max_batch:
+            return 0.
+        slack = self.target_p99 - self.predict(self.level, depth)
+        return min(self.max_window, max(0., .1*slack))
+
+    def overloaded(self, depth):
+        # even the cheapest level cannot drain the queue within the target
+        return self.predict(len(self.levels) - 1, depth) > self.target_p99
+
+    def admit(self, priority, depth):
+        """'admit', 'defer' or 'shed' for a new request with depth requests queued"""
+        if PRIORITIES[priority] == 0:
+            return 'admit'
+        if depth >= self.max_queue:
+            return 'shed'
+        if priority == 'low' and self.overloaded(depth):
+            return 'defer'
+        return 'admit'
+
+def _resolve(future, result=None, error=None):
+    # a future the client cancelled (or that is otherwise settled) must not stop the dispatcher
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+def make_model_runner(device='cpu', pretrained=True):
+    """run_batch for ColorizationService: cached models from build_colorizer, one forward pass per batch"""
+    import torch
+    from colorizers import build_colorizer, preprocess_img, postprocess_tens_uint8
+
+    models = {}
+    lock = threading.Lock()
+
+    def run_batch(level, images):
+        with lock:
+            if level.model not in models:
+                models[level.model] = build_colorizer(level.model, pretrained=pretrained).eval().to(device)
+        tens = [preprocess_img(img, HW=(level.size, level.size)) for img in images]
+        with torch.no_grad():
+            out_ab = models[level.model](torch.cat([tens_l_rs for _, tens_l_rs in tens]).to(device)).cpu()
+        return [postprocess_tens_uint8(tens_l_orig, out_ab[i:i+1]) for i, (tens_l_orig, _) in enumerate(tens)]
+    return run_batch
+
+class ColorizationService:
+    def __init__(self, controller=None, run_batch=None, low_priority='defer', max_deferred=256):
+        """
+        Queue, controller and a dispatcher thread in front of the colorizers
+        Args:
+            run_batch: called as run_batch(QualityLevel, images) -> colorized images
+                (default make_model_runner())
+            low_priority: what overload does to low-priority requests: 'defer' (run them
+                once the queue drains) or 'shed'
+        """
+        self.controller = controller or QualityController()
+        self.run_batch = run_batch or make_model_runner()
+        self.low_priority = low_priority
+        self.max_deferred = max_deferred
+        self.queue = []                 # heap of (priority, seq, submitted, image, future)
+        self.deferred = deque()
+        self.seq = 0
+        self.cond = threading.Condition()
+        self.stopping = False
+        self.counts = {'admitted': 0, 'deferred': 0, 'shed': 0, 'failed': 0, 'cancelled': 0}
+        self.served = {level.name: 0 for level in self.controller.levels}
+        self.thread = threading.Thread(target=self._dispatch, daemon=True)
+        self.thread.start()
+
+    def submit(self, img, priority='normal'):
+        """Queue one H x W x 3 uint8 image; the future resolves to a ColorizeResult (or raises Overloaded)"""
+        future = Future()
+        with self.cond:
+            decision = self.controller.admit(priority, len(self.queue))
+            if decision == 'defer' and (self.low_priority == 'shed' or len(self.deferred) >= self.max_deferred):
+                decision = 'shed'
+            self.counts[{'admit': 'admitted', 'defer': 'deferred', 'shed': 'shed'}[decision]] += 1
+            if decision == 'shed':
+                future.set_exception(Overloaded(f"{priority} priority request shed at queue depth {len(self.queue)}"))
+                return future
+            self.seq += 1
+            entry = (PRIORITIES[priority], self.seq, self.controller.clock(), img, future)
+            if decision == 'defer':
+                self.deferred.append(entry)
+            else:
+                heapq.heappush(self.queue, entry)
+            self.cond.notify()
+        return future
+
+    def colorize(self, img, priority='normal', timeout=None):
+        return self.submit(img, priority).result(timeout)
+
+    def _take_batch(self):
+        # called with the lock held; deferred requests run only when nothing else waits
+        controller = self.controller
+        while not self.queue and not (self.deferred and not controller.overloaded(0)) and not self.stopping:
+            self.cond.wait(.1)
+        if self.stopping:
+            return None, [], False
+        if not self.queue:
+            entries = [self.deferred.popleft() for _ in range(min(controller.max_batch, len(self.deferred)))]
+            return controller.choose(0), self._claim(entries), True
+        level = controller.choose(len(self.queue))
+        deadline = controller.clock() + controller.batch_window(len(self.queue))
+        while len(self.queue) < controller.max_batch and not self.stopping:
+            remaining = deadline - controller.clock()
+            if remaining <= 0:
+                break
+            self.cond.wait(remaining)
+        entries = [heapq.heappop(self.queue) for _ in range(min(controller.max_batch, len(self.queue)))]
+        return level, self._claim(entries), False
+
+    def _claim(self, entries):
+        # mark the futures running; requests their clients already cancelled are dropped
+        claimed = [entry for entry in entries if entry[4].set_running_or_notify_cancel()]
+        self.counts['cancelled'] += len(entries) - len(claimed)
+        return claimed
+
+    def _dispatch(self):
+        controller = self.controller
+        while True:
+            with self.cond:
+                level, entries, deferred = self._take_batch()
+            if level is None:
+                return
+            if not entries:
+                continue
+            t0 = controller.clock()
+            try:
+                images = self.run_batch(level, [entry[3] for entry in entries])
+                if len(images) != len(entries):
+                    raise RuntimeError(f"run_batch returned {len(images)} images for {len(entries)} requests")
+            except Exception as e:
+                for entry in entries:
+                    _resolve(entry[4], error=e)
+                with self.cond:
+                    self.counts['failed'] += len(entries)
+                continue
+            done = controller.clock()
+            with self.cond:
+                controller.observe_batch(level, len(entries), done - t0)
+                self.served[level.name] += len(entries)
+                # deferred requests waited on purpose; their latency says nothing about the load
+                if not deferred:
+                    for entry in entries:
+                        controller.observe_latency(done - entry[2])
+            quality = {'level': level.name, 'model': level.model, 'size': level.size,
+                       'degraded': controller.levels.index(level) > 0, 'deferred': deferred}
+            for (_, _, submitted, _, future), image in zip(entries, images):
+                _resolve(future, ColorizeResult(image, quality, done - submitted, t0 - submitted))
+
+    def stats(self):
+        with self.cond:
+            return dict(self.counts, queued=len(self.queue), deferred_waiting=len(self.deferred),
+                        level=self.controller.levels[self.controller.level].name, served=dict(self.served),
+                        p99=self.controller.observed_p99())
+
+    def stop(self):
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+        self.thread.join()
+        for entry in list(self.queue) + list(self.deferred):
+            _resolve(entry[4], error=Overloaded('service stopped'))
+
+def simulate(args):
+    import numpy as np
+    from colorizers.runtime import configure_from_saved
+
+    configure_from_saved(num_threads=args.threads)
+    controller = QualityController(target_p99=args.target_p99, max_batch=args.max_batch, max_queue=args.max_queue)
+    service = ColorizationService(controller, make_model_runner(args.device, pretrained=args.pretrained),
+                                  low_priority=args.low_priority)
+    rng = random.Random(0)
+    images = [(np.random.RandomState(i).rand(480, 640, 3)*255).astype(np.uint8) for i in range(4)]
+    weights = [args.high, 1. - args.high - args.low, args.low]
+
+    # warm up both models so first-call costs do not count against the target
+    for level in controller.levels[:2]:
+        service.run_batch(level, images[:1])
+    futures = []
+    start = time.monotonic()
+    next_report = start + 1.
+    print(f"{'t':>4} {'queued':>7} {'level':>9} {'p99 (s)':>8} {'shed':>5} {'deferred':>9}")
+    while time.monotonic() - start < args.duration:
+        priority = rng.choices(['high', 'normal', 'low'], weights)[0]
+        futures.append((priority, service.submit(rng.choice(images), priority)))
+        time.sleep(rng.expovariate(args.rate))
+        if time.monotonic() >= next_report:
+            next_report += 1.
+            s = service.stats()
+            p99 = f"{s['p99']:.2f}" if s['p99'] is not None else '-'
+            print(f"{time.monotonic()-start:>4.0f} {s['queued']:>7} {s['level']:>9} {p99:>8} {s['shed']:>5} {s['deferred']:>9}")
+
+    latencies = {p: [] for p in PRIORITIES}
+    levels = {}
+    for priority, future in futures:
+        try:
+            result = future.result(timeout=60)
+        except Overloaded:
+            continue
+        latencies[priority].append(result.latency)
+        levels[result.quality['level']] = levels.get(result.quality['level'], 0) + 1
+    service.stop()
+    s = service.stats()
+    print(f"\n{len(futures)} requests: {sum(levels.values())} served, {s['shed']} shed, {s['deferred']} deferred")
+    for priority, values in latencies.items():
+        if values:
+            values.sort()
+            print(f"{priority:>7}: {len(values):>5} served, p50 {values[len(values)//2]:.2f}s, "
+                  f"p99 {values[min(len(values)-1, int(.99*len(values)))]:.2f}s (target {args.target_p99:g}s)")
+    print('levels: ' + ', '.join(f"{level.name} {levels.get(level.name, 0)}" for level in controller.levels))
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-adaptive quality control for colorization serving')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_sim = sub.add_parser('simulate', help='Drive the service with synthetic Poisson load and report what it did')
+    p_sim.add_argument('--rate', type=float, default=10., help='Requests per second')
+    p_sim.add_argument('--duration', type=float, default=20., help='Seconds of load')
+    p_sim.add_argument('--target_p99', type=float, default=1., help='Latency target in seconds')
+    p_sim.add_argument('--max_batch', type=int, default=8)
+    p_sim.add_argument('--max_queue', type=int, default=64)
+    p_sim.add_argument('--high', type=float, default=.1, help='Fraction of high-priority requests')
+    p_sim.add_argument('--low', type=float, default=.3, help='Fraction of low-priority requests')
+    p_sim.add_argument('--low_priority', choices=['defer', 'shed'], default='defer', help='Overload policy for low priority')
+    p_sim.add_argument('--device', choices=['cpu', 'cuda'], default='cpu')
+    p_sim.add_argument('--pretrained', action='store_true', help='Download and use pretrained weights')
+    p_sim.add_argument('--threads', type=int, help='Torch/OpenCV/BLAS threads (default: saved autotune setting)')
+    p_sim.set_defaults(func=simulate)
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Sharded image datasets (WebDataset-style tar files)
+Millions of small files are slow on network filesystems because every file costs
+metadata operations. Shards pack many encoded images into large tar files that are
+written and read sequentially; each shard gets a small .idx file (JSON lines with
+name, byte offset and size) so single images can still be read with one seek.
+
+Layout:
+    out/shard-000000.tar      key.png members, in write order
+    out/shard-000000.idx      {"name": "key.png", "offset": 1536, "size": 48211} per line
+
+Usage:
+    python shards.py ls out/                  # list shards and member counts
+    python shards.py get out/ color_0001.png -o color_0001.png
+"""
+
+import io
+import os
+import glob
+import json
+import tarfile
+import argparse
+
+import numpy as np
+from PIL import Image
+
+IMAGE_FORMATS = ('png', 'jpg', 'webp')
+DEFAULT_SHARD_SIZE = 1 << 30  # bytes of encoded images per shard
+
+def encode_image(img, fmt='png', quality=90, compression=1, encoder='pil'):
+    """
+    Encode an H x W x 3 uint8 RGB image to bytes
+    Args:
+        fmt: 'png', 'jpg' or 'webp'
+        quality: JPEG/WebP quality (0-100)
+        compression: PNG zlib level (0-9); low levels are much faster and only slightly larger
+        encoder: 'pil' or 'cv2' (OpenCV is usually faster for PNG and JPEG)
+    """
+    if fmt not in IMAGE_FORMATS:
+        raise ValueError(f"unknown image format {fmt!r}, expected one of {IMAGE_FORMATS}")
+    if encoder == 'cv2':
+        import cv2
+        params = {'png': [cv2.IMWRITE_PNG_COMPRESSION, compression],
+                  'jpg': [cv2.IMWRITE_JPEG_QUALITY, quality],
+                  'webp': [cv2.IMWRITE_WEBP_QUALITY, quality]}[fmt]
+        ok, buf = cv2.imencode('.' + fmt, np.ascontiguousarray(img[:,:,::-1]), params)
+        if not ok:
+            raise RuntimeError(f"OpenCV could not encode {fmt}")
+        return buf.tobytes()
+
+    out = io.BytesIO()
+    pil_img = Image.fromarray(img)
+    if fmt == 'png':
+        pil_img.save(out, format='PNG', compress_level=compression)
+    elif fmt == 'jpg':
+        pil_img.save(out, format='JPEG', quality=quality)
+    else:
+        pil_img.save(out, format='WEBP', quality=quality)
+    return out.getvalue()
+
+def decode_image(data):
+    # encoded bytes -> H x W x 3 uint8 RGB
+    out_np = np.asarray(Image.open(io.BytesIO(data)).convert('RGB'))
+    return out_np
+
+class ShardWriter():
+    """
+    Write encoded images into sequential tar shards with a per-shard offset index
+    A new shard is started once the current one reaches max_size bytes or max_count images.
+    Use as a context manager, or call close() to finish the last shard.
+    """
+    def __init__(self, output_dir, prefix='shard', max_size=DEFAULT_SHARD_SIZE, max_count=None,
+                 fmt='png', quality=90, compression=1, encoder='pil'):
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.max_size = max_size
+        self.max_count = max_count
+        self.encode_args = {'fmt': fmt, 'quality': quality, 'compression': compression, 'encoder': encoder}
+        self.fmt = fmt
+        self.shard_index = 0
+        self.shard_paths = []
+        self.tar = None
+        self.idx = None
+
+    def _open_shard(self):
+        path = os.path.join(self.output_dir, f"{self.prefix}-{self.shard_index:06d}.tar")
+        self.tar = tarfile.open(path, 'w')
+        self.idx = open(path[:-4] + '.idx', 'w')
+        self.shard_paths.append(path)
+        self.shard_index += 1
+        self.count = 0
+
+    def _close_shard(self):
+        if self.tar is not None:
+            self.tar.close()
+            self.idx.close()
+            self.tar = self.idx = None
+
+    def write_bytes(self, name, data):
+        """Append an already encoded member called name (e.g. 'key.png')"""
+        if self.tar is None or self.tar.offset >= self.max_size or (self.max_count and self.count >= self.max_count):
+            self._close_shard()
+            self._open_shard()
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        self.tar.addfile(info, io.BytesIO(data))
+        # the data ends the tar's record-padded output, so its start follows from the new offset
+        offset = self.tar.offset - (len(data) + tarfile.BLOCKSIZE - 1)//tarfile.BLOCKSIZE*tarfile.BLOCKSIZE
+        self.idx.write(json.dumps({'name': name, 'offset': offset, 'size': len(data)}) + '\n')
+        self.count += 1
+
+    def write(self, key, img):
+        """Encode an H x W x 3 uint8 RGB image and store it as key.<fmt>"""
+        self.write_bytes(f"{key}.{self.fmt}", encode_image(img, **self.encode_args))
+
+    def close(self):
+        self._close_shard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def list_shards(source):
+    # a directory of shards, a glob pattern, a single .tar or a list of those
+    if isinstance(source, (list, tuple)):
+        return [path for item in source for path in list_shards(item)]
+    if os.path.isdir(source):
+        return sorted(glob.glob(os.path.join(source, '*.tar')))
+    return sorted(glob.glob(source))
+
+class ShardReader():
+    """
+    Read images back from tar shards
+    Iterating streams every shard front to back (no index needed, so it also works on
+    WebDataset tars written by other tools); read(name) uses the .idx files to fetch one
+    member with a single seek, scanning a shard's tar headers if its index is missing.
+    """
+    def __init__(self, source):
+        self.shard_paths = list_shards(source)
+        if not self.shard_paths:
+            raise FileNotFoundError(f"no .tar shards found in {source}")
+        self.index = None
+
+    def __iter__(self):
+        # yields (name, encoded bytes)
+        for path in self.shard_paths:
+            with tarfile.open(path, 'r|') as tar:
+                for member in tar:
+                    if member.isfile():
+                        yield member.name, tar.extractfile(member).read()
+
+    def images(self):
+        # yields (key, H x W x 3 uint8 RGB) for every image member
+        for name, data in self:
+            key, ext = os.path.splitext(name)
+            if ext.lower().lstrip('.') in IMAGE_FORMATS + ('jpeg',):
+                yield key, decode_image(data)
+
+    def _shard_index(self, path):
+        idx_path = path[:-4] + '.idx'
+        if os.path.exists(idx_path):
+            with open(idx_path) as f:
+                return [json.loads(line) for line in f if line.strip()]
+        with tarfile.open(path, 'r') as tar:
+            return [{'name': m.name, 'offset': m.offset_data, 'size': m.size} for m in tar if m.isfile()]
+
+    def load_index(self):
+        # {name: (shard path, offset, size)} over all shards
+        if self.index is None:
+            self.index = {}
+            for path in self.shard_paths:
+                for entry in self._shard_index(path):
+                    self.index[entry['name']] = (path, entry['offset'], entry['size'])
+        return self.index
+
+    def names(self):
+        return list(self.load_index())
+
+    def read(self, name):
+        """Encoded bytes of one member"""
+        path, offset, size = self.load_index()[name]
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            return f.read(size)
+
+    def read_image(self, name):
+        return decode_image(self.read(name))
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect tar image shards')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_ls = sub.add_parser('ls', help='List shards and their member counts')
+    p_ls.add_argument('source', help='Shard directory, glob or .tar file')
+    p_get = sub.add_parser('get', help='Extract one member by name')
+    p_get.add_argument('source', help='Shard directory, glob or .tar file')
+    p_get.add_argument('name')
+    p_get.add_argument('-o', '--output', help='Output file (default: the member name)')
+    args = parser.parse_args()
+
+    reader = ShardReader(args.source)
+    if args.command == 'ls':
+        for path in reader.shard_paths:
+            entries = reader._shard_index(path)
+            print(f"{path}: {len(entries)} members, {os.path.getsize(path) / 2**20:.1f} MB")
+    else:
+        out_path = args.output or os.path.basename(args.name)
+        with open(out_path, 'wb') as f:
+            f.write(reader.read(args.name))
+        print(f"Saved: {out_path}")
+
+if __name__ == "__main__":
+    main()
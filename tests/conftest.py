@@ -0,0 +1,158 @@
+"""
+Shared fixtures for the colorizers test suite
+Tests run offline: models get deterministic "fixture weights" drawn from a seeded
+numpy generator instead of downloading the released checkpoints, and outputs are
+compared against goldens stored in tests/goldens. Regenerate the goldens after an
+intended output change with
+
+    python -m pytest --update-goldens
+
+and commit the changed files together with the change.
+"""
+
+import os
+import sys
+import json
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN_DIR = os.path.join(ROOT, 'tests', 'goldens')
+BUDGETS_PATH = os.path.join(ROOT, 'tests', 'budgets.json')
+VIDEO_PATH = os.path.join(ROOT, 'videos', 'input', 'video2.mp4')
+
+# the scripts in the repository root (video_colorizer.py, ...) are imported as modules
+sys.path.insert(0, ROOT)
+
+# a small, varied subset of imgs/: gray portrait-ish, landscape, color photo, webp
+GOLDEN_IMAGES = ('ansel_adams3.jpg', 'Waterfall.jpg', 'ILSVRC2012_val_00046524.JPEG', 'Lion.webp')
+
+def pytest_addoption(parser):
+    parser.addoption('--update-goldens', action='store_true', default=False,
+                     help='Rewrite tests/goldens from the current outputs instead of comparing')
+
+def init_fixture_weights(model, seed=0):
+    """
+    Overwrite every parameter with seeded numpy draws (He-scaled for conv weights,
+    near 1 for norm scales, small biases), so outputs do not depend on torch's own
+    initializers or on downloaded checkpoints
+    """
+    import numpy as np
+    import torch
+
+    rng = np.random.RandomState(seed)
+    with torch.no_grad():
+        for name, param in model.named_parameters():
+            shape = tuple(param.shape)
+            if param.ndim > 1:
+                fan_in = int(np.prod(shape[1:]))
+                values = rng.standard_normal(shape) * np.sqrt(2. / fan_in)
+            elif name.endswith('weight'):
+                values = 1. + .1 * rng.standard_normal(shape)
+            else:
+                values = .01 * rng.standard_normal(shape)
+            param.copy_(torch.from_numpy(values.astype(np.float32)))
+    return model.eval()
+
+@pytest.fixture(scope='session')
+def make_model():
+    """Build a colorizer by model type with fixture weights (cached per session)"""
+    pytest.importorskip('torch')
+    from colorizers import build_colorizer
+
+    cache = {}
+
+    def make(name):
+        if name not in cache:
+            cache[name] = init_fixture_weights(build_colorizer(name, pretrained=False))
+        return cache[name]
+    return make
+
+@pytest.fixture(scope='session')
+def load_test_img():
+    pytest.importorskip('skimage')
+    from colorizers import load_img
+
+    def load(name):
+        img = load_img(os.path.join(ROOT, 'imgs', name))
+        return img[:,:,:3]
+    return load
+
+def _summarize(arr):
+    # (pooled map, per-channel stats): a compact fingerprint of an image-like array that
+    # still catches spatial regressions, so goldens stay a few KB each
+    import numpy as np
+
+    arr = np.asarray(arr, dtype=np.float64)
+    if arr.ndim == 4:
+        arr = arr[0]
+    if arr.ndim == 3 and arr.shape[-1] in (3, 4) and arr.shape[0] not in (1, 2, 3):
+        arr = arr.transpose(2, 0, 1)
+    if arr.ndim == 2:
+        arr = arr[None]
+    C, H, W = arr.shape
+    bh, bw = max(1, H // 32), max(1, W // 32)
+    pooled = arr[:, :H // bh * bh, :W // bw * bw].reshape(C, H // bh, bh, W // bw, bw).mean(axis=(2, 4))
+    stats = np.stack([arr.mean(axis=(1, 2)), arr.std(axis=(1, 2)), arr.min(axis=(1, 2)), arr.max(axis=(1, 2))])
+    return pooled, stats
+
+class Goldens():
+    def __init__(self, update):
+        self.update = update
+
+    def check(self, name, atol, **arrays):
+        """Compare arrays (by fingerprint) against tests/goldens/<name>.npz, or rewrite it"""
+        import numpy as np
+
+        path = os.path.join(GOLDEN_DIR, name + '.npz')
+        current = {}
+        for key, arr in arrays.items():
+            current[key + '_shape'] = np.array(np.asarray(arr).shape)
+            current[key + '_pooled'], current[key + '_stats'] = _summarize(arr)
+        if self.update:
+            os.makedirs(GOLDEN_DIR, exist_ok=True)
+            np.savez_compressed(path, **current)
+            return
+        if not os.path.exists(path):
+            pytest.skip(f"no golden {os.path.relpath(path, ROOT)}; create it with --update-goldens")
+        with np.load(path) as ref:
+            for key, value in current.items():
+                if key.endswith('_shape'):
+                    assert tuple(value) == tuple(ref[key]), f"{name}: {key} changed"
+                else:
+                    np.testing.assert_allclose(value, ref[key], rtol=0, atol=atol, err_msg=f"{name}: {key}")
+
+@pytest.fixture(scope='session')
+def goldens(request):
+    pytest.importorskip('numpy')
+    return Goldens(request.config.getoption('--update-goldens'))
+
+@pytest.fixture(scope='session')
+def budgets():
+    """tests/budgets.json, scaled by $COLORIZERS_BUDGET_SCALE for slower machines"""
+    with open(BUDGETS_PATH) as f:
+        config = json.load(f)
+    scale = float(os.environ.get('COLORIZERS_BUDGET_SCALE', 1))
+    return {group: {key: value * scale for key, value in limits.items()}
+            for group, limits in config.items() if isinstance(limits, dict)}
+
+@pytest.fixture(scope='session')
+def video_frames():
+    """A few decoded BGR frames from videos/input/video2.mp4"""
+    cv2 = pytest.importorskip('cv2')
+    if not os.path.exists(VIDEO_PATH):
+        pytest.skip('videos/input/video2.mp4 not available')
+    cap = cv2.VideoCapture(VIDEO_PATH)
+    frames = {}
+    index = 0
+    while len(frames) < 3:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if index in (0, 30, 60):
+            frames[index] = frame
+        index += 1
+    cap.release()
+    if not frames:
+        pytest.skip('could not decode videos/input/video2.mp4')
+    return frames
@@ -0,0 +1,82 @@
+import io
+
+import pytest
+
+torch = pytest.importorskip('torch')
+np = pytest.importorskip('numpy')
+Image = pytest.importorskip('PIL.Image')
+
+from colorizers import Colorizer, as_rgb_tensor, encode_img
+from colorizers.buffers import FrameBufferPool, colorize_frame_pooled
+
+class DLPackOnly:
+    # a foreign tensor type that only speaks DLPack
+    def __init__(self, tens):
+        self.tens = tens
+
+    def __dlpack__(self, **kwargs):
+        return self.tens.__dlpack__(**kwargs)
+
+    def __dlpack_device__(self):
+        return self.tens.__dlpack_device__()
+
+def random_rgb(H=40, W=56, seed=0):
+    return np.random.RandomState(seed).randint(0, 256, (H, W, 3)).astype(np.uint8)
+
+def test_inputs_are_wrapped_not_copied():
+    rgb = random_rgb()
+    assert as_rgb_tensor(rgb).data_ptr() == rgb.ctypes.data
+    tens = torch.from_numpy(rgb)
+    assert as_rgb_tensor(DLPackOnly(tens)).data_ptr() == tens.data_ptr()
+
+    gray = rgb[:,:,0].copy()
+    tens = as_rgb_tensor(gray)
+    assert tens.shape == (40, 56, 3) and tens.stride(2) == 0 and tens.data_ptr() == gray.ctypes.data
+    rgba = np.dstack([rgb, np.full(rgb.shape[:2], 255, np.uint8)])
+    assert torch.equal(as_rgb_tensor(rgba), torch.from_numpy(rgb))
+    assert torch.equal(as_rgb_tensor(rgb[::-1]), torch.from_numpy(rgb[::-1].copy()))
+
+def test_input_types_agree(make_model):
+    colorizer = Colorizer(make_model('eccv16'), size=64)
+    rgb = random_rgb()
+    expected = colorizer.colorize(rgb).copy()
+    for src in (encode_img(rgb), Image.fromarray(rgb), DLPackOnly(torch.from_numpy(rgb)), rgb.astype(np.float32)/255.):
+        np.testing.assert_array_equal(colorizer.colorize(src), expected)
+    with pytest.raises(TypeError):
+        colorizer.colorize('not/a/path.png')
+
+def test_matches_pooled_video_path(make_model):
+    model = make_model('siggraph17')
+    rgb = random_rgb()
+    expected = colorize_frame_pooled(model, np.ascontiguousarray(rgb[:,:,::-1]), FrameBufferPool(), size=64)
+    np.testing.assert_array_equal(Colorizer(model, size=64).colorize(rgb), expected[:,:,::-1])
+
+def test_matches_preprocess_postprocess(make_model):
+    from colorizers import preprocess_img, postprocess_tens
+
+    model = make_model('eccv16')
+    rgb = random_rgb()
+    tens_l_orig, tens_l_rs = preprocess_img(rgb, HW=(64,64))
+    with torch.no_grad():
+        expected = (postprocess_tens(tens_l_orig, model(tens_l_rs))*255).astype(np.uint8)
+    result = Colorizer(model, size=64).colorize(rgb)
+    assert np.abs(result.astype(int) - expected.astype(int)).max() <= 1
+
+def test_output_buffers_are_reused(make_model):
+    colorizer = Colorizer(make_model('eccv16'), size=64)
+    first = colorizer.colorize(random_rgb(seed=0))
+    second = colorizer.colorize(random_rgb(seed=1))
+    assert np.shares_memory(first, second)
+
+    out = bytearray(40*56*3)
+    result = colorizer.colorize(random_rgb(seed=1), out=out)
+    assert np.shares_memory(result, np.frombuffer(out, np.uint8))
+    assert bytes(out) == second.tobytes()
+    with pytest.raises(ValueError):
+        colorizer.colorize(random_rgb(seed=1), out=bytearray(10))
+
+def test_encode_roundtrip():
+    rgb = random_rgb()
+    data = encode_img(rgb)
+    assert data[:8] == b'\x89PNG\r\n\x1a\n'
+    np.testing.assert_array_equal(np.asarray(Image.open(io.BytesIO(data))), rgb)
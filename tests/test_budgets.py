@@ -0,0 +1,74 @@
+"""
+Latency and memory budgets (tests/budgets.json) for the main pipeline stages
+Budgets are deliberately loose ceilings for a modest CPU; they exist to catch large
+regressions, not to benchmark. Use benchmark.py for measurements.
+"""
+
+import os
+import sys
+import time
+import subprocess
+
+import pytest
+
+from conftest import ROOT
+
+pytestmark = pytest.mark.perf
+
+torch = pytest.importorskip('torch')
+
+def median_ms(fn, repeat=5, warmup=1):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return sorted(times)[len(times)//2]
+
+def test_import_is_lazy_and_fast(budgets):
+    code = "import sys, colorizers; assert 'torch' not in sys.modules and 'skimage' not in sys.modules"
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True)
+    assert (time.perf_counter() - t0) * 1000 < budgets['startup_ms']['import colorizers']
+
+def test_cli_help_does_not_load_torch():
+    code = ("import sys, runpy\nsys.argv = ['batch_colorize.py', '--help']\n"
+            "try:\n    runpy.run_path('batch_colorize.py', run_name='__main__')\nexcept SystemExit:\n    pass\n"
+            "assert 'torch' not in sys.modules")
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True, capture_output=True)
+
+def test_preprocess_postprocess_latency(load_test_img, budgets):
+    from colorizers import preprocess_img, postprocess_tens, postprocess_tens_uint8
+
+    img = load_test_img('ansel_adams3.jpg')
+    tens_l_orig, _ = preprocess_img(img, HW=(256,256))
+    out_ab = torch.zeros(1, 2, 256, 256)
+    limits = budgets['latency_ms']
+    assert median_ms(lambda: preprocess_img(img, HW=(256,256))) < limits['preprocess_img']
+    assert median_ms(lambda: postprocess_tens(tens_l_orig, out_ab)) < limits['postprocess_tens']
+    assert median_ms(lambda: postprocess_tens_uint8(tens_l_orig, out_ab)) < limits['postprocess_tens_uint8']
+
+@pytest.mark.parametrize('model_name', ['eccv16', 'siggraph17'])
+def test_forward_latency(model_name, make_model, budgets):
+    model = make_model(model_name)
+    tens = torch.rand(1, 1, 256, 256) * 100
+    with torch.no_grad():
+        ms = median_ms(lambda: model(tens), repeat=3)
+    assert ms < budgets['latency_ms'][f'{model_name}_forward']
+
+def test_colorize_frame_latency_and_memory(video_frames, budgets):
+    pytest.importorskip('cv2')
+    from video_colorizer import VideoColorizer
+
+    frame = next(iter(video_frames.values()))
+    colorizer = VideoColorizer(pretrained=False)
+    assert median_ms(lambda: colorizer.colorize_frame(frame), repeat=3) < budgets['latency_ms']['colorize_frame']
+
+    frames = 3
+    with torch.profiler.profile(profile_memory=True) as prof:
+        for _ in range(frames):
+            colorizer.colorize_frame(frame)
+    allocated = sum(max(event.self_cpu_memory_usage, 0) for event in prof.events())
+    assert allocated / frames / 2**20 < budgets['memory_mb']['colorize_frame_alloc_per_frame']
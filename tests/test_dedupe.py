@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('torch')
+pytest.importorskip('skimage')
+
+from dedupe import locate
+
+def scene(seed, H=96, W=128):
+    # smooth random shapes, so resampled copies stay strongly correlated
+    rng = np.random.RandomState(seed)
+    y, x = np.mgrid[:H, :W]
+    img = np.zeros((H, W), np.float64)
+    for _ in range(6):
+        cy, cx, r = rng.uniform(0, H), rng.uniform(0, W), rng.uniform(10, 40)
+        img += rng.uniform(-1, 1)*np.exp(-((y-cy)**2 + (x-cx)**2)/(2*r*r))
+    img = (img - img.min())/(img.max() - img.min())
+    return np.repeat((img*255).astype(np.uint8)[:,:,None], 3, axis=2)
+
+def test_same_framing_requires_correlation():
+    rep = scene(0)
+    rescan = np.clip(scene(0).astype(int)*.9 + 10, 0, 255).astype(np.uint8)
+    assert locate(rep, rescan) == (0., 0., 1., 1.)
+    # same aspect ratio, different picture (e.g. joined to the group through a third image)
+    assert locate(rep, scene(1)) is None
+
+def test_crop_is_located():
+    pytest.importorskip('cv2')
+    rep = scene(2, 192, 256)
+    box = locate(rep, rep[48:144, 32:224])
+    assert box is not None
+    assert np.allclose(box, (48/192, 32/256, 144/192, 224/256), atol=.05)
@@ -0,0 +1,107 @@
+import threading
+
+import pytest
+
+from distributed import Coordinator, CoordinatorClient, make_items, read_manifest, run_worker
+
+def fake_process(settings):
+    # stands in for model loading + colorize_image_file: copies the input with a marker
+    def process(item):
+        if 'broken' in item['input']:
+            raise ValueError('cannot decode')
+        with open(item['input']) as src, open(item['output'], 'w') as dst:
+            dst.write(f"{settings['model']}:{src.read()}")
+    return process
+
+def make_inputs(tmp_path, n, broken=()):
+    (tmp_path / 'in').mkdir()
+    (tmp_path / 'out').mkdir()
+    paths = []
+    for i in range(n):
+        name = f"broken{i}.png" if i in broken else f"img{i:03d}.png"
+        (tmp_path / 'in' / name).write_text(str(i))
+        paths.append(str(tmp_path / 'in' / name))
+    return make_items(paths, str(tmp_path / 'out'))
+
+def run_workers(address, n):
+    threads = [threading.Thread(target=run_worker, args=(address, fake_process), kwargs={'worker_id': f"w{i}"})
+               for i in range(n)]
+    for t in threads:
+        t.start()
+    return threads
+
+def test_local_workers_process_everything(tmp_path):
+    items = make_inputs(tmp_path, 37, broken={5})
+    coordinator = Coordinator(items, settings={'model': 'eccv16'}, chunk_size=4, lease_timeout=5)
+    address = coordinator.start('127.0.0.1', 0)
+    threads = run_workers(address, 3)
+    try:
+        summary = coordinator.wait(linger=.2)
+    finally:
+        coordinator.stop()
+    for t in threads:
+        t.join(timeout=10)
+
+    assert summary['ok'] == 36
+    assert [r['input'] for r in summary['errors']] == [items[5]['input']]
+    assert sum(s['items'] for s in summary['workers'].values()) == 37
+    for item in items[:5] + items[6:]:
+        with open(item['output']) as f:
+            assert f.read().startswith('eccv16:')
+
+def test_lost_lease_is_requeued(tmp_path):
+    items = make_inputs(tmp_path, 8)
+    coordinator = Coordinator(items, settings={'model': 'eccv16'}, chunk_size=4, lease_timeout=.5)
+    address = coordinator.start('127.0.0.1', 0)
+
+    # a worker that takes a chunk and then vanishes without heartbeats
+    dead = CoordinatorClient(address)
+    dead.request({'op': 'hello', 'worker': 'dead'})
+    lost = dead.request({'op': 'lease', 'worker': 'dead'})
+    dead.close()
+
+    threads = run_workers(address, 1)
+    try:
+        summary = coordinator.wait(linger=.2)
+    finally:
+        coordinator.stop()
+    for t in threads:
+        t.join(timeout=10)
+
+    assert summary['requeued'] >= 1
+    assert summary['ok'] == 8 and not summary['lost']
+    assert summary['workers']['w0']['items'] == 8
+    for item in lost['items']:
+        with open(item['output']) as f:
+            assert f.read().startswith('eccv16:')
+
+def test_resume_skips_existing_outputs(tmp_path):
+    items = make_inputs(tmp_path, 6)
+    with open(items[0]['output'], 'w') as f:
+        f.write('done earlier')
+    coordinator = Coordinator(items, chunk_size=4)
+    assert coordinator.skipped == 1
+    assert sum(len(chunk) for chunk in coordinator.chunks.values()) == 5
+
+def test_read_manifest(tmp_path):
+    manifest = tmp_path / 'manifest.txt'
+    manifest.write_text("# archive batch 1\na/x.png\n\nb/y.jpg\tout/custom.jpg\n")
+    items = read_manifest(str(manifest), 'colored')
+    assert items == [{'input': 'a/x.png', 'output': 'colored/color_x.png'},
+                     {'input': 'b/y.jpg', 'output': 'out/custom.jpg'}]
+
+def test_workers_apply_the_coordinator_model_options(monkeypatch):
+    pytest.importorskip('torch')
+    import batch_colorize
+    from colorizers import build_colorizer
+
+    built = []
+    def build(name):
+        built.append(build_colorizer(name, pretrained=False))
+        return built[-1]
+    monkeypatch.setattr('colorizers.models.build_colorizer', build)
+    base = {'size': 64, 'letterbox': False}
+    batch_colorize.colorize_item_process(dict(base, model='eccv16', temperature=.38))
+    batch_colorize.colorize_item_process(dict(base, model='siggraph17', low_memory=True, chunk_rows=32))
+    assert built[0].T == .38
+    assert built[1].low_memory and built[1].chunk_rows == 32
@@ -0,0 +1,42 @@
+import base64
+
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+from image_export import ExportCache, EXPORT_FORMATS, encode_image
+
+def make_img(color=(200, 120, 40)):
+    return Image.new('RGB', (32, 24), color)
+
+def test_all_formats_encode():
+    cache = ExportCache()
+    exports = cache.get_many('img', {'brightness': 1.}, (32, 24), list(EXPORT_FORMATS), make_img())
+    assert exports['PNG'].startswith(b'\x89PNG')
+    assert exports['JPG'].startswith(b'\xff\xd8')
+    assert exports['PDF'].startswith(b'%PDF')
+    assert exports['TIFF'][:2] in (b'II', b'MM')
+    svg = exports['SVG'].decode()
+    assert svg.startswith('<svg') and 'width="32" height="24"' in svg
+    png = base64.b64decode(svg.split('base64,')[1].split('"')[0])
+    assert png == encode_image(make_img(), 'PNG')
+
+def test_unchanged_rerun_does_not_encode():
+    cache = ExportCache()
+    calls = []
+    factory = lambda: calls.append(1) or make_img()
+    first = cache.get_many('img', {'brightness': 1.}, (32, 24), ['PNG', 'JPG'], factory)
+    second = cache.get_many('img', {'brightness': 1.}, (32, 24), ['PNG', 'JPG'], factory)
+    assert calls == [1]
+    assert first == second
+    # any change in the key is a miss
+    cache.get_many('img', {'brightness': 1.2}, (32, 24), ['PNG'], factory)
+    assert calls == [1, 1]
+
+def test_lru_eviction():
+    cache = ExportCache(max_entries=2)
+    for i in range(3):
+        cache.get_many(f'img{i}', {}, (32, 24), ['PNG'], make_img((i, i, i)))
+    assert len(cache.entries) == 2
+    assert ExportCache.key('img0', {}, (32, 24), 'PNG') not in cache.entries
+    assert cache.nbytes == sum(len(v) for v in cache.entries.values())
@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+import types
+import subprocess
+
+import pytest
+
+import job_queue
+from job_queue import Heartbeat, JobCancelled, JobQueue
+
+class Killed(Exception):
+    pass
+
+def dead_pid():
+    proc = subprocess.Popen([sys.executable, '-c', 'pass'])
+    proc.wait()
+    return proc.pid
+
+def make_queue(tmp_path, sizes=(3, 1)):
+    queue = JobQueue(tmp_path / 'jobs.db')
+    ids = []
+    for i, size in enumerate(sizes):
+        path = tmp_path / f"in{i}"
+        path.mkdir()
+        (path / 'a.png').write_bytes(b'x'*size)
+        ids.append(queue.submit('batch', str(path), str(tmp_path / f"out{i}"), model_type='eccv16'))
+    return queue, ids
+
+def test_claim_hands_out_smaller_jobs_once(tmp_path):
+    queue, (big, small) = make_queue(tmp_path)
+    assert queue.claim(os.getpid())['id'] == small
+    assert queue.claim(os.getpid())['id'] == big
+    assert queue.claim(os.getpid()) is None
+    assert queue.status(small)['status'] == 'running'
+
+def test_orphaned_jobs_are_requeued(tmp_path, monkeypatch):
+    queue, (big, small) = make_queue(tmp_path)
+    queue.claim(dead_pid())
+    queue.update_progress(small, 1, 4, checkpoint=1)
+    assert queue.claim(os.getpid())['id'] == small        # its worker died
+    assert queue.status(small)['checkpoint'] == 1
+
+    # a live worker whose heartbeat stopped is considered hung
+    monkeypatch.setattr(job_queue, 'LEASE_TIMEOUT', .1)
+    time.sleep(.2)
+    assert queue.claim(os.getpid())['id'] == small
+    assert queue.claim(os.getpid())['id'] == big
+
+def test_heartbeat_keeps_a_slow_job(tmp_path, monkeypatch):
+    # no progress update for longer than the lease: the background heartbeat holds it
+    monkeypatch.setattr(job_queue, 'LEASE_TIMEOUT', .3)
+    queue, (big, small) = make_queue(tmp_path)
+    job = queue.claim(os.getpid())
+    with Heartbeat(queue, job['id'], os.getpid(), interval=.05):
+        time.sleep(.6)
+        assert queue.claim(os.getpid())['id'] == big
+        assert queue.status(small)['status'] == 'running'
+    assert queue.heartbeat(small, dead_pid()) is False
+
+def test_cancel(tmp_path):
+    queue, (big, small) = make_queue(tmp_path)
+    assert queue.cancel(big)
+    job = queue.claim(os.getpid())
+    assert job['id'] == small and queue.claim(os.getpid()) is None
+
+    assert queue.cancel(small)
+    with pytest.raises(JobCancelled):
+        queue.update_progress(small, 1, 1)
+    queue.finish(small)
+    assert queue.status(small)['status'] == 'cancelled'
+    assert not queue.cancel(small)
+
+def test_batch_resume_skips_finished_files(tmp_path, monkeypatch):
+    pytest.importorskip('torch')
+    import batch_colorize
+
+    calls, killed = [], []
+
+    def fake_colorize(model, img_path, out_path, **kwargs):
+        calls.append(os.path.basename(img_path))
+        if len(calls) == 3 and not killed:
+            killed.append(img_path)
+            raise Killed                # the worker is killed during its third file
+        with open(out_path, 'wb') as f:
+            f.write(b'done')
+
+    monkeypatch.setattr(batch_colorize, 'colorize_image_file', fake_colorize)
+    (tmp_path / 'in').mkdir()
+    for name in ('b.png', 'c.png', 'd.png', 'e.png'):
+        (tmp_path / 'in' / name).write_bytes(b'x')
+    queue = JobQueue(tmp_path / 'jobs.db')
+    job_id = queue.submit('batch', str(tmp_path / 'in'), str(tmp_path / 'out'))
+    colorizer = types.SimpleNamespace(colorizer=None, inference_size=256, letterbox=False)
+    with pytest.raises(Killed):
+        job_queue._run_batch_job(queue, queue.claim(dead_pid()), colorizer)
+
+    # between the runs a file sorting first is added and a finished one removed
+    (tmp_path / 'in' / 'a.png').write_bytes(b'x')
+    os.remove(tmp_path / 'in' / 'b.png')
+    calls.clear()
+    job = queue.claim(os.getpid())
+    assert job['id'] == job_id and job['checkpoint'] == 2
+    job_queue._run_batch_job(queue, job, colorizer)
+    assert calls == ['a.png', 'd.png', 'e.png']
+    assert queue.progress(job_id) == (4, 4)
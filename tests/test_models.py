@@ -0,0 +1,94 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from colorizers import preprocess_img
+
+from conftest import GOLDEN_IMAGES
+
+@pytest.mark.parametrize('model_name', ['eccv16', 'siggraph17'])
+@pytest.mark.parametrize('name', GOLDEN_IMAGES[:2])
+def test_generator_golden(model_name, name, make_model, load_test_img, goldens):
+    model = make_model(model_name)
+    _, tens_l_rs = preprocess_img(load_test_img(name), HW=(256,256))
+    with torch.no_grad():
+        out_ab = model(tens_l_rs)
+    assert out_ab.shape == (1, 2, 256, 256)
+    assert torch.isfinite(out_ab).all()
+    goldens.check(f"{model_name}_{name}", atol=1e-2, ab=out_ab)
+
+@pytest.mark.parametrize('model_name', ['eccv16', 'siggraph17', 'fast16'])
+@pytest.mark.parametrize('size', [128, 384])
+def test_generator_sizes(model_name, size, make_model):
+    model = make_model(model_name)
+    with torch.no_grad():
+        out_ab = model(torch.rand(1, 1, size, size)*100)
+    assert out_ab.shape == (1, 2, size, size)
+
+def test_generator_deterministic(make_model):
+    model = make_model('eccv16')
+    tens = torch.rand(1, 1, 256, 256, generator=torch.Generator().manual_seed(0))*100
+    with torch.no_grad():
+        assert torch.equal(model(tens), model(tens))
+
+def test_fast16_is_compact(make_model):
+    count = lambda model: sum(p.numel() for p in model.parameters())
+    assert count(make_model('fast16')) * 50 < count(make_model('eccv16'))
+
+def test_fast16_requires_trained_weights(tmp_path):
+    from colorizers import fast16
+
+    with pytest.raises(FileNotFoundError):
+        fast16(pretrained=True, weights_path=str(tmp_path / 'missing.pth'))
+
+def test_fast16_checkpoint_roundtrip(make_model, tmp_path):
+    from colorizers import fast16
+
+    model = make_model('fast16')
+    path = tmp_path / 'fast16.pth'
+    torch.save({'state_dict': model.state_dict(), 'width': model.width}, path)
+    loaded = fast16(pretrained=True, weights_path=str(path)).eval()
+    tens = torch.rand(1, 1, 64, 64) * 100
+    with torch.no_grad():
+        assert torch.allclose(loaded(tens), model(tens))
+
+def test_eccv_fused_decode_matches_softmax(make_model):
+    model = make_model('eccv16')
+    logits = torch.randn(1, 313, 16, 16, generator=torch.Generator().manual_seed(0))*3
+    with torch.no_grad():
+        reference = model.model_out(torch.softmax(logits, dim=1))
+        assert torch.allclose(model.decode(logits), reference, atol=1e-5)
+        annealed = model.model_out(torch.softmax(logits/.38, dim=1))
+        assert torch.allclose(model.decode(logits, T=.38), annealed, atol=1e-5)
+
+@pytest.mark.parametrize('model_name', ['eccv16', 'siggraph17', 'fast16'])
+def test_generator_direct_output_size(model_name, make_model):
+    model = make_model(model_name)
+    tens = torch.rand(1, 1, 128, 128)*100
+    with torch.no_grad():
+        out_ab = model(tens, HW_out=(150, 210))
+    assert out_ab.shape == (1, 2, 150, 210)
+    assert torch.isfinite(out_ab).all()
+
+@pytest.mark.parametrize('chunk_rows', [None, 32])
+def test_siggraph_low_memory_matches_default(chunk_rows, make_model):
+    model = make_model('siggraph17')
+    # 104 rows: three full 32-row strips and a partial one
+    tens = torch.rand(1, 1, 104, 96, generator=torch.Generator().manual_seed(0))*100
+    with torch.no_grad():
+        reference = model(tens)
+        model.set_low_memory(True, chunk_rows=chunk_rows)
+        try:
+            out_ab = model(tens)
+        finally:
+            model.set_low_memory(False)
+    assert torch.allclose(out_ab, reference, atol=1e-3)
+
+def test_ensemble_keeps_predictions_on_the_model_device():
+    from colorizers import run_models, blend_ab
+
+    # a meta-device model stands in for one on the GPU: a copy back to the host would fail
+    models = {'a': torch.nn.Conv2d(1, 2, 1).to('meta'), 'b': torch.nn.Conv2d(1, 2, 1).to('meta')}
+    preds = run_models(models, torch.rand(1, 1, 16, 16), parallel=False)
+    assert all(pred.device.type == 'meta' for pred in preds.values())
+    assert blend_ab(preds).device.type == 'meta'
@@ -0,0 +1,62 @@
+import copy
+
+import pytest
+
+torch = pytest.importorskip('torch')
+
+from colorizers import load_pruned
+from colorizers.pruning import (layer_widths, count_macs, channel_stats, channel_importance,
+                                plan_widths, prune_channels)
+
+def calibration(n=4, size=64):
+    gen = torch.Generator().manual_seed(0)
+    return [torch.rand(2, 1, size, size, generator=gen)*100 for _ in range(n//2)]
+
+# at 64x64 siggraph17's full-resolution decoder dominates; its trunk floor is ~61% of the MACs
+@pytest.mark.parametrize('model_name,budget', [('eccv16', .6), ('siggraph17', .7)])
+def test_prune_to_budget(model_name, budget, make_model):
+    original = make_model(model_name)
+    _, base_macs = count_macs(original, 64)
+    stats = channel_stats(original, calibration())
+    widths, keep, estimate = plan_widths(original, channel_importance(original, stats), budget*base_macs, size=64)
+
+    pruned = prune_channels(copy.deepcopy(original), keep, stats)
+    assert layer_widths(pruned) == widths
+    assert all(w % 8 == 0 and w >= 64 for w in widths.values())
+    _, macs = count_macs(pruned, 64)
+    assert macs <= budget*base_macs
+    assert macs == pytest.approx(estimate, rel=1e-6)
+
+    tens = torch.rand(1, 1, 64, 64)*100
+    with torch.no_grad():
+        assert pruned(tens).shape == original(tens).shape
+
+def test_unreachable_budget_stops_at_min_channels(make_model):
+    original = make_model('siggraph17')
+    stats = channel_stats(original, calibration(2))
+    widths, keep, estimate = plan_widths(original, channel_importance(original, stats), 0, size=64)
+    assert set(widths.values()) == {64}
+    _, macs = count_macs(prune_channels(copy.deepcopy(original), keep, stats), 64)
+    assert macs == pytest.approx(estimate, rel=1e-6)
+
+def test_keep_all_is_identity(make_model):
+    original = make_model('eccv16')
+    keep = {name: torch.arange(w) for name, w in layer_widths(original).items()}
+    pruned = prune_channels(copy.deepcopy(original), keep, channel_stats(original, calibration(2)))
+    tens = torch.rand(1, 1, 64, 64)*100
+    with torch.no_grad():
+        assert torch.allclose(pruned(tens), original(tens))
+
+def test_load_pruned_roundtrip(make_model, tmp_path):
+    original = make_model('siggraph17')
+    stats = channel_stats(original, calibration(2))
+    widths, keep, _ = plan_widths(original, channel_importance(original, stats), 0, size=64)
+    pruned = prune_channels(copy.deepcopy(original), keep, stats)
+    path = tmp_path / 'pruned.pth'
+    torch.save({'model_type': 'siggraph17', 'widths': widths, 'state_dict': pruned.state_dict()}, path)
+
+    loaded = load_pruned(str(path)).eval()
+    assert layer_widths(loaded) == widths
+    tens = torch.rand(1, 1, 64, 64)*100
+    with torch.no_grad():
+        assert torch.allclose(loaded(tens), pruned(tens))
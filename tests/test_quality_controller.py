@@ -0,0 +1,127 @@
+import time
+import threading
+
+import pytest
+
+from quality_controller import DEFAULT_LEVELS, ColorizationService, Overloaded, QualityController
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+def test_degrades_under_load_and_recovers_slowly():
+    clock = FakeClock()
+    controller = QualityController(target_p99=1., upgrade_after=2., clock=clock)
+    full, standard = DEFAULT_LEVELS[:2]
+    controller.observe_batch(full, 4, .4)           # .1s per image
+    controller.observe_batch(standard, 4, .2)       # .05s per image
+    assert controller.choose(2) == full
+    assert controller.choose(10) == standard        # 1.1s at full, .55s at standard
+    assert controller.choose(40) == DEFAULT_LEVELS[-1]
+
+    # headroom again: quality comes back one level at a time, and not before upgrade_after
+    assert controller.choose(0) == DEFAULT_LEVELS[-1]
+    clock.now = 2.
+    assert controller.choose(0) == DEFAULT_LEVELS[-2]
+    clock.now = 3.
+    assert controller.choose(0) == DEFAULT_LEVELS[-2]
+
+def test_observed_p99_forces_a_step_down():
+    clock = FakeClock()
+    controller = QualityController(target_p99=1., clock=clock)
+    for _ in range(50):
+        controller.observe_latency(1.5)
+    assert controller.choose(0) == DEFAULT_LEVELS[1]
+    clock.now = 20.                                 # old samples expire
+    controller.observe_latency(.1)
+    assert controller.observed_p99() == .1
+
+def test_unmeasured_levels_scale_with_pixels():
+    controller = QualityController()
+    controller.observe_batch(DEFAULT_LEVELS[1], 1, .16)
+    assert controller.service_time(3) == pytest.approx(.16*(128/256)**2)
+    assert controller.service_time(0) == pytest.approx(.16)
+
+def test_admission():
+    controller = QualityController(target_p99=1., max_queue=8)
+    controller.observe_batch(DEFAULT_LEVELS[-1], 1, .2)
+    assert controller.admit('low', 2) == 'admit'
+    assert controller.admit('low', 5) == 'defer'    # 1.2s even at the cheapest level
+    assert controller.admit('normal', 5) == 'admit'
+    assert controller.admit('normal', 8) == 'shed'
+    assert controller.admit('high', 100) == 'admit'
+
+def slow_run_batch(calls):
+    def run_batch(level, images):
+        calls.append((level.name, len(images)))
+        time.sleep(.02*len(images)*(level.size/256)**2)
+        return [(level.name, img) for img in images]
+    return run_batch
+
+def test_service_records_quality_and_batches():
+    calls = []
+    service = ColorizationService(QualityController(target_p99=1., max_window=.05), slow_run_batch(calls))
+    try:
+        futures = [service.submit(i) for i in range(6)]
+        results = [future.result(timeout=5) for future in futures]
+    finally:
+        service.stop()
+    assert [result.image[1] for result in results] == list(range(6))
+    assert all(result.quality['level'] == 'full' and not result.quality['degraded'] for result in results)
+    assert all(result.latency >= result.queued for result in results)
+    assert max(n for _, n in calls) > 1
+
+def test_service_sheds_and_defers_low_priority_under_overload():
+    calls = []
+    release = threading.Event()
+
+    def blocked(level, images):
+        release.wait(5)
+        return slow_run_batch(calls)(level, images)
+
+    controller = QualityController(target_p99=.1, max_batch=2, max_queue=4)
+    controller.observe_batch(DEFAULT_LEVELS[-1], 1, .05)
+    for policy in ('shed', 'defer'):
+        release.clear()
+        service = ColorizationService(controller, blocked, low_priority=policy)
+        try:
+            service.submit('first')
+            time.sleep(.1)                          # dispatcher is now stuck in the first batch
+            normal = [service.submit(i) for i in range(2)]
+            low = service.submit('low', priority='low')
+            if policy == 'shed':
+                with pytest.raises(Overloaded):
+                    low.result(timeout=1)
+            release.set()
+            assert all(future.result(timeout=5).quality['degraded'] for future in normal)
+            if policy == 'defer':
+                assert low.result(timeout=5).quality['deferred']
+            assert service.stats()[{'shed': 'shed', 'defer': 'deferred'}[policy]] == 1
+        finally:
+            release.set()
+            service.stop()
+
+def test_cancelled_requests_do_not_stop_the_dispatcher():
+    calls = []
+    release = threading.Event()
+
+    def blocked(level, images):
+        release.wait(5)
+        return slow_run_batch(calls)(level, images)
+
+    service = ColorizationService(QualityController(max_batch=1), blocked)
+    try:
+        service.submit('first')
+        time.sleep(.1)                              # dispatcher is now stuck in the first batch
+        cancelled = service.submit('cancelled')
+        assert cancelled.cancel()
+        release.set()
+        assert service.colorize('after', timeout=5).image[1] == 'after'
+    finally:
+        release.set()
+        service.stop()
+    assert service.stats()['cancelled'] == 1
+    assert [n for _, n in calls] == [1, 1]
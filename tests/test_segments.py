@@ -0,0 +1,28 @@
+import pytest
+
+pytest.importorskip('cv2')
+pytest.importorskip('torch')
+
+from video_segments import keyframe_indices, plan_segments
+
+def test_keyframe_indices_count_from_the_stream_start():
+    # an MPEG-TS stream starting at 1.4s: its first keyframe is frame 0
+    assert keyframe_indices(['1.400000', '3.400000', 'N/A', '5.400000'], '1.400000', 25) == [0, 50, 100]
+    assert keyframe_indices(['0.000000', '2.000000'], None, 30) == [0, 60]
+    assert keyframe_indices(['2.000000'], 'N/A', 30) == [60]
+
+def test_segments_start_on_keyframes():
+    keyframes = list(range(0, 2600, 300))
+    assert plan_segments(2600, keyframes, segment_frames=1000) == [(0, 1200), (1200, 2400), (2400, 2600)]
+
+def test_segments_keep_the_frame_skip_phase():
+    keyframes = list(range(0, 2200, 250))
+    segments = plan_segments(2200, keyframes, segment_frames=600, frame_skip=4)
+    assert segments == [(0, 1000), (1000, 2000), (2000, 2200)]
+    assert all(start % 4 == 0 for start, _ in segments)
+
+@pytest.mark.parametrize('keyframes', [None, []])
+def test_segments_without_keyframes(keyframes):
+    assert plan_segments(2500, keyframes, segment_frames=1000, frame_skip=3) == [(0, 1002), (1002, 2004), (2004, 2500)]
+    assert plan_segments(500, keyframes, segment_frames=1000) == [(0, 500)]
+    assert plan_segments(0, keyframes) == []
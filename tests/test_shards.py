@@ -0,0 +1,53 @@
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('PIL')
+
+from shards import ShardReader, ShardWriter, decode_image
+
+def random_rgb(H=24, W=32, seed=0):
+    return np.random.RandomState(seed).randint(0, 256, (H, W, 3)).astype(np.uint8)
+
+def write_shards(tmp_path, n=7, **kwargs):
+    images = {f"img{i:03d}": random_rgb(seed=i) for i in range(n)}
+    images['x'*120] = random_rgb(seed=n)        # needs a PAX header (names over 100 chars)
+    with ShardWriter(str(tmp_path / 'shards'), **kwargs) as writer:
+        for key, img in images.items():
+            writer.write(key, img)
+    return images, writer
+
+@pytest.mark.parametrize('limits', [{'max_count': 3}, {'max_size': 4000}])
+def test_index_reads_across_shards(tmp_path, limits):
+    images, writer = write_shards(tmp_path, **limits)
+    assert len(writer.shard_paths) >= 3
+    reader = ShardReader(str(tmp_path / 'shards'))
+    assert reader.names() == [f"{key}.png" for key in images]
+    for key, img in images.items():
+        np.testing.assert_array_equal(reader.read_image(f"{key}.png"), img)
+    assert [(key, img.shape) for key, img in reader.images()] == [(key, img.shape) for key, img in images.items()]
+
+def test_read_without_index(tmp_path):
+    images, writer = write_shards(tmp_path, max_count=3)
+    expected = ShardReader(str(tmp_path / 'shards')).load_index()
+    for path in writer.shard_paths:
+        os.remove(path[:-4] + '.idx')
+    reader = ShardReader(str(tmp_path / 'shards'))
+    assert reader.load_index() == expected
+    key = 'x'*120
+    np.testing.assert_array_equal(decode_image(reader.read(f"{key}.png")), images[key])
+
+def test_batch_colorize_shards(tmp_path, monkeypatch, make_model):
+    import batch_colorize
+
+    images, _ = write_shards(tmp_path, n=3, max_count=2)
+    monkeypatch.setattr(batch_colorize, 'load_model', lambda *args, **kwargs: make_model('eccv16'))
+    monkeypatch.setattr(sys, 'argv', ['batch_colorize.py', '--input_shards', str(tmp_path / 'shards'),
+                                      '-o', str(tmp_path / 'out'), '--output_format', 'shards', '--size', '64'])
+    batch_colorize.main()
+    reader = ShardReader(str(tmp_path / 'out'))
+    assert reader.names() == [f"color_{key}.png" for key in images]
+    for key, img in images.items():
+        assert reader.read_image(f"color_{key}.png").shape == img.shape
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+torch = pytest.importorskip('torch')
+np = pytest.importorskip('numpy')
+pytest.importorskip('PIL')
+
+from colorizers import load_img
+from colorizers.buffers import FrameBufferPool
+from colorizers.sidecar import l_tens_from_uint8, render_sidecar
+
+def random_rgb(H=40, W=56, seed=0):
+    return np.random.RandomState(seed).randint(0, 256, (H, W, 3)).astype(np.uint8)
+
+def test_bgr_frames_use_the_inference_lightness():
+    rgb = random_rgb()
+    bgr = np.ascontiguousarray(rgb[:,:,::-1])
+    expected = FrameBufferPool().rgb2l(torch.from_numpy(bgr), bgr=True)
+    torch.testing.assert_close(l_tens_from_uint8(bgr, bgr=True), expected, rtol=0, atol=1e-3)
+    out_ab = torch.randn(1, 2, 8, 8)*20
+    np.testing.assert_array_equal(render_sidecar(out_ab, bgr, bgr=True), render_sidecar(out_ab, rgb)[:,:,::-1])
+
+def test_sidecar_does_not_change_the_result(tmp_path, make_model):
+    from PIL import Image
+    import batch_colorize
+
+    (tmp_path / 'in').mkdir()
+    Image.fromarray(random_rgb()).save(tmp_path / 'in' / 'a.png')
+    model = make_model('eccv16')
+    for name, sidecar in (('plain', False), ('sidecar', True)):
+        batch_colorize.batch_colorize(model, str(tmp_path / 'in'), str(tmp_path / name), size=64, sidecar=sidecar)
+    plain = load_img(str(tmp_path / 'plain' / 'color_a.png'))
+    np.testing.assert_array_equal(load_img(str(tmp_path / 'sidecar' / 'color_a.png')), plain)
+
+    # re-rendering from the int8 sidecar reproduces it up to quantization
+    os.remove(tmp_path / 'sidecar' / 'color_a.png')
+    assert batch_colorize.render_sidecars(str(tmp_path / 'in'), str(tmp_path / 'sidecar')) == 1
+    rendered = load_img(str(tmp_path / 'sidecar' / 'color_a.png'))
+    assert np.abs(rendered.astype(int) - plain.astype(int)).max() <= 3
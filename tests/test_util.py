@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('skimage')
+
+from colorizers import (preprocess_img, preprocess_img_letterbox, postprocess_tens, postprocess_tens_uint8,
+                        check_inference_size, letterbox_shape)
+
+from conftest import GOLDEN_IMAGES
+
+@pytest.mark.parametrize('name', GOLDEN_IMAGES)
+def test_preprocess_img_golden(name, load_test_img, goldens):
+    img = load_test_img(name)
+    tens_l_orig, tens_l_rs = preprocess_img(img, HW=(256,256))
+    assert tens_l_orig.shape == (1, 1, img.shape[0], img.shape[1])
+    assert tens_l_rs.shape == (1, 1, 256, 256)
+    assert 0 <= tens_l_rs.min() and tens_l_rs.max() <= 100
+    goldens.check(f"preprocess_img_{name}", atol=1e-3, l_orig=tens_l_orig, l_rs=tens_l_rs)
+
+@pytest.mark.parametrize('name', GOLDEN_IMAGES)
+def test_postprocess_tens_golden(name, load_test_img, goldens):
+    # a smooth synthetic ab field keeps this independent of any model
+    img = load_test_img(name)
+    tens_l_orig, _ = preprocess_img(img, HW=(256,256))
+    yy, xx = torch.meshgrid(torch.linspace(-1, 1, 256), torch.linspace(-1, 1, 256), indexing='ij')
+    out_ab = torch.stack((40*xx, -30*yy))[None]
+    out_img = postprocess_tens(tens_l_orig, out_ab)
+    assert out_img.shape == img.shape
+    goldens.check(f"postprocess_tens_{name}", atol=1e-4, rgb=out_img)
+
+def test_postprocess_uint8_matches_float(load_test_img):
+    img = load_test_img('Waterfall.jpg')
+    tens_l_orig, _ = preprocess_img(img, HW=(256,256))
+    out_ab = 60*torch.rand(1, 2, 256, 256, generator=torch.Generator().manual_seed(0)) - 30
+    reference = (postprocess_tens(tens_l_orig, out_ab)*255).astype(np.uint8)
+    fused = postprocess_tens_uint8(tens_l_orig, out_ab)
+    assert fused.dtype == np.uint8 and fused.shape == reference.shape
+    # float32 vs float64 conversions may straddle a truncation boundary
+    assert np.abs(fused.astype(int) - reference.astype(int)).max() <= 1
+
+def test_letterbox_roundtrip(load_test_img):
+    img = load_test_img('Waterfall.jpg')
+    tens_l_orig, tens_l_rs, pad = preprocess_img_letterbox(img, size=256)
+    assert tens_l_rs.shape[2] % 8 == 0 and tens_l_rs.shape[3] % 8 == 0
+    assert max(tens_l_rs.shape[2:]) == 256
+    out_ab = torch.zeros(1, 2, *tens_l_rs.shape[2:])
+    assert postprocess_tens(tens_l_orig, out_ab, pad=pad).shape == img.shape
+
+def test_inference_size_checks():
+    with pytest.raises(ValueError):
+        check_inference_size((250, 256))
+    for H, W in ((480, 640), (1080, 1920), (100, 1000), (256, 256)):
+        HW_rs, HW_pad = letterbox_shape(H, W, size=256)
+        assert max(HW_pad) == 256 and min(HW_pad) % 8 == 0
+        assert HW_rs[0] <= HW_pad[0] and HW_rs[1] <= HW_pad[1]
+
+def test_postprocess_at_output_size(load_test_img):
+    from PIL import Image
+
+    img = load_test_img('ansel_adams3.jpg')
+    H, W = img.shape[:2]
+    tens_l_orig, _ = preprocess_img(img, HW=(256,256))
+    yy, xx = torch.meshgrid(torch.linspace(-1, 1, 256), torch.linspace(-1, 1, 256), indexing='ij')
+    out_ab = torch.stack((40*xx, -30*yy))[None]
+
+    HW_out = (H//3, W//3)
+    direct = postprocess_tens_uint8(tens_l_orig, out_ab, HW_out=HW_out)
+    assert direct.shape == (HW_out[0], HW_out[1], 3)
+    assert postprocess_tens(tens_l_orig, out_ab, HW_out=HW_out).shape == direct.shape
+
+    # close to rendering at full size and shrinking the RGB result afterwards
+    full = Image.fromarray(postprocess_tens_uint8(tens_l_orig, out_ab))
+    shrunk = np.asarray(full.resize((HW_out[1], HW_out[0]), Image.Resampling.BILINEAR))
+    assert np.abs(direct.astype(int) - shrunk.astype(int)).mean() < 3
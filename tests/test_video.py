@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('cv2')
+
+from video_colorizer import VideoColorizer
+
+from conftest import init_fixture_weights
+
+def make_colorizer(**kwargs):
+    colorizer = VideoColorizer(pretrained=False, **kwargs)
+    init_fixture_weights(colorizer.colorizer)
+    return colorizer
+
+@pytest.mark.parametrize('model_type', ['eccv16', 'siggraph17'])
+def test_colorize_frame_golden(model_type, video_frames, goldens):
+    colorizer = make_colorizer(model_type=model_type)
+    for index, frame in video_frames.items():
+        out = colorizer.colorize_frame(frame).copy()
+        assert out.shape == frame.shape and out.dtype == np.uint8
+        goldens.check(f"colorize_frame_{model_type}_{index}", atol=1., bgr=out)
+
+def test_buffer_pool_matches_allocating_path(video_frames):
+    # both paths feed the network the same preprocess_img input; only float32 rounding differs
+    pooled = make_colorizer(buffer_pool=True)
+    plain = make_colorizer(buffer_pool=False)
+    for frame in video_frames.values():
+        a = pooled.colorize_frame(frame).astype(int)
+        b = plain.colorize_frame(frame).astype(int)
+        assert np.abs(a - b).max() <= 1
+
+@pytest.mark.parametrize('letterbox', [False, True])
+def test_buffer_pool_network_input_matches_preprocess(video_frames, letterbox):
+    from colorizers import preprocess_img, preprocess_img_letterbox
+    from colorizers.buffers import FrameBufferPool
+
+    frame = next(iter(video_frames.values()))
+    tens_l_rs, pad = FrameBufferPool().network_input(frame, letterbox=letterbox)
+    rgb = frame[:,:,::-1]
+    if letterbox:
+        _, ref, ref_pad = preprocess_img_letterbox(rgb)
+        assert pad == ref_pad
+    else:
+        _, ref = preprocess_img(rgb)
+    assert torch.allclose(tens_l_rs, ref, atol=1e-3)
+
+def test_buffer_pool_resize_matches_pil():
+    from colorizers import resize_img
+    from colorizers.buffers import FrameBufferPool
+
+    pool = FrameBufferPool()
+    for shape, HW in (((72, 128, 3), (256, 256)), ((1080, 1920, 3), (144, 256)), ((300, 200, 3), (64, 40))):
+        frame = np.random.RandomState(0).randint(0, 256, shape).astype(np.uint8)
+        np.testing.assert_array_equal(pool.resize(frame, HW), resize_img(frame, HW=HW))
+    # the frame buffer is reused for the next frame of the same size
+    buffers = len(pool.buffers)
+    pool.resize(frame[::-1], (64, 40))
+    assert len(pool.buffers) == buffers
+
+@pytest.mark.parametrize('shape', [(100, 4000, 3), (4000, 100, 3)])
+def test_buffer_pool_letterbox_extreme_aspect(shape):
+    # the resized short side (6 px) is far smaller than the padding up to the 1/2 bucket
+    frame = np.random.RandomState(0).randint(0, 256, shape).astype(np.uint8)
+    pooled = make_colorizer(letterbox=True)
+    plain = make_colorizer(letterbox=True, buffer_pool=False)
+    out = pooled.colorize_frame(frame)
+    assert out.shape == frame.shape
+    assert np.abs(out.astype(int) - plain.colorize_frame(frame).astype(int)).max() <= 1
+
+def test_colorize_frame_returns_ab(video_frames):
+    colorizer = make_colorizer(letterbox=True)
+    frame = next(iter(video_frames.values()))
+    out, out_ab = colorizer.colorize_frame(frame, return_ab=True)
+    assert out.shape == frame.shape
+    # letterbox padding is cropped off, so the ab map keeps the frame's aspect ratio
+    H, W = frame.shape[:2]
+    assert abs(out_ab.shape[3]/out_ab.shape[2] - W/H) < .1
+
+def fake_bundle(bundle, kwargs):
+    # stands in for _colorize_bundle: the 'crash' video kills its worker process outright
+    import os
+    import time
+    for input_file, _ in bundle:
+        if 'crash' in input_file:
+            os._exit(1)
+    time.sleep(.2)
+    return [{'input': i, 'output': o, 'frames': 1, 'seconds': 0.0, 'error': None} for i, o in bundle]
+
+def test_parallel_batch_survives_a_worker_crash(monkeypatch):
+    import video_colorizer
+
+    monkeypatch.setattr(video_colorizer, '_colorize_bundle', fake_bundle)
+    monkeypatch.setattr(video_colorizer, '_init_batch_worker', lambda *args: None)
+    monkeypatch.setattr(video_colorizer, '_count_frames', lambda path: video_colorizer.PACK_FRAMES)
+    jobs = [(f"{name}.mp4", f"out_{name}.mp4") for name in ('a', 'b', 'crash', 'c', 'd', 'e')]
+    results = make_colorizer()._run_parallel(jobs, 2, None, {})
+    errors = {r['input']: r['error'] for r in results}
+    assert sorted(errors) == sorted(job[0] for job in jobs)
+    assert [name for name, error in errors.items() if error] == ['crash.mp4']
+
+def test_latest_frame_worker_reraises_colorize_errors():
+    from video_colorizer import _LatestFrameWorker
+
+    def colorize(frame):
+        raise ValueError('bad frame')
+
+    worker = _LatestFrameWorker(colorize)
+    worker.start()
+    worker.submit(np.zeros((8, 8, 3), np.uint8))
+    worker.join(5)
+    with pytest.raises(RuntimeError, match='bad frame'):
+        worker.latest()
+    worker.stop()
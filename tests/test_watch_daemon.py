@@ -0,0 +1,172 @@
+import os
+import time
+import threading
+
+import pytest
+
+from watch_daemon import BatchWorker, Debouncer, DirScanner, ProcessedIndex, WatchDaemon, format_latencies, _to_uint8
+
+def fake_colorize(paths, out_paths):
+    # stands in for make_batch_colorizer: records the batch and copies the bytes
+    fake_colorize.batches.append(len(paths))
+    errors = []
+    for path, out_path in zip(paths, out_paths):
+        if path.endswith('broken.png'):
+            errors.append('OSError: cannot identify image file')
+            continue
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        with open(path, 'rb') as src, open(out_path, 'wb') as dst:
+            dst.write(src.read())
+        errors.append(None)
+    return errors
+
+def write(path, data=b'x'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def run_until(daemon, condition, timeout=10.):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, 'timed out'
+        daemon.step(.05)
+
+def test_debouncer_waits_for_writes_to_stop(tmp_path):
+    path = str(tmp_path / 'scan.png')
+    write(path, b'part')
+    debouncer = Debouncer(settle=.3)
+    debouncer.add(path, seen=1.)
+    assert debouncer.ready() == []
+    time.sleep(.2)
+    write(path, b'partial write, longer now')
+    assert debouncer.ready() == []      # size changed: the clock restarts
+    time.sleep(.35)
+    assert debouncer.ready() == [(path, 1.)]
+    assert debouncer.pending == {}
+
+def test_scanner_only_lists_changed_dirs(tmp_path):
+    write(str(tmp_path / 'in' / 'a.png'))
+    write(str(tmp_path / 'in' / 'sub' / 'b.jpg'))
+    write(str(tmp_path / 'in' / 'notes.txt'))
+    index = ProcessedIndex(tmp_path / 'index.db')
+    roots = [str(tmp_path / 'in')]
+    assert sorted(os.path.basename(p) for p in DirScanner(roots, index).scan(settle=0)) == ['a.png', 'b.jpg']
+
+    # a restarted scanner finds nothing in unchanged directories
+    scanner = DirScanner(roots, ProcessedIndex(tmp_path / 'index.db'))
+    assert scanner.scan(settle=0) == []
+    time.sleep(.01)
+    write(str(tmp_path / 'in' / 'sub' / 'c.png'))
+    assert sorted(os.path.basename(p) for p in scanner.scan(settle=0)) == ['b.jpg', 'c.png']
+
+def test_index_discovers_new_and_rewritten_files(tmp_path):
+    path = str(tmp_path / 'a.png')
+    write(path, b'v1')
+    index = ProcessedIndex(tmp_path / 'index.db')
+    assert index.discover([path], now=5.) == [(path, 5.)]
+    assert index.discover([path], now=6.) == [(path, 5.)]       # still pending: original seen time
+    st = os.stat(path)
+    index.finish(path, st.st_size, st.st_mtime_ns, 'out.png', ready=7.)
+    assert index.discover([path]) == []
+    write(path, b'version 2')
+    assert [p for p, _ in index.discover([path])] == [path]
+
+@pytest.mark.parametrize('use_inotify', [False, None])
+def test_daemon_processes_new_files_in_batches(tmp_path, use_inotify):
+    fake_colorize.batches = []
+    roots = [str(tmp_path / 'in')]
+    os.makedirs(roots[0])
+    write(str(tmp_path / 'in' / 'old.png'))
+    daemon = WatchDaemon(roots, str(tmp_path / 'out'), fake_colorize, index_path=str(tmp_path / 'index.db'),
+                         settle=.1, poll_interval=.05, batch_size=4, batch_window=.3, use_inotify=use_inotify)
+    daemon.start()
+    try:
+        for name in ('a.png', 'b.png', 'broken.png', 'sub/c.jpg'):
+            write(str(tmp_path / 'in' / name))
+        expected = [tmp_path / 'out' / name for name in ('color_old.png', 'color_a.png', 'color_b.png', 'sub/color_c.jpg')]
+        run_until(daemon, lambda: all(p.exists() for p in expected) and daemon.index.counts().get('failed'))
+    finally:
+        daemon.stop()
+    assert daemon.index.counts() == {'done': 4, 'failed': 1}
+    assert max(fake_colorize.batches) > 1
+    assert format_latencies(daemon.index.latencies()).startswith('4 images')
+
+    # a restart finds nothing new to do
+    fake_colorize.batches = []
+    daemon = WatchDaemon(roots, str(tmp_path / 'out'), fake_colorize, index_path=str(tmp_path / 'index.db'),
+                         settle=.1, use_inotify=use_inotify)
+    daemon.start()
+    try:
+        for _ in range(5):
+            daemon.step(.05)
+    finally:
+        daemon.stop()
+    assert fake_colorize.batches == []
+
+def test_worker_survives_a_failing_batch(tmp_path):
+    paths = [str(tmp_path / name) for name in ('a.png', 'b.png')]
+    for path in paths:
+        write(path)
+    index = ProcessedIndex(tmp_path / 'index.db')
+    index.discover(paths)
+    calls = []
+
+    def colorize(batch, out_paths):
+        calls.append(batch)
+        if len(calls) == 1:
+            raise RuntimeError('out of memory')
+        return [None]*len(batch)
+
+    worker = BatchWorker(colorize, index, batch_size=1, batch_window=0.)
+    worker.start()
+    try:
+        for path in paths:
+            worker.submit(path, path + '.out', seen=time.time())
+        deadline = time.time() + 5
+        while index.counts().get('pending'):
+            assert time.time() < deadline, 'timed out'
+            time.sleep(.05)
+    finally:
+        worker.stop()
+    assert index.counts() == {'done': 1, 'failed': 1}
+
+def test_16bit_scans_are_scaled():
+    np = pytest.importorskip('numpy')
+    values = np.array([[0, 32768, 65535]])
+    for dtype in ('<u2', '>u2', np.int32):
+        assert _to_uint8(values.astype(dtype)).tolist() == [[0, 128, 255]]
+    assert _to_uint8(np.array([[0, 255]], np.uint8)).tolist() == [[0, 255]]
+
+def test_files_being_processed_are_not_queued_again(tmp_path):
+    # polling lists the folder again when a second file lands in it; the first is still
+    # 'pending' in the index while the worker colorizes it
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def colorize(paths, out_paths):
+        calls.extend(os.path.relpath(p, str(tmp_path)) for p in paths)
+        started.set()
+        release.wait(5)
+        return fake_colorize(paths, out_paths)
+
+    fake_colorize.batches = []
+    roots = [str(tmp_path / 'in')]
+    os.makedirs(roots[0])
+    daemon = WatchDaemon(roots, str(tmp_path / 'out'), colorize, index_path=str(tmp_path / 'index.db'),
+                         settle=.1, poll_interval=.05, batch_size=1, batch_window=0., use_inotify=False)
+    daemon.start()
+    try:
+        write(str(tmp_path / 'in' / 'a.png'))
+        run_until(daemon, started.is_set)
+        time.sleep(.02)
+        write(str(tmp_path / 'in' / 'b.png'))
+        for _ in range(10):
+            daemon.step(.05)
+        release.set()
+        run_until(daemon, lambda: daemon.index.counts() == {'done': 2})
+        for _ in range(5):
+            daemon.step(.05)
+    finally:
+        release.set()
+        daemon.stop()
+    assert calls == [os.path.join('in', 'a.png'), os.path.join('in', 'b.png')]
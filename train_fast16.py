@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Distill the fast16 colorizer from the released eccv16/siggraph17 models
+The teachers run once per training image (and its mirror image) to produce target ab
+maps; the small student then trains against those cached targets, so the expensive
+networks are never in the training loop and a CPU is enough for a few thousand images.
+The cache is a pair of memory-mapped float16 arrays on disk (about 0.4 MB per image at
+256), so it is bounded by disk space rather than RAM.
+
+Usage:
+    python train_fast16.py -i imgs --epochs 30
+    python train_fast16.py -i photos/ --teachers eccv16 siggraph17 --size 192 --width 48
+"""
+
+import os
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import torch
+
+from colorizers import FastGenerator, build_colorizer, load_img, preprocess_img
+from colorizers.distill import list_training_images, distill
+from colorizers.fast16 import FAST16_WEIGHTS
+from colorizers.runtime import configure_from_saved
+
+def _disk_array(shape, cache_dir=None):
+    # float16 tensor backed by an anonymous temporary file (removed when the tensor is freed)
+    return torch.from_numpy(np.memmap(tempfile.TemporaryFile(dir=cache_dir), dtype=np.float16, mode='w+', shape=shape))
+
+def teacher_targets(paths, teachers, size=256, teacher_batch=8, cache_dir=None):
+    """
+    (L, ab) training pairs: every image and its horizontal mirror at size x size, with
+    the mean ab prediction of the teachers as the target
+    Images are processed teacher_batch at a time and written to memory-mapped float16
+    tensors in cache_dir (default: the system temp dir), so memory use does not grow
+    with the number of images.
+    """
+    ls = _disk_array((2*len(paths), 1, size, size), cache_dir)
+    ab_targets = _disk_array((2*len(paths), 2, size, size), cache_dir)
+    step = max(1, teacher_batch//2)
+    with torch.no_grad():
+        for i in range(0, len(paths), step):
+            batch = []
+            for path in paths[i:i+step]:
+                _, tens_l_rs = preprocess_img(load_img(path)[:,:,:3], HW=(size,size))
+                batch += [tens_l_rs, tens_l_rs.flip(3)]
+            batch = torch.cat(batch)
+            ls[2*i:2*i+len(batch)] = batch
+            ab_targets[2*i:2*i+len(batch)] = sum(teacher(batch) for teacher in teachers)/len(teachers)
+    return ls, ab_targets
+
+def main():
+    parser = argparse.ArgumentParser(description='Distill the fast16 colorizer from eccv16/siggraph17')
+    parser.add_argument('-i', '--input', nargs='+', default=['imgs'], help='Training image folders (searched recursively)')
+    parser.add_argument('-o', '--output', default=FAST16_WEIGHTS, help='Where to save the student weights')
+    parser.add_argument('--teachers', nargs='+', choices=['eccv16', 'siggraph17'], default=['eccv16'], help='Teacher models (targets are their mean)')
+    parser.add_argument('--size', type=int, default=256, help='Training resolution (multiple of 8)')
+    parser.add_argument('--width', type=int, default=32, help='Student base width')
+    parser.add_argument('--epochs', type=int, default=30)
+    parser.add_argument('--batch_size', type=int, default=8)
+    parser.add_argument('--lr', type=float, default=2e-3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache_dir', help='Where to keep the teacher targets on disk (default: system temp dir)')
+    parser.add_argument('--threads', type=int, help='Torch/OpenCV/BLAS threads (default: saved autotune setting)')
+    args = parser.parse_args()
+
+    configure_from_saved(num_threads=args.threads)
+    torch.manual_seed(args.seed)
+
+    paths = list_training_images(args.input)
+    if not paths:
+        parser.error(f"no training images found in {args.input}")
+    print(f"📚 {len(paths)} images, teachers: {', '.join(args.teachers)}")
+
+    t0 = time.time()
+    teachers = [build_colorizer(name).eval() for name in args.teachers]
+    ls, ab_targets = teacher_targets(paths, teachers, size=args.size, cache_dir=args.cache_dir)
+    del teachers
+    print(f"🎯 Teacher targets for {len(ls)} samples in {time.time()-t0:.1f}s")
+
+    student = distill(FastGenerator(width=args.width), ls, ab_targets, epochs=args.epochs,
+                      batch_size=args.batch_size, lr=args.lr)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    torch.save({'state_dict': student.state_dict(), 'width': args.width, 'teachers': args.teachers,
+                'size': args.size, 'images': len(paths)}, args.output)
+    print(f"💾 Saved fast16 weights to: {args.output}")
+
+if __name__ == "__main__":
+    main()
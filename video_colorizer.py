@@ -6,63 +6,112 @@ from pathlib import Path
 from tqdm import tqdm
 import tempfile
 import os
+import shutil
+import subprocess
+import time
+import threading
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from colorizers import *
-from colorizers.util import preprocess_img, postprocess_tens
+from colorizers.util import preprocess_img, preprocess_img_letterbox, postprocess_tens_uint8, check_inference_size, unpad_ab
+from colorizers.sidecar import AbStreamWriter, AbStreamReader, sidecar_meta, render_sidecar
+from colorizers.runtime import configure_from_saved, configure_worker
+from colorizers.models import MODEL_TYPES, build_colorizer
+from colorizers.buffers import FrameBufferPool, colorize_frame_pooled
+
+# Constructor arguments that describe a VideoColorizer, used to rebuild it in worker processes
+COLORIZER_SETTINGS = ('model_type', 'device', 'inference_size', 'letterbox', 'buffer_pool')
+
+# ffmpeg re-encode settings for the quality option
+QUALITY_SETTINGS = {
+    'low': {'crf': 28, 'preset': 'fast'},
+    'medium': {'crf': 23, 'preset': 'medium'},
+    'high': {'crf': 18, 'preset': 'slow'}
+}
 
 class VideoColorizer:
-    def __init__(self, model_type='eccv16', device='cpu'):
+    def __init__(self, model_type='eccv16', device='cpu', inference_size=256, letterbox=False, buffer_pool=True,
+                 pretrained=True):
         """
         Initialize video colorizer
         Args:
-            model_type: 'eccv16' or 'siggraph17'
+            model_type: 'eccv16', 'siggraph17' or 'fast16' (distilled, much faster on CPU)
             device: 'cpu' or 'cuda'
+            inference_size: Network input size (multiple of 8); 128 is fast, 512 is detailed
+            letterbox: Keep the frame's aspect ratio (pad to a bucket shape) instead of squashing to a square
+            buffer_pool: Reuse preallocated (pinned on CUDA) frame buffers instead of allocating per frame
+            pretrained: Load the released weights (False gives random weights, for benchmarks and tests)
         """
+        check_inference_size((inference_size, inference_size))
         self.device = device
         self.model_type = model_type
+        self.inference_size = inference_size
+        self.letterbox = letterbox
+        self.buffer_pool = buffer_pool
+        self.pretrained = pretrained
         self.colorizer = self._load_model()
+        if buffer_pool:
+            use_cuda = self.device == 'cuda' and torch.cuda.is_available()
+            self.pool = FrameBufferPool(device='cuda' if use_cuda else 'cpu')
+        else:
+            self.pool = None
+    
+    def settings(self):
+        """Constructor arguments needed to build an equivalent colorizer (e.g. in a worker process)"""
+        return {key: getattr(self, key) for key in COLORIZER_SETTINGS}
         
     def _load_model(self):
         """Load the colorization model"""
-        if self.model_type == 'eccv16':
-            model = eccv16(pretrained=True)
-        else:
-            model = siggraph17(pretrained=True)
-        
+        model = build_colorizer(self.model_type, pretrained=self.pretrained)
         model.eval()
         if self.device == 'cuda' and torch.cuda.is_available():
             model = model.cuda()
         return model
     
-    def colorize_frame(self, frame):
+    def colorize_frame(self, frame, return_ab=False):
         """
         Colorize a single frame
         Args:
             frame: BGR frame from OpenCV
+            return_ab: Also return the low-resolution ab prediction (letterbox padding removed)
         Returns:
-            colorized_frame: BGR colorized frame
+            colorized_frame: BGR colorized frame; with buffer_pool this array is reused
+                by the next call for the same frame size, so copy it to keep it
         """
+        if self.pool is not None:
+            return colorize_frame_pooled(self.colorizer, frame, self.pool,
+                                         size=self.inference_size, letterbox=self.letterbox,
+                                         return_ab=return_ab)
+        
         # Convert BGR to RGB
         frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         
         # Preprocess
-        (tens_l_orig, tens_l_rs) = preprocess_img(frame_rgb, HW=(256,256))
+        if self.letterbox:
+            (tens_l_orig, tens_l_rs, pad) = preprocess_img_letterbox(frame_rgb, size=self.inference_size)
+        else:
+            (tens_l_orig, tens_l_rs) = preprocess_img(frame_rgb, HW=(self.inference_size, self.inference_size))
+            pad = None
         
         if self.device == 'cuda' and torch.cuda.is_available():
             tens_l_rs = tens_l_rs.cuda()
         
         # Colorize
         with torch.no_grad():
-            out_ab = self.colorizer(tens_l_rs).cpu()
-        
-        # Postprocess
-        colorized_rgb = postprocess_tens(tens_l_orig, out_ab)
-        
-        # Convert RGB back to BGR
-        colorized_bgr = cv2.cvtColor((colorized_rgb * 255).astype(np.uint8), cv2.COLOR_RGB2BGR)
+            out_ab = self.colorizer(tens_l_rs)
+            
+            # Postprocess on the model's device straight to a uint8 BGR frame for the encoder
+            colorized_bgr = postprocess_tens_uint8(tens_l_orig, out_ab, bgr=True, pad=pad)
         
+        if return_ab:
+            return colorized_bgr, (unpad_ab(out_ab, pad) if pad is not None else out_ab)
         return colorized_bgr
     
-    def colorize_video(self, input_path, output_path, frame_skip=1, quality='medium'):
+    def colorize_video(self, input_path, output_path, frame_skip=1, quality='medium',
+                       start_frame=0, end_frame=None, start_time=None, end_time=None,
+                       progress_callback=None, verbose=True, sidecar_path=None, sidecar_dtype='int8'):
         """
         Colorize entire video
         Args:
@@ -70,6 +119,17 @@ class VideoColorizer:
             output_path: Path to output video
             frame_skip: Process every nth frame (1 = all frames)
             quality: 'low', 'medium', 'high'
+            start_frame: First frame to process (seeks instead of decoding from 0)
+            end_frame: Stop before this frame (None = end of video)
+            start_time: Start position in seconds (overrides start_frame)
+            end_time: End position in seconds (overrides end_frame)
+            progress_callback: Called as progress_callback(processed_frames, total) after each frame
+            verbose: Print progress and a progress bar
+            sidecar_path: Also store every processed frame's ab prediction in this stream
+                sidecar, so the video can be re-rendered later without inference
+            sidecar_dtype: 'int8' or 'float16' sidecar quantization
+        Returns:
+            number of frames written
         """
         cap = cv2.VideoCapture(str(input_path))
         
@@ -77,17 +137,15 @@ class VideoColorizer:
             raise ValueError(f"Could not open video: {input_path}")
         
         # Get video properties
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        fps = cap.get(cv2.CAP_PROP_FPS)
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-        # Quality settings
-        quality_settings = {
-            'low': {'crf': 28, 'preset': 'fast'},
-            'medium': {'crf': 23, 'preset': 'medium'},
-            'high': {'crf': 18, 'preset': 'slow'}
-        }
+        start_frame, end_frame = _resolve_range(fps, total_frames, start_frame, end_frame, start_time, end_time)
+        if start_frame > 0:
+            cap = seek(cap, input_path, start_frame)
+        total_frames = max(end_frame - start_frame, 0)
+        n_frames = -(-total_frames // frame_skip)
         
         # Setup temporary output for high quality encoding
         temp_output = tempfile.NamedTemporaryFile(suffix='.mp4', delete=False)
@@ -96,54 +154,130 @@ class VideoColorizer:
         
         # Video writer for temporary file
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(temp_path, fourcc, fps//frame_skip, (width, height))
+        out = cv2.VideoWriter(temp_path, fourcc, fps/frame_skip, (width, height))
+        
+        sidecar = None
+        if sidecar_path is not None:
+            sidecar = AbStreamWriter(sidecar_path, sidecar_meta(
+                self.model_type, self.inference_size, self.letterbox, source=os.path.basename(str(input_path)),
+                fps=fps, frame_skip=frame_skip, width=width, height=height), dtype=sidecar_dtype)
         
-        frame_count = 0
+        frame_count = start_frame
         processed_frames = 0
         
-        print(f"Processing {total_frames//frame_skip} frames...")
-        print(f"Model: {self.model_type}, Device: {self.device}")
-        print(f"Video specs: {width}x{height} @ {fps}fps")
+        if verbose:
+            print(f"Processing {n_frames} frames...")
+            print(f"Model: {self.model_type}, Device: {self.device}")
+            print(f"Video specs: {width}x{height} @ {fps:g}fps")
         
-        with tqdm(total=total_frames//frame_skip, desc="Colorizing", unit="frames") as pbar:
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                if frame_count % frame_skip == 0:
+        with tqdm(total=n_frames, desc="Colorizing", unit="frames", disable=not verbose) as pbar:
+            try:
+                while frame_count < end_frame:
+                    if (frame_count - start_frame) % frame_skip != 0:
+                        # skipped frames are only demuxed/decoded, never converted
+                        if not cap.grab():
+                            break
+                        frame_count += 1
+                        continue
+                    
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    
                     # Colorize frame
-                    colorized_frame = self.colorize_frame(frame)
+                    if sidecar is not None:
+                        colorized_frame, out_ab = self.colorize_frame(frame, return_ab=True)
+                        sidecar.write(frame_count, out_ab)
+                    else:
+                        colorized_frame = self.colorize_frame(frame)
                     out.write(colorized_frame)
                     processed_frames += 1
                     pbar.update(1)
-                
-                frame_count += 1
+                    if progress_callback is not None:
+                        progress_callback(processed_frames, n_frames)
+                    
+                    frame_count += 1
+            except BaseException:
+                cap.release()
+                out.release()
+                os.unlink(temp_path)
+                raise
+            finally:
+                if sidecar is not None:
+                    sidecar.close()
         
         cap.release()
         out.release()
         
-        # Re-encode with better quality using ffmpeg if available
-        try:
-            import subprocess
-            quality_opts = quality_settings[quality]
-            cmd = [
-                'ffmpeg', '-i', temp_path, '-c:v', 'libx264',
-                '-crf', str(quality_opts['crf']),
-                '-preset', quality_opts['preset'],
-                '-y', str(output_path)
-            ]
-            subprocess.run(cmd, check=True, capture_output=True)
-            os.unlink(temp_path)  # Remove temporary file
-            print(f"✅ Video saved to: {output_path}")
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            # Fallback: just rename temp file
-            os.rename(temp_path, str(output_path))
-            print(f"✅ Video saved to: {output_path} (basic quality)")
+        _finish_encode(temp_path, output_path, QUALITY_SETTINGS[quality], verbose)
+        return processed_frames
+    
+    def preview_contact_sheet(self, input_path, output_path, every_n=100, columns=6, thumb_width=320,
+                              start_frame=0, end_frame=None, start_time=None, end_time=None):
+        """
+        Colorize every nth frame into a single contact sheet image for quick QC
+        Args:
+            input_path: Path to input video
+            output_path: Path to output image (.jpg/.png)
+            every_n: Sample one frame every n frames
+            columns: Thumbnails per row
+            thumb_width: Width of each thumbnail in pixels
+        Returns:
+            list of sampled frame indices
+        """
+        cap = cv2.VideoCapture(str(input_path))
+        
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video: {input_path}")
+        
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        start_frame, end_frame = _resolve_range(fps, total_frames, start_frame, end_frame, start_time, end_time)
+        thumb_height = max(1, int(round(height * thumb_width / width)))
+        
+        indices = list(range(start_frame, end_frame, every_n))
+        thumbs = []
+        position = 0
+        for index in tqdm(indices, desc="Contact sheet", unit="frames"):
+            if index - position > SEEK_THRESHOLD:
+                cap = seek(cap, input_path, index)
+            else:
+                for _ in range(index - position):
+                    cap.grab()
+            ret, frame = cap.read()
+            if not ret:
+                break
+            position = index + 1
+            
+            # colorize at thumbnail size; full-res inference would be thrown away
+            small = cv2.resize(frame, (thumb_width, thumb_height), interpolation=cv2.INTER_AREA)
+            thumb = self.colorize_frame(small).copy()
+            cv2.putText(thumb, f"#{index} {_timecode(index / fps)}", (5, thumb_height - 8),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255,255,255), 1)
+            thumbs.append(thumb)
+        cap.release()
+        
+        if not thumbs:
+            raise ValueError(f"No frames sampled from: {input_path}")
+        
+        rows = -(-len(thumbs) // columns)
+        sheet = np.zeros((rows * thumb_height, columns * thumb_width, 3), dtype=np.uint8)
+        for i, thumb in enumerate(thumbs):
+            r, c = divmod(i, columns)
+            sheet[r*thumb_height:(r+1)*thumb_height, c*thumb_width:(c+1)*thumb_width] = thumb
+        cv2.imwrite(str(output_path), sheet)
+        print(f"✅ Contact sheet ({len(thumbs)} frames) saved to: {output_path}")
+        return indices[:len(thumbs)]
     
-    def colorize_video_realtime(self, input_path, show_preview=True):
+    def colorize_video_realtime(self, input_path, show_preview=True, display_size=(640, 480)):
         """
         Real-time video colorization with preview
+        Decoding and display run on this thread at the source frame rate; a worker
+        thread colorizes whichever frame is newest when it becomes free, so slow
+        inference lowers the colorized frame rate instead of stalling the preview.
+        Frames are reduced to display size before inference and post-processing.
         """
         cap = cv2.VideoCapture(str(input_path))
         
@@ -153,50 +287,72 @@ class VideoColorizer:
         print("🎬 Real-time Video Colorization")
         print("Press 'q' to quit, 'p' to pause/resume")
         
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        frame_interval = 1.0 / fps
+        display_w, display_h = display_size
+        worker = _LatestFrameWorker(self.colorize_frame)
+        worker.start()
+        
         paused = False
+        gray_frame = None
+        display_times = deque(maxlen=30)
+        next_frame_time = time.time()
         
-        while True:
-            if not paused:
-                ret, frame = cap.read()
-                if not ret:
-                    print("End of video reached")
-                    break
-                
-                # Colorize frame
-                colorized_frame = self.colorize_frame(frame)
-                
-                if show_preview:
-                    # Show side-by-side comparison
-                    gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    gray_frame = cv2.cvtColor(gray_frame, cv2.COLOR_GRAY2BGR)
+        try:
+            while True:
+                if not paused:
+                    ret, frame = cap.read()
+                    if not ret:
+                        print("End of video reached")
+                        break
                     
-                    # Resize for display
-                    h, w = frame.shape[:2]
-                    display_h, display_w = 480, 640
-                    gray_frame = cv2.resize(gray_frame, (display_w//2, display_h))
-                    colorized_frame = cv2.resize(colorized_frame, (display_w//2, display_h))
+                    small = cv2.resize(frame, (display_w//2, display_h), interpolation=cv2.INTER_AREA)
+                    worker.submit(small)
+                    gray_frame = cv2.cvtColor(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), cv2.COLOR_GRAY2BGR)
+                    display_times.append(time.time())
+                
+                # raises here if the worker died, instead of previewing stale frames
+                colorized_frame, latency, infer_fps = worker.latest()
+                if show_preview and gray_frame is not None:
+                    if colorized_frame is None:
+                        colorized_frame = np.zeros_like(gray_frame)
+                    display_fps = (len(display_times) - 1) / max(display_times[-1] - display_times[0], 1e-9) if len(display_times) > 1 else 0.0
                     
                     # Combine frames
                     combined = np.hstack([gray_frame, colorized_frame])
                     cv2.putText(combined, "Original", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255,255,255), 2)
                     cv2.putText(combined, "Colorized", (display_w//2 + 10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255,255,255), 2)
+                    cv2.putText(combined, f"Display {display_fps:.1f} fps | Colorize {infer_fps:.1f} fps | Latency {latency*1000:.0f} ms",
+                                (10, 55), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,255,255), 1)
                     cv2.putText(combined, "Press 'q' to quit, 'p' to pause", (10, display_h-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
                     
                     cv2.imshow('Video Colorization', combined)
-            
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q'):
-                break
-            elif key == ord('p'):
-                paused = not paused
-                print("⏸️ Paused" if paused else "▶️ Resumed")
-        
-        cap.release()
-        cv2.destroyAllWindows()
+                
+                # pace playback to the source frame rate
+                next_frame_time += frame_interval
+                wait_ms = max(1, int((next_frame_time - time.time()) * 1000))
+                if wait_ms == 1:
+                    next_frame_time = time.time()
+                key = cv2.waitKey(wait_ms) & 0xFF
+                if key == ord('q'):
+                    break
+                elif key == ord('p'):
+                    paused = not paused
+                    print("⏸️ Paused" if paused else "▶️ Resumed")
+        finally:
+            worker.stop()
+            cap.release()
+            cv2.destroyAllWindows()
     
-    def batch_colorize_videos(self, input_dir, output_dir, **kwargs):
+    def batch_colorize_videos(self, input_dir, output_dir, workers=1, pin=None, **kwargs):
         """
         Colorize all videos in a directory
+        Args:
+            workers: Number of worker processes, each with its own loaded model
+            pin: Worker CPU pinning: None, 'core' or 'numa' (see colorizers.runtime.worker_runtime)
+            kwargs: colorize_video keyword arguments
+        Returns:
+            list of per-file result dicts (input, output, frames, seconds, error)
         """
         input_path = Path(input_dir)
         output_path = Path(output_dir)
@@ -208,46 +364,431 @@ class VideoColorizer:
         for ext in video_extensions:
             video_files.extend(input_path.glob(f'*{ext}'))
             video_files.extend(input_path.glob(f'*{ext.upper()}'))
+        video_files = sorted(set(video_files))
         
         print(f"Found {len(video_files)} video files")
         
-        for video_file in video_files:
-            output_file = output_path / f"colorized_{video_file.name}"
-            print(f"\n🎬 Processing: {video_file.name}")
+        jobs = [(str(f), str(output_path / f"colorized_{f.name}")) for f in video_files]
+        start_time = time.time()
+        
+        if workers <= 1:
+            results = []
+            for job in jobs:
+                print(f"\n🎬 Processing: {Path(job[0]).name}")
+                results.extend(_colorize_bundle([job], kwargs, colorizer=self, verbose=True))
+        else:
+            results = self._run_parallel(jobs, workers, pin, kwargs)
+        
+        _print_batch_report(results, time.time() - start_time)
+        return results
+    
+    def _run_parallel(self, jobs, workers, pin, kwargs):
+        """Schedule videos across a process pool, longest first, short clips packed together"""
+        sized = sorted(((_count_frames(job[0]), job) for job in jobs), key=lambda x: -x[0])
+        
+        # Long videos are tasks of their own; short clips are bundled so per-task
+        # overhead does not dominate. Longest tasks go first so no worker is left
+        # with one long video at the end.
+        bundles = []
+        current, current_frames = [], 0
+        for frames, job in sized:
+            if frames >= PACK_FRAMES:
+                bundles.append([job])
+                continue
+            current.append(job)
+            current_frames += frames
+            if current_frames >= PACK_FRAMES:
+                bundles.append(current)
+                current, current_frames = [], 0
+        if current:
+            bundles.append(current)
+        
+        print(f"🚀 {len(bundles)} tasks on {workers} workers")
+        results = []
+        with tqdm(total=len(jobs), desc="Videos", unit="videos") as pbar:
+            def report(bundle_results):
+                for r in bundle_results:
+                    if r['error']:
+                        tqdm.write(f"❌ Error processing {Path(r['input']).name}: {r['error']}")
+                results.extend(bundle_results)
+                pbar.update(len(bundle_results))
+
+            def fail(index, error):
+                report([{'input': i, 'output': o, 'frames': 0, 'seconds': 0.0, 'error': error}
+                        for i, o in bundles[index]])
+
+            # A dying worker breaks the whole pool: every unfinished future raises
+            # BrokenProcessPool. Bundles not yet started go to a fresh pool; bundles that
+            # were running are rerun one at a time, so only the one that crashes on its
+            # own is marked failed.
+            pending = list(range(len(bundles)))
+            while pending:
+                running, pending = self._pool_pass(bundles, pending, workers, pin, kwargs, report, fail)
+                if not running and pending:
+                    for index in pending:
+                        fail(index, 'worker processes could not start')
+                    break
+                for index in running:
+                    if len(running) > 1:
+                        crashed, _ = self._pool_pass(bundles, [index], 1, pin, kwargs, report, fail)
+                        if not crashed:
+                            continue
+                    fail(index, 'worker process died while colorizing this bundle')
+        return results
+
+    def _pool_pass(self, bundles, indices, workers, pin, kwargs, report, fail):
+        """
+        Run bundles[indices] on a new process pool until done or until a worker dies
+        Returns:
+            (unfinished bundles that had started, unfinished bundles that had not)
+        """
+        started = mp.Array('b', len(bundles))
+        finished = set()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_pool_worker,
+                                 initargs=(started, self.settings(), mp.Value('i', 0), workers, pin)) as pool:
+            futures = {pool.submit(_run_bundle, index, bundles[index], kwargs): index for index in indices}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    report(future.result())
+                except BrokenProcessPool:
+                    continue
+                except Exception as e:
+                    fail(index, str(e))
+                finished.add(index)
+        unfinished = [index for index in indices if index not in finished]
+        return [i for i in unfinished if started[i]], [i for i in unfinished if not started[i]]
+
+class _LatestFrameWorker(threading.Thread):
+    """Background colorizer that only ever works on the most recently submitted frame"""
+    def __init__(self, colorize):
+        super().__init__(daemon=True)
+        self.colorize = colorize
+        self.cond = threading.Condition()
+        self.pending = None
+        self.result = (None, 0.0, 0.0)
+        self.running = True
+        self.error = None
+        self.done_times = deque(maxlen=10)
+    
+    def submit(self, frame):
+        with self.cond:
+            # an older frame that was not picked up yet is simply replaced
+            self.pending = (frame, time.time())
+            self.cond.notify()
+    
+    def latest(self):
+        """Return (colorized frame, latency in seconds, colorized fps); re-raises a colorize failure"""
+        with self.cond:
+            if self.error is not None:
+                raise RuntimeError(f"colorization worker failed: {self.error}") from self.error
+            return self.result
+    
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.join()
+    
+    def run(self):
+        while True:
+            with self.cond:
+                while self.pending is None and self.running:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                frame, submitted = self.pending
+                self.pending = None
             
             try:
-                self.colorize_video(video_file, output_file, **kwargs)
+                colorized = self.colorize(frame).copy()
             except Exception as e:
-                print(f"❌ Error processing {video_file.name}: {e}")
+                with self.cond:
+                    self.error = e
+                return
+            now = time.time()
+            self.done_times.append(now)
+            n = len(self.done_times)
+            infer_fps = (n - 1) / max(self.done_times[-1] - self.done_times[0], 1e-9) if n > 1 else 0.0
+            with self.cond:
+                self.result = (colorized, now - submitted, infer_fps)
+
+# Clips shorter than this are packed into shared tasks in parallel batch mode
+PACK_FRAMES = 1000
+
+# Colorizer loaded once per batch worker process, and the pool's shared started-bundle flags
+_batch_colorizer = None
+_bundles_started = None
+
+def _finish_encode(temp_path, output_path, quality_opts, verbose=True):
+    """Re-encode the mp4v temp file with ffmpeg if available, else move it into place"""
+    try:
+        cmd = [
+            'ffmpeg', '-i', temp_path, '-c:v', 'libx264',
+            '-crf', str(quality_opts['crf']),
+            '-preset', quality_opts['preset'],
+            '-y', str(output_path)
+        ]
+        subprocess.run(cmd, check=True, capture_output=True)
+        os.unlink(temp_path)  # Remove temporary file
+        if verbose:
+            print(f"✅ Video saved to: {output_path}")
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        # Fallback: just move temp file (it may live on another filesystem)
+        shutil.move(temp_path, str(output_path))
+        if verbose:
+            print(f"✅ Video saved to: {output_path} (basic quality)")
+
+def render_sidecar_video(input_path, sidecar_path, output_path, size=None, quality='medium', verbose=True):
+    """
+    Render a colorized video from the original (grayscale) video and its ab stream sidecar,
+    without running the network
+    Args:
+        size: (W, H) output frame size (default: the source size)
+    Returns:
+        number of frames written
+    """
+    reader = AbStreamReader(sidecar_path)
+    cap = cv2.VideoCapture(str(input_path))
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video: {input_path}")
+    meta = reader.meta
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    size = tuple(size) if size else (width, height)
+    
+    temp_output = tempfile.NamedTemporaryFile(suffix='.mp4', delete=False)
+    temp_path = temp_output.name
+    temp_output.close()
+    out = cv2.VideoWriter(temp_path, cv2.VideoWriter_fourcc(*'mp4v'),
+                          meta.get('fps', cap.get(cv2.CAP_PROP_FPS))/meta.get('frame_skip', 1), size)
+    
+    written = 0
+    try:
+        first_frame = reader.read(0)[0] if len(reader) else 0
+        if first_frame > 0:
+            cap = seek(cap, input_path, first_frame)
+        frame_count = first_frame
+        for frame_index, out_ab in tqdm(reader, total=len(reader), desc="Rendering", unit="frames", disable=not verbose):
+            while frame_count < frame_index:
+                if not cap.grab():
+                    break
+                frame_count += 1
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame_count += 1
+            # L from the color frame, as during inference (a gray conversion differs for color sources)
+            out.write(render_sidecar(out_ab, frame, size=size, bgr=True))
+            written += 1
+    except BaseException:
+        cap.release()
+        out.release()
+        os.unlink(temp_path)
+        raise
+    finally:
+        reader.close()
+    
+    cap.release()
+    out.release()
+    _finish_encode(temp_path, output_path, QUALITY_SETTINGS[quality], verbose)
+    return written
+
+def _init_pool_worker(started, settings, counter, num_workers, pin):
+    global _bundles_started
+    _bundles_started = started
+    _init_batch_worker(settings, counter, num_workers, pin)
+
+def _run_bundle(index, bundle, kwargs):
+    # mark the bundle as running in this process, so a crash can be attributed to it
+    _bundles_started[index] = 1
+    return _colorize_bundle(bundle, kwargs)
+
+def _init_batch_worker(settings, counter, num_workers, pin):
+    global _batch_colorizer
+    configure_worker(counter, num_workers, pin)
+    _batch_colorizer = VideoColorizer(**settings)
+
+def _count_frames(path):
+    cap = cv2.VideoCapture(str(path))
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return frames
+
+def _colorize_bundle(bundle, kwargs, colorizer=None, verbose=False):
+    """Colorize a list of (input, output) videos; errors are recorded per file"""
+    colorizer = colorizer or _batch_colorizer
+    results = []
+    for input_file, output_file in bundle:
+        t0 = time.time()
+        try:
+            frames = colorizer.colorize_video(input_file, output_file, verbose=verbose, **kwargs)
+            error = None
+        except Exception as e:
+            frames, error = 0, str(e)
+            if verbose:
+                print(f"❌ Error processing {Path(input_file).name}: {e}")
+        results.append({'input': input_file, 'output': output_file, 'frames': frames,
+                        'seconds': time.time() - t0, 'error': error})
+    return results
+
+def _print_batch_report(results, wall_time):
+    ok = [r for r in results if not r['error']]
+    failed = [r for r in results if r['error']]
+    frames = sum(r['frames'] for r in ok)
+    busy = sum(r['seconds'] for r in results)
+    print("\n📊 Batch report")
+    print(f"Videos: {len(ok)} succeeded, {len(failed)} failed")
+    print(f"Frames: {frames} in {wall_time:.1f}s wall time ({frames / max(wall_time, 1e-9):.1f} frames/s)")
+    print(f"Worker time: {busy:.1f}s (speedup over sequential: {busy / max(wall_time, 1e-9):.2f}x)")
+    for r in failed:
+        print(f"❌ {Path(r['input']).name}: {r['error']}")
+
+# Gaps (in frames) above which seeking is cheaper than decoding forward
+SEEK_THRESHOLD = 30
+
+def seek(cap, input_path, frame):
+    """
+    Position a capture at an exact frame index
+    Uses CAP_PROP_POS_FRAMES; if the backend lands elsewhere, reopens the file and
+    decodes forward instead so the position is always frame-accurate.
+    Returns:
+        the capture to keep reading from (may be a new object)
+    """
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame)
+    if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == frame:
+        return cap
+    cap.release()
+    cap = cv2.VideoCapture(str(input_path))
+    for _ in range(frame):
+        if not cap.grab():
+            break
+    return cap
+
+def _resolve_range(fps, total_frames, start_frame=0, end_frame=None, start_time=None, end_time=None):
+    """Turn frame and/or time bounds into a clamped [start_frame, end_frame) range"""
+    if start_time is not None:
+        start_frame = int(round(start_time * fps))
+    if end_time is not None:
+        end_frame = int(round(end_time * fps))
+    if end_frame is None or end_frame > total_frames:
+        end_frame = total_frames
+    start_frame = max(0, min(start_frame, end_frame))
+    return start_frame, end_frame
+
+def parse_timecode(value):
+    """Parse seconds ('90.5') or a timecode ('1:30.5', '01:01:30') into seconds"""
+    seconds = 0.0
+    for part in value.split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def _timecode(seconds):
+    m, s = divmod(seconds, 60)
+    h, m = divmod(int(m), 60)
+    return f"{h:02d}:{m:02d}:{s:05.2f}"
+
+def concat_videos(part_paths, output_path):
+    """
+    Join video files with identical encoding settings into one file
+    Uses the ffmpeg concat demuxer (stream copy, no re-encode) when available
+    """
+    part_paths = [str(p) for p in part_paths]
+    if len(part_paths) == 1:
+        shutil.copyfile(part_paths[0], str(output_path))
+        return
+    
+    list_file = tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False)
+    for part in part_paths:
+        list_file.write(f"file '{os.path.abspath(part)}'\n")
+    list_file.close()
+    
+    try:
+        cmd = [
+            'ffmpeg', '-f', 'concat', '-safe', '0', '-i', list_file.name,
+            '-c', 'copy', '-y', str(output_path)
+        ]
+        subprocess.run(cmd, check=True, capture_output=True)
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        # Fallback: decode every part and write them out with OpenCV
+        cap = cv2.VideoCapture(part_paths[0])
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        cap.release()
+        out = cv2.VideoWriter(str(output_path), cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+        for part in part_paths:
+            cap = cv2.VideoCapture(part)
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                out.write(frame)
+            cap.release()
+        out.release()
+    finally:
+        os.unlink(list_file.name)
 
 def main():
     parser = argparse.ArgumentParser(description='Video Colorization')
     parser.add_argument('-i', '--input', required=True, help='Input video path or directory')
     parser.add_argument('-o', '--output', help='Output video path or directory')
-    parser.add_argument('--model', choices=['eccv16', 'siggraph17'], default='eccv16', help='Model type')
+    parser.add_argument('--model', choices=MODEL_TYPES, default='eccv16', help='Model type')
     parser.add_argument('--device', choices=['cpu', 'cuda'], default='cpu', help='Device to use')
+    parser.add_argument('--size', type=int, default=256, help='Inference resolution (multiple of 8)')
+    parser.add_argument('--letterbox', action='store_true', help='Preserve aspect ratio at inference (pad instead of stretch)')
+    parser.add_argument('--no_buffer_pool', action='store_true', help='Allocate per-frame tensors instead of reusing buffers')
     parser.add_argument('--frame_skip', type=int, default=1, help='Process every nth frame')
     parser.add_argument('--quality', choices=['low', 'medium', 'high'], default='medium', help='Output quality')
     parser.add_argument('--realtime', action='store_true', help='Real-time preview mode')
     parser.add_argument('--batch', action='store_true', help='Batch process directory of videos')
+    parser.add_argument('--workers', type=int, default=1, help='Parallel worker processes for batch mode')
+    parser.add_argument('--pin', choices=['core', 'numa'], help='Pin batch workers to disjoint cores or NUMA nodes')
+    parser.add_argument('--threads', type=int, help='Torch/OpenCV/BLAS threads (default: saved autotune setting)')
+    parser.add_argument('--start', type=parse_timecode, help='Start time (seconds or HH:MM:SS)')
+    parser.add_argument('--end', type=parse_timecode, help='End time (seconds or HH:MM:SS)')
+    parser.add_argument('--start_frame', type=int, default=0, help='First frame to process')
+    parser.add_argument('--end_frame', type=int, help='Stop before this frame')
+    parser.add_argument('--contact_sheet', help='Write a contact sheet image of every Nth frame instead of a video')
+    parser.add_argument('--every', type=int, default=100, help='Frame interval for --contact_sheet')
+    parser.add_argument('--sidecar', action='store_true', help='Also write the ab predictions to <output>.abs for re-rendering')
+    parser.add_argument('--render_sidecar', help='Render the input video from this ab sidecar (no inference)')
+    parser.add_argument('--render_size', help='Output size WxH for --render_sidecar (default: source size)')
     
     args = parser.parse_args()
     
     print("🎨 Video Colorization Tool")
     print("=" * 50)
     
-    colorizer = VideoColorizer(model_type=args.model, device=args.device)
+    configure_from_saved(num_threads=args.threads)
+    if args.render_sidecar:
+        if not args.output:
+            input_path = Path(args.input)
+            args.output = input_path.parent / f"colorized_{input_path.name}"
+        size = tuple(int(v) for v in args.render_size.split('x')) if args.render_size else None
+        render_sidecar_video(args.input, args.render_sidecar, args.output, size=size, quality=args.quality)
+        return
+    
+    colorizer = VideoColorizer(model_type=args.model, device=args.device,
+                               inference_size=args.size, letterbox=args.letterbox,
+                               buffer_pool=not args.no_buffer_pool)
+    range_kwargs = dict(start_frame=args.start_frame, end_frame=args.end_frame,
+                        start_time=args.start, end_time=args.end)
     
     if args.realtime:
         colorizer.colorize_video_realtime(args.input)
+    elif args.contact_sheet:
+        colorizer.preview_contact_sheet(args.input, args.contact_sheet, every_n=args.every, **range_kwargs)
     elif args.batch:
         if not args.output:
             args.output = str(Path(args.input).parent / "colorized_videos")
         colorizer.batch_colorize_videos(
             args.input, 
             args.output,
+            workers=args.workers,
+            pin=args.pin,
             frame_skip=args.frame_skip,
-            quality=args.quality
+            quality=args.quality,
+            **range_kwargs
         )
     else:
         if not args.output:
@@ -258,7 +799,9 @@ def main():
             args.input, 
             args.output, 
             frame_skip=args.frame_skip,
-            quality=args.quality
+            quality=args.quality,
+            sidecar_path=f"{args.output}.abs" if args.sidecar else None,
+            **range_kwargs
         )
 
 if __name__ == "__main__":
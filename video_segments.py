@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Segment-based, resumable video colorization
+The input is cut at keyframes into chunks, each chunk is colorized to its own
+file with a completion record, and the finished chunks are joined without
+re-encoding. Re-running the same command only processes missing segments.
+
+Usage:
+    python video_segments.py -i film.mp4 -o colorized_film.mp4 --workers 4
+"""
+
+import os
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+import multiprocessing as mp
+
+from video_colorizer import VideoColorizer, concat_videos
+from colorizers.runtime import configure_from_saved, configure_worker
+from colorizers.models import MODEL_TYPES
+
+DEFAULT_SEGMENT_FRAMES = 1000
+
+def find_keyframes(input_path, fps):
+    """
+    Frame indices of the keyframes in the first video stream
+    Returns:
+        sorted list of frame indices, or None if ffprobe is not available
+    """
+    cmd = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0', '-skip_frame', 'nokey',
+        '-show_entries', 'stream=start_time:frame=pts_time', '-of', 'json', str(input_path)
+    ]
+    try:
+        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        probe = json.loads(result.stdout)
+    except (subprocess.CalledProcessError, FileNotFoundError, ValueError):
+        return None
+    streams = probe.get('streams') or [{}]
+    pts_times = [frame.get('pts_time') for frame in probe.get('frames', [])]
+    return keyframe_indices(pts_times, streams[0].get('start_time'), fps)
+
+def keyframe_indices(pts_times, start_time, fps):
+    """
+    Frame indices of keyframes from their pts times (seconds, 'N/A' or None if unknown)
+    Timestamps count from the stream's start_time, which is often not 0 (MPEG-TS,
+    trimmed MP4s), while OpenCV numbers frames from the first one.
+    """
+    start = float(start_time) if start_time not in (None, 'N/A') else 0.
+    frames = set()
+    for t in pts_times:
+        if t not in (None, '', 'N/A'):
+            frames.add(max(0, int(round((float(t) - start) * fps))))
+    return sorted(frames)
+
+def plan_segments(total_frames, keyframes=None, segment_frames=DEFAULT_SEGMENT_FRAMES, frame_skip=1):
+    """
+    Split [0, total_frames) into (start, end) segments of roughly segment_frames frames
+    Boundaries are placed on keyframes when they are known, so every segment can be
+    seeked to without decoding the previous GOP. Boundaries are also kept on multiples
+    of frame_skip so the sampling phase is the same as for an unsegmented run.
+    """
+    if keyframes:
+        candidates = [k for k in keyframes if 0 < k < total_frames and k % frame_skip == 0]
+    else:
+        # rounded up to a multiple of frame_skip: rounding down falls short of segment_frames
+        # below, which would merge every two segments
+        step = -(-segment_frames // frame_skip) * frame_skip
+        candidates = list(range(step, total_frames, step))
+
+    segments = []
+    start = 0
+    for k in candidates:
+        if k - start >= segment_frames:
+            segments.append((start, k))
+            start = k
+    if start < total_frames:
+        segments.append((start, total_frames))
+    return segments
+
+# Colorizer loaded once per worker process
+_worker_colorizer = None
+
+def _init_worker(settings, counter, num_workers, pin):
+    global _worker_colorizer
+    configure_worker(counter, num_workers, pin)
+    _worker_colorizer = VideoColorizer(**settings)
+
+def _colorize_segment(input_path, seg_path, done_path, start, end, options, colorizer=None, progress_callback=None):
+    colorizer = colorizer or _worker_colorizer
+    t0 = time.time()
+    colorizer.colorize_video(input_path, seg_path, start_frame=start, end_frame=end,
+                             progress_callback=progress_callback, **options)
+    record = {'start': start, 'end': end, 'seconds': time.time() - t0, 'bytes': os.path.getsize(seg_path)}
+    tmp_path = str(done_path) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(record, f)
+    os.replace(tmp_path, done_path)
+    return start, end
+
+class SegmentedVideoJob:
+    def __init__(self, input_path, output_path, workdir=None, segment_frames=DEFAULT_SEGMENT_FRAMES,
+                 settings=None, **options):
+        """
+        Resumable segmented colorization of one video
+        Args:
+            input_path: Path to input video
+            output_path: Path to output video
+            workdir: Where segments and completion records live (default: <output>.segments)
+            segment_frames: Approximate segment length in frames
+            settings: VideoColorizer constructor arguments (see VideoColorizer.settings)
+            options: colorize_video keyword arguments (frame_skip, quality, ...)
+        """
+        self.input_path = str(input_path)
+        self.output_path = str(output_path)
+        self.workdir = Path(workdir or self.output_path + '.segments')
+        self.segment_frames = segment_frames
+        self.settings = settings or {'model_type': 'eccv16', 'device': 'cpu'}
+        self.options = options
+        self.segments = self._load_or_plan()
+
+    def _source_info(self):
+        stat = os.stat(self.input_path)
+        return {'input': os.path.abspath(self.input_path), 'size': stat.st_size, 'mtime': stat.st_mtime,
+                'segment_frames': self.segment_frames, 'options': self.options, 'settings': self.settings}
+
+    def _load_or_plan(self):
+        """Reuse the existing plan if the input and settings are unchanged, else start over"""
+        manifest_path = self.workdir / 'manifest.json'
+        source = self._source_info()
+        if manifest_path.exists():
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest['source'] == source:
+                return [tuple(s) for s in manifest['segments']]
+            print("⚠️ Input or settings changed, discarding old segments")
+            for p in self.workdir.iterdir():
+                p.unlink()
+
+        cap = cv2.VideoCapture(self.input_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video: {self.input_path}")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+
+        keyframes = find_keyframes(self.input_path, fps)
+        segments = plan_segments(total_frames, keyframes, self.segment_frames, self.options.get('frame_skip', 1))
+
+        self.workdir.mkdir(parents=True, exist_ok=True)
+        with open(manifest_path, 'w') as f:
+            json.dump({'source': source, 'segments': segments}, f, indent=2)
+        return segments
+
+    def _paths(self, index):
+        return (self.workdir / f"seg_{index:05d}.mp4", self.workdir / f"seg_{index:05d}.done")
+
+    def pending(self):
+        """Indices of segments without a completion record"""
+        return [i for i in range(len(self.segments)) if not self._paths(i)[1].exists()]
+
+    def run(self, workers=1, colorizer=None, progress_callback=None, keep_segments=False, pin=None):
+        """
+        Colorize all missing segments, then join them into the output file
+        Args:
+            workers: Number of processes colorizing segments in parallel
+            colorizer: Already loaded VideoColorizer to use when workers == 1 (must match settings)
+            progress_callback: Called as progress_callback(frames_done, total_frames)
+            keep_segments: Keep the segment files after joining
+            pin: Worker CPU pinning: None, 'core' or 'numa'
+        """
+        total = self.segments[-1][1] if self.segments else 0
+        frame_skip = self.options.get('frame_skip', 1)
+        pending = self.pending()
+        done_frames = sum(e - s for i, (s, e) in enumerate(self.segments) if i not in pending)
+        print(f"📼 {len(self.segments)} segments, {len(pending)} to process")
+
+        if workers <= 1:
+            colorizer = colorizer or VideoColorizer(**self.settings)
+            for i in pending:
+                start, end = self.segments[i]
+
+                def on_frame(processed, _, base=done_frames):
+                    if progress_callback is not None:
+                        progress_callback(base + processed * frame_skip, total)
+
+                _colorize_segment(self.input_path, *self._paths(i), start, end, self.options,
+                                  colorizer=colorizer, progress_callback=on_frame)
+                done_frames += end - start
+                if progress_callback is not None:
+                    progress_callback(done_frames, total)
+        elif pending:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(self.settings, mp.Value('i', 0), workers, pin)) as pool:
+                futures = [pool.submit(_colorize_segment, self.input_path, *self._paths(i),
+                                       *self.segments[i], self.options) for i in pending]
+                for future in as_completed(futures):
+                    start, end = future.result()
+                    done_frames += end - start
+                    if progress_callback is not None:
+                        progress_callback(done_frames, total)
+
+        seg_paths = [self._paths(i)[0] for i in range(len(self.segments))]
+        concat_videos(seg_paths, self.output_path)
+        print(f"✅ Video saved to: {self.output_path}")
+
+        if not keep_segments:
+            for p in self.workdir.iterdir():
+                p.unlink()
+            self.workdir.rmdir()
+
+def main():
+    parser = argparse.ArgumentParser(description='Resumable segmented video colorization')
+    parser.add_argument('-i', '--input', required=True, help='Input video path')
+    parser.add_argument('-o', '--output', help='Output video path')
+    parser.add_argument('--model', choices=MODEL_TYPES, default='eccv16', help='Model type')
+    parser.add_argument('--device', choices=['cpu', 'cuda'], default='cpu', help='Device to use')
+    parser.add_argument('--size', type=int, default=256, help='Inference resolution (multiple of 8)')
+    parser.add_argument('--letterbox', action='store_true', help='Preserve aspect ratio at inference (pad instead of stretch)')
+    parser.add_argument('--frame_skip', type=int, default=1, help='Process every nth frame')
+    parser.add_argument('--quality', choices=['low', 'medium', 'high'], default='medium', help='Output quality')
+    parser.add_argument('--segment_frames', type=int, default=DEFAULT_SEGMENT_FRAMES, help='Approximate frames per segment')
+    parser.add_argument('--workers', type=int, default=1, help='Segments colorized in parallel')
+    parser.add_argument('--keep_segments', action='store_true', help='Keep segment files after joining')
+    parser.add_argument('--pin', choices=['core', 'numa'], help='Pin workers to disjoint cores or NUMA nodes')
+    parser.add_argument('--threads', type=int, help='Torch/OpenCV/BLAS threads (default: saved autotune setting)')
+    args = parser.parse_args()
+
+    if not args.output:
+        input_path = Path(args.input)
+        args.output = input_path.parent / f"colorized_{input_path.name}"
+
+    job = SegmentedVideoJob(args.input, args.output, segment_frames=args.segment_frames,
+                            settings={'model_type': args.model, 'device': args.device,
+                                      'inference_size': args.size, 'letterbox': args.letterbox},
+                            frame_skip=args.frame_skip, quality=args.quality)
+    if args.workers <= 1:
+        configure_from_saved(num_threads=args.threads)
+    job.run(workers=args.workers, keep_segments=args.keep_segments, pin=args.pin)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+"""
+Watch-folder ingest daemon
+Watches input folders (inotify on Linux, directory-mtime polling elsewhere), waits until
+new files stop changing, and feeds them to a warm colorization worker that batches
+whatever arrived together. A SQLite index records every file seen and every directory
+listed, so a restart only lists directories that changed and never redoes finished work.
+
+Usage:
+    python watch_daemon.py watch scans/ -o scans_colored --model eccv16 --batch_size 4
+    python watch_daemon.py watch share/a share/b -o colored --poll --poll_interval 5
+    python watch_daemon.py report --since 24
+Results go to <output>/<path relative to its watched folder>/color_<name>.
+"""
+
+import os
+import json
+import time
+import queue
+import select
+import struct
+import sqlite3
+import argparse
+import threading
+
+DEFAULT_INDEX = 'watch_index.db'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.tiff')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    status TEXT NOT NULL,
+    output TEXT,
+    seen REAL NOT NULL,
+    ready REAL,
+    done REAL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    subdirs TEXT NOT NULL
+);
+"""
+
+def is_image(path):
+    name = os.path.basename(path)
+    return name.lower().endswith(IMAGE_EXTENSIONS) and not name.startswith('.')
+
+class ProcessedIndex:
+    def __init__(self, db_path=DEFAULT_INDEX):
+        """
+        Persistent record of the files seen (pending, done or failed) and of each watched
+        directory's mtime when it was last listed
+        """
+        self.db_path = str(db_path)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def listed_dirs(self):
+        """path -> (mtime_ns, subdirectories) of every directory listed so far"""
+        with self._connect() as conn:
+            return {row['path']: (row['mtime_ns'], json.loads(row['subdirs'])) for row in conn.execute("SELECT * FROM dirs")}
+
+    def set_listed(self, path, mtime_ns, subdirs):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO dirs (path, mtime_ns, subdirs) VALUES (?, ?, ?)",
+                         (path, mtime_ns, json.dumps(subdirs)))
+
+    def discover(self, paths, now=None):
+        """
+        Record candidate files; returns (path, seen time) for those that need processing:
+        new files, files still pending, and finished files that have since been rewritten
+        """
+        now = now or time.time()
+        result = []
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            for path in paths:
+                row = conn.execute("SELECT * FROM files WHERE path=?", (path,)).fetchone()
+                if row is None:
+                    conn.execute("INSERT INTO files (path, status, seen) VALUES (?, 'pending', ?)", (path, now))
+                    result.append((path, now))
+                elif row['status'] == 'pending':
+                    result.append((path, row['seen']))
+                else:
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    if (st.st_size, st.st_mtime_ns) != (row['size'], row['mtime_ns']):
+                        conn.execute("UPDATE files SET status='pending', seen=?, ready=NULL, done=NULL, error=NULL "
+                                     "WHERE path=?", (now, path))
+                        result.append((path, now))
+            conn.execute('COMMIT')
+        return result
+
+    def pending(self):
+        """(path, seen time) of files discovered but not finished, e.g. before a restart"""
+        with self._connect() as conn:
+            return [(row['path'], row['seen']) for row in
+                    conn.execute("SELECT path, seen FROM files WHERE status='pending' ORDER BY seen")]
+
+    def finish(self, path, size, mtime_ns, output, ready, error=None):
+        with self._connect() as conn:
+            conn.execute("UPDATE files SET status=?, size=?, mtime_ns=?, output=?, ready=?, done=?, error=? WHERE path=?",
+                         ('failed' if error else 'done', size, mtime_ns, output, ready, time.time(), error, path))
+
+    def latencies(self, since=None):
+        """(ingest-to-output seconds, settle wait seconds) of files finished after since"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT seen, ready, done FROM files WHERE status='done' AND done >= ?",
+                                (since or 0,)).fetchall()
+        return [(row['done'] - row['seen'], row['ready'] - row['seen']) for row in rows]
+
+    def counts(self):
+        with self._connect() as conn:
+            return {row['status']: row['n'] for row in
+                    conn.execute("SELECT status, COUNT(*) AS n FROM files GROUP BY status")}
+
+class DirScanner:
+    def __init__(self, roots, index):
+        """
+        Finds image files in directories whose mtime changed since they were last listed
+        A directory's mtime changes whenever an entry is added, removed or renamed in it,
+        so an unchanged tree costs one stat per directory, also right after a restart
+        (the index keeps each directory's mtime and subdirectories).
+        """
+        self.roots = roots
+        self.index = index
+        self.listed = index.listed_dirs()
+
+    def scan(self, settle=2.):
+        found = []
+        for root in self.roots:
+            self._scan_dir(root, found, time.time_ns() - int(settle*1e9))
+        return found
+
+    def _scan_dir(self, path, found, recent_ns):
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if path in self.listed and self.listed[path][0] == mtime_ns:
+            subdirs = self.listed[path][1]
+        else:
+            subdirs = []
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif is_image(entry.path):
+                        found.append(entry.path)
+            # a directory modified within the mtime granularity of this listing may change
+            # again without a visible mtime change, so it is only recorded once it is older
+            if mtime_ns < recent_ns:
+                self.listed[path] = (mtime_ns, subdirs)
+                self.index.set_listed(path, mtime_ns, subdirs)
+        for sub in subdirs:
+            self._scan_dir(sub, found, recent_ns)
+
+# inotify(7) constants
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_Q_OVERFLOW = 0x4000
+_IN_ISDIR = 0x40000000
+_EVENT = struct.Struct('iIII')
+
+class InotifyWatcher:
+    def __init__(self, roots):
+        """
+        inotify watches on roots and all their subdirectories, through libc with ctypes
+        Raises:
+            OSError where inotify is unavailable
+        """
+        import ctypes
+        import ctypes.util
+
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError('inotify is not available')
+        self.fd = self.libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.ctypes = ctypes
+        self.paths = {}
+        for root in roots:
+            self._watch_tree(root)
+
+    def _watch_tree(self, root):
+        # watch a directory tree; returns the image files already inside it
+        found = []
+        for dirpath, _, files in os.walk(root):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE)
+            if wd < 0:
+                errno = self.ctypes.get_errno()
+                raise OSError(errno, f"inotify_add_watch failed for {dirpath} (raise fs.inotify.max_user_watches?)")
+            self.paths[wd] = dirpath
+            found += [os.path.join(dirpath, f) for f in files if is_image(f)]
+        return found
+
+    def read(self, timeout):
+        """
+        Image files written or moved in within timeout seconds, or None if the kernel queue
+        overflowed (events were lost: rescan)
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        found = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 << 10)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = data[offset+_EVENT.size:offset+_EVENT.size+length].rstrip(b'\0')
+                offset += _EVENT.size + length
+                if mask & _IN_Q_OVERFLOW:
+                    return None
+                if wd not in self.paths:
+                    continue
+                path = os.path.join(self.paths[wd], os.fsdecode(name))
+                if mask & _IN_ISDIR:
+                    if mask & (_IN_CREATE | _IN_MOVED_TO):
+                        found += self._watch_tree(path)
+                elif mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO) and is_image(path):
+                    found.append(path)
+        return found
+
+    def close(self):
+        os.close(self.fd)
+
+class Debouncer:
+    def __init__(self, settle=2.):
+        """Holds files until their size and mtime have not changed for settle seconds"""
+        self.settle = settle
+        self.pending = {}       # path -> [(size, mtime_ns), stable since, seen]
+
+    def add(self, path, seen):
+        if path not in self.pending:
+            self.pending[path] = [None, time.time(), seen]
+
+    def ready(self, now=None):
+        """(path, seen time) of the files that have settled; they are no longer tracked"""
+        now = now or time.time()
+        settled = []
+        for path, entry in list(self.pending.items()):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                del self.pending[path]
+                continue
+            sig = (st.st_size, st.st_mtime_ns)
+            if sig != entry[0]:
+                entry[0], entry[1] = sig, now
+            elif st.st_size > 0 and now - entry[1] >= self.settle:
+                settled.append((path, entry[2]))
+                del self.pending[path]
+        return settled
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values)-1, int(round(q*(len(values)-1))))]
+
+def format_latencies(latencies):
+    if not latencies:
+        return "no images finished"
+    total = [t for t, _ in latencies]
+    settle = [s for _, s in latencies]
+    return (f"{len(total)} images, ingest-to-output p50 {_percentile(total, .5):.2f}s "
+            f"p95 {_percentile(total, .95):.2f}s max {max(total):.2f}s (settle wait p50 {_percentile(settle, .5):.2f}s)")
+
+class BatchWorker(threading.Thread):
+    def __init__(self, colorize, index, batch_size=4, batch_window=.5):
+        """
+        Background thread running colorize on batches of settled files
+        Args:
+            colorize: called as colorize(paths, out_paths); returns one error string (or None) per path
+            batch_window: how long to wait for more files to fill a batch
+        """
+        super().__init__(daemon=True)
+        self.colorize = colorize
+        self.index = index
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.queue = queue.Queue()
+        self.stopping = threading.Event()
+        self.latencies = []
+        self.lock = threading.Lock()
+        self.active = set()     # paths submitted and not yet recorded in the index
+
+    def submit(self, path, out_path, seen):
+        with self.lock:
+            self.active.add(path)
+        self.queue.put((path, out_path, seen, time.time()))
+
+    def in_flight(self):
+        """Paths handed to the worker that it has not finished yet (still 'pending' in the index)"""
+        with self.lock:
+            return set(self.active)
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                batch = [self.queue.get(timeout=.2)]
+            except queue.Empty:
+                continue
+            deadline = time.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get(timeout=max(0., deadline - time.time())))
+                except queue.Empty:
+                    break
+            try:
+                self._process(batch)
+            except Exception as e:
+                # last resort: the worker must outlive any one batch
+                print(f"❌ batch of {len(batch)} failed: {type(e).__name__}: {e}")
+            finally:
+                with self.lock:
+                    self.active.difference_update(b[0] for b in batch)
+
+    def _process(self, batch):
+        sigs = []
+        for path, *_ in batch:
+            try:
+                st = os.stat(path)
+                sigs.append((st.st_size, st.st_mtime_ns))
+            except FileNotFoundError:
+                sigs.append((None, None))
+        try:
+            errors = self.colorize([b[0] for b in batch], [b[1] for b in batch])
+        except Exception as e:
+            # e.g. the batched forward running out of memory: every file in the batch fails
+            errors = [f"{type(e).__name__}: {e}"]*len(batch)
+        now = time.time()
+        for (path, out_path, seen, ready), (size, mtime_ns), error in zip(batch, sigs, errors):
+            try:
+                self.index.finish(path, size, mtime_ns, out_path, ready, error)
+            except Exception as e:
+                print(f"❌ {path}: could not record the result in the index: {e}")
+                continue
+            if error:
+                print(f"❌ {path}: {error}")
+            else:
+                with self.lock:
+                    self.latencies.append((now - seen, ready - seen))
+                print(f"Saved: {out_path} ({now - seen:.2f}s after ingest)")
+
+    def take_latencies(self):
+        with self.lock:
+            latencies, self.latencies = self.latencies, []
+        return latencies
+
+    def stop(self):
+        # finishes the batch in progress; queued files stay pending in the index
+        self.stopping.set()
+        self.join()
+
+def _to_uint8(img):
+    # scanners often write 16-bit TIFFs: uint16 of either byte order (modes I;16 and
+    # I;16B), or int32 (mode I, e.g. 16-bit PNGs) holding 16-bit values
+    import numpy as np
+    if img.dtype.kind in 'ui' and img.dtype.itemsize > 1:
+        bits = 16 if img.dtype.itemsize == 2 else max(16, int(img.max()).bit_length())
+        return (np.clip(img, 0, None).astype(np.int64) >> (bits - 8)).astype(np.uint8)
+    if img.dtype != np.uint8:
+        return np.clip(img, 0, 255).astype(np.uint8)
+    return img
+
+def make_batch_colorizer(model, size=256):
+    """colorize callable for BatchWorker: one forward pass per batch at size x size"""
+    import torch
+    from colorizers import load_img, save_img, preprocess_img, postprocess_tens_uint8
+
+    def colorize(paths, out_paths):
+        errors = [None]*len(paths)
+        loaded = []
+        for i, path in enumerate(paths):
+            try:
+                img = _to_uint8(load_img(path))[:,:,:3]
+                loaded.append((i,) + preprocess_img(img, HW=(size,size)))
+            except Exception as e:
+                errors[i] = f"{type(e).__name__}: {e}"
+        if not loaded:
+            return errors
+        with torch.no_grad():
+            out_ab = model(torch.cat([tens_l_rs for _, _, tens_l_rs in loaded])).cpu()
+        for j, (i, tens_l_orig, _) in enumerate(loaded):
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(out_paths[i])), exist_ok=True)
+                save_img(out_paths[i], postprocess_tens_uint8(tens_l_orig, out_ab[j:j+1]))
+            except Exception as e:
+                errors[i] = f"{type(e).__name__}: {e}"
+        return errors
+    return colorize
+
+class WatchDaemon:
+    def __init__(self, roots, output, colorize, index_path=DEFAULT_INDEX, settle=2., poll_interval=2.,
+                 batch_size=4, batch_window=.5, use_inotify=None):
+        """
+        Args:
+            roots: folders to watch (recursively)
+            colorize: see BatchWorker
+            use_inotify: None uses inotify where available, False always polls
+        """
+        self.roots = [os.path.abspath(r) for r in roots]
+        self.output = os.path.abspath(output)
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.index = ProcessedIndex(index_path)
+        self.scanner = DirScanner(self.roots, self.index)
+        self.debouncer = Debouncer(settle)
+        self.worker = BatchWorker(colorize, self.index, batch_size, batch_window)
+        self.watcher = None
+        if use_inotify is not False:
+            try:
+                self.watcher = InotifyWatcher(self.roots)
+            except (OSError, AttributeError):
+                if use_inotify:
+                    raise
+        self.last_scan = 0.
+        self.recheck = set()
+
+    def output_for(self, path):
+        root = next(r for r in self.roots if path == r or path.startswith(r + os.sep))
+        rel_dir = os.path.dirname(os.path.relpath(path, root))
+        return os.path.join(self.output, rel_dir, f"color_{os.path.basename(path)}")
+
+    def _discover(self, paths):
+        # files with the worker are still 'pending' in the index; they are looked at again
+        # once it is done with them, in case they were rewritten in the meantime
+        in_flight = self.worker.in_flight()
+        self.recheck.update(p for p in paths if p in in_flight)
+        for path, seen in self.index.discover([p for p in paths if p not in in_flight]):
+            self.debouncer.add(path, seen)
+
+    def start(self):
+        """Start the worker and catch up on files that arrived or were pending while stopped"""
+        self.worker.start()
+        for path, seen in self.index.pending():
+            self.debouncer.add(path, seen)
+        self._discover(self.scanner.scan(self.settle))
+        self.last_scan = time.time()
+
+    def step(self, timeout=.5):
+        """Wait up to timeout for file events, then hand settled files to the worker"""
+        if self.watcher is not None:
+            paths = self.watcher.read(timeout)
+            if paths is None:
+                print("⚠️  inotify queue overflowed, rescanning")
+                paths = self.scanner.scan(self.settle)
+        else:
+            time.sleep(timeout)
+            paths = []
+            if time.time() - self.last_scan >= self.poll_interval:
+                paths = self.scanner.scan(self.settle)
+                self.last_scan = time.time()
+        if self.recheck:
+            finished = self.recheck - self.worker.in_flight()
+            self.recheck -= finished
+            paths = list(paths) + sorted(finished)
+        if paths:
+            self._discover(paths)
+        for path, seen in self.debouncer.ready():
+            self.worker.submit(path, self.output_for(path), seen)
+
+    def stop(self):
+        self.worker.stop()
+        if self.watcher is not None:
+            self.watcher.close()
+
+    def run(self, report_every=60.):
+        self.start()
+        mode = 'inotify' if self.watcher is not None else f"polling every {self.poll_interval:g}s"
+        print(f"👀 Watching {', '.join(self.roots)} ({mode}) -> {self.output}")
+        last_report = time.time()
+        try:
+            while True:
+                self.step(min(.5, self.settle/2) if self.settle else .5)
+                if time.time() - last_report >= report_every:
+                    last_report = time.time()
+                    print(f"⏱️  Last {report_every:g}s: {format_latencies(self.worker.take_latencies())}")
+        except KeyboardInterrupt:
+            print("⏹️  Stopping (pending files resume on the next start)")
+        finally:
+            self.stop()
+
+def main():
+    from colorizers.models import MODEL_TYPES
+
+    parser = argparse.ArgumentParser(description='Colorize images as they arrive in watched folders')
+    parser.add_argument('--index', default=DEFAULT_INDEX, help='Processed-state database')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_watch = sub.add_parser('watch', help='Run the daemon')
+    p_watch.add_argument('input', nargs='+', help='Folders to watch (recursively)')
+    p_watch.add_argument('-o', '--output', required=True, help='Output folder (mirrors the input layout)')
+    p_watch.add_argument('--model', choices=MODEL_TYPES, default='eccv16', help='Model type')
+    p_watch.add_argument('--size', type=int, default=256, help='Inference resolution (multiple of 8)')
+    p_watch.add_argument('--batch_size', type=int, default=4, help='Images per forward pass')
+    p_watch.add_argument('--batch_window', type=float, default=.5, help='Seconds to wait for a batch to fill')
+    p_watch.add_argument('--settle', type=float, default=2., help='Seconds a file must stay unchanged before it is read')
+    p_watch.add_argument('--poll', action='store_true', help='Poll instead of using inotify')
+    p_watch.add_argument('--poll_interval', type=float, default=2., help='Seconds between polling scans')
+    p_watch.add_argument('--report_every', type=float, default=60., help='Seconds between latency reports')
+    p_watch.add_argument('--threads', type=int, help='Torch/OpenCV/BLAS threads (default: saved autotune setting)')
+
+    p_report = sub.add_parser('report', help='Ingest-to-output latency of finished files')
+    p_report.add_argument('--since', type=float, help='Only files finished in the last N hours')
+
+    args = parser.parse_args()
+    if args.command == 'report':
+        index = ProcessedIndex(args.index)
+        since = time.time() - args.since*3600 if args.since else None
+        print(', '.join(f"{n} {status}" for status, n in sorted(index.counts().items())) or 'empty index')
+        print(format_latencies(index.latencies(since)))
+        return
+
+    output = os.path.abspath(args.output)
+    for root in args.input:
+        root = os.path.abspath(root)
+        if output == root or output.startswith(root + os.sep):
+            parser.error(f"the output folder must not be inside a watched folder ({root})")
+
+    import torch
+    from colorizers import build_colorizer
+    from colorizers.runtime import configure_from_saved
+
+    configure_from_saved(num_threads=args.threads)
+    model = build_colorizer(args.model).eval()
+    with torch.no_grad():
+        # warm up allocations and kernels for the batch shape before the first file arrives
+        model(torch.zeros(args.batch_size, 1, args.size, args.size))
+    daemon = WatchDaemon(args.input, args.output, make_batch_colorizer(model, args.size), index_path=args.index,
+                         settle=args.settle, poll_interval=args.poll_interval, batch_size=args.batch_size,
+                         batch_window=args.batch_window, use_inotify=False if args.poll else None)
+    daemon.run(report_every=args.report_every)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,22 @@
+import threading
+
 import streamlit as st
 from PIL import Image
-import numpy as np
-import torch
-from colorizers import eccv16, siggraph17, preprocess_img, postprocess_tens, load_img
+from colorizers import Colorizer, encode_img
+from colorizers.runtime import configure_from_saved
+
+@st.cache_resource
+def configure_runtime_once():
+    # Streamlit reruns this script on every interaction; thread pools are set up once per process
+    return configure_from_saved()
+
+configure_runtime_once()
+
+@st.cache_resource
+def load_colorizer(model_type):
+    # one per model for the server process, so weights load once; Colorizer is not
+    # thread-safe and sessions run in parallel threads, so they take turns on it
+    return Colorizer(model_type), threading.Lock()
 
 st.title("Colorful Image Colorization")
 
@@ -10,20 +24,14 @@ uploaded_file = st.file_uploader("Upload a black & white image", type=["jpg", "j
 model_option = st.selectbox("Choose model", ["eccv16", "siggraph17"])
 
 if uploaded_file is not None:
-    img = Image.open(uploaded_file).convert("RGB")
-    img.save("temp_input.png")
+    img = Image.open(uploaded_file)
     st.image(img, caption="Uploaded Image", use_column_width=True)
 
-    # Load model
-    if model_option == "eccv16":
-        colorizer = eccv16(pretrained=True).eval()
-    else:
-        colorizer = siggraph17(pretrained=True).eval()
-
-    # Preprocess and colorize
-    img_np = np.array(img)
-    tens_l_orig, tens_l_rs = preprocess_img(img_np, HW=(256,256))
-    out_img = postprocess_tens(tens_l_orig, colorizer(tens_l_rs).cpu())
+    # Colorize straight from the decoded upload, without temporary files; the result is a
+    # pool buffer that the next call overwrites, so it is copied before the lock is released
+    colorizer, lock = load_colorizer(model_option)
+    with lock:
+        out_img = colorizer.colorize(img).copy()
 
     st.image(out_img, caption="Colorized Image", use_column_width=True)
-    st.download_button("Download Colorized Image", data=Image.fromarray((out_img*255).astype(np.uint8)).tobytes(), file_name="colorized.png", mime="image/png")
\ No newline at end of file
+    st.download_button("Download Colorized Image", data=encode_img(out_img), file_name="colorized.png", mime="image/png")